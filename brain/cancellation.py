@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Lucy Cancellation
+Tokens for aborting an LLM generation that nobody is waiting for any more
+"""
+
+import threading
+
+class GenerationCancelled(Exception):
+    """A blocking LLM call was cancelled before it finished"""
+
+class CancelToken:
+    """
+    Cancels one generation, from any thread
+
+    Whoever starts a generation passes a token down; whoever notices the
+    reply is no longer wanted (a new message, a disconnect, the child talking
+    over Lucy) calls cancel(). Code holding a connection registers a callback
+    with on_cancel() so the HTTP stream is closed right away, which makes
+    Ollama stop generating and frees the slot for the next request.
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks = []
+        self.reason = None
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self, reason: str = "cancelled"):
+        """Cancel the generation (only the first call has any effect)"""
+        with self._lock:
+            if self._event.is_set():
+                return
+            self.reason = reason
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print(f"[Cancel] Callback error: {e}")
+
+    def on_cancel(self, callback):
+        """
+        Run callback when the token is cancelled (now, if it already is)
+
+        Returns a function that unregisters the callback.
+        """
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return lambda: self._unregister(callback)
+        callback()
+        return lambda: None
+
+    def _unregister(self, callback):
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    def wait(self, timeout: float = None) -> bool:
+        """Block until cancelled (or timeout); returns True if cancelled"""
+        return self._event.wait(timeout)
+
+    def raise_if_cancelled(self):
+        if self.cancelled:
+            raise GenerationCancelled(self.reason)
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Lucy Clock
+Where Lucy gets the time of day from, so tests can fast-forward through pauses and idle time
+
+Only "how long has the child been quiet" and timestamps go through a clock;
+latency measurements always use the real time.perf_counter().
+"""
+
+import threading
+import time
+from datetime import datetime
+
+class Clock:
+    """The real time (the default)"""
+
+    def time(self) -> float:
+        return time.time()
+
+    def now(self) -> datetime:
+        return datetime.now()
+
+    def sleep(self, seconds: float):
+        time.sleep(seconds)
+
+class VirtualClock(Clock):
+    """
+    Time that only moves when someone sleeps or calls advance()
+
+    sleep() returns at once, so a 5 second pause or 30 seconds of silence
+    take no time at all while everything reading the clock sees them pass.
+    """
+
+    def __init__(self, start: float = None):
+        self._now = time.time() if start is None else start
+        self._lock = threading.Lock()
+        self.slept = 0.0    # Seconds skipped so far
+
+    def time(self) -> float:
+        return self._now
+
+    def now(self) -> datetime:
+        return datetime.fromtimestamp(self._now)
+
+    def sleep(self, seconds: float):
+        self.advance(seconds)
+
+    def advance(self, seconds: float):
+        """Move the clock forward (never backwards)"""
+        if seconds > 0:
+            with self._lock:
+                self._now += seconds
+                self.slept += seconds
+
+SYSTEM = Clock()
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Lucy Context Window
+Keeps the chat history sent to the LLM within a token budget without defeating prompt caching
+"""
+
+DEFAULT_CONTEXT_TOKENS = 4096   # Ollama's default num_ctx
+CHARS_PER_TOKEN = 4             # Rough average for English text
+MESSAGE_OVERHEAD_TOKENS = 4     # Role markers and separators in the chat template
+TRUNCATED_MARKER = "\n...[truncated]"
+SUMMARY_PREFIX = "[Conversation so far] "
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate - no tokenizer needed on the Pi"""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+def message_tokens(message: dict) -> int:
+    """Estimated tokens a message takes up in the prompt"""
+    return estimate_tokens(message.get("content") or "") + MESSAGE_OVERHEAD_TOKENS
+
+def token_budget_for(cfg: dict, model: str, max_tokens: int) -> int:
+    """
+    Prompt token budget for a model, leaving room for the reply
+
+    ``context_tokens`` in the config is either one number for every model or a
+    mapping of model name to context size, with an optional "default" entry.
+    """
+    setting = cfg.get("context_tokens", DEFAULT_CONTEXT_TOKENS)
+    if isinstance(setting, dict):
+        setting = setting.get(model, setting.get("default", DEFAULT_CONTEXT_TOKENS))
+    return max(256, int(setting) - max_tokens)
+
+class ContextWindow:
+    """
+    Conversation messages sent to the LLM, trimmed in large chunks
+
+    Ollama (llama.cpp) reuses its KV cache for the longest prompt prefix it has
+    already evaluated. Sliding the window by one message every turn changes the
+    prompt right after the system message, so every request is a cache miss.
+    Instead the history grows until it hits the token budget (or max_messages)
+    and is then evicted down to a low-water mark in one go, keeping the prefix
+    byte-stable between evictions.
+
+    ``messages`` is a plain list that is only ever modified in place, so callers
+    can keep appending to it directly; token estimates for new messages are
+    picked up incrementally.
+    """
+
+    def __init__(self, pinned: list, token_budget: int = None, max_messages: int = None,
+                 low_water: float = 0.6, max_message_tokens: int = None):
+        # Leading messages (system prompt, memory summary) are never evicted
+        self.messages = list(pinned)
+        self.pinned = len(self.messages)
+        self.summary_index = None
+
+        # Limits - evict past either one, down to low_water of it
+        self.token_budget = token_budget
+        self.max_messages = max_messages
+        self.low_water = low_water
+        if max_message_tokens is None and token_budget is not None:
+            max_message_tokens = token_budget // 2
+        self.max_message_tokens = max_message_tokens
+
+        # Per-message token estimates, kept in step with self.messages
+        self._tokens = []
+        self.total_tokens = 0
+
+        # Prefix reuse stats
+        self._last_prompt = []
+        self.requests = 0
+        self.prefix_hits = 0
+        self.prompt_chars = 0
+        self.reused_chars = 0
+        self.evictions = 0
+        self.evicted_messages = 0
+        self.truncated_messages = 0
+
+        self._sync(clip=False)
+
+    def __len__(self):
+        return len(self.messages)
+
+    def append(self, role: str, content: str):
+        """Add a message to the end of the conversation"""
+        self.messages.append({"role": role, "content": content})
+        self._sync()
+
+    def set_summary(self, text: str):
+        """
+        Install or replace the rolling summary of evicted turns
+
+        The summary is a system message right after the pinned prefix and is
+        never evicted itself. Changing it changes the prompt prefix, so it
+        should only be updated occasionally (after a compaction).
+        """
+        self._sync()
+        message = {"role": "system", "content": SUMMARY_PREFIX + text}
+        tokens = message_tokens(message)
+
+        if self.summary_index is None:
+            self.summary_index = self.pinned
+            self.messages.insert(self.summary_index, message)
+            self._tokens.insert(self.summary_index, tokens)
+            self.pinned += 1
+        else:
+            self.total_tokens -= self._tokens[self.summary_index]
+            self.messages[self.summary_index] = message
+            self._tokens[self.summary_index] = tokens
+        self.total_tokens += tokens
+
+    def _sync(self, clip: bool = True):
+        """Estimate tokens for messages appended since the last call"""
+        for message in self.messages[len(self._tokens):]:
+            if clip:
+                self._clip(message)
+            tokens = message_tokens(message)
+            self._tokens.append(tokens)
+            self.total_tokens += tokens
+
+    def _clip(self, message: dict):
+        """Truncate one huge message (a long tool result) so it can't fill the window"""
+        if self.max_message_tokens is None:
+            return
+
+        content = message.get("content") or ""
+        if estimate_tokens(content) <= self.max_message_tokens:
+            return
+
+        keep = self.max_message_tokens * CHARS_PER_TOKEN - len(TRUNCATED_MARKER)
+        message["content"] = content[:max(0, keep)] + TRUNCATED_MARKER
+        self.truncated_messages += 1
+
+    def trim(self):
+        """
+        Evict old messages once the window is over budget
+
+        Returns the evicted messages (oldest first), or an empty list.
+        """
+        self._sync()
+
+        over_tokens = self.token_budget is not None and self.total_tokens > self.token_budget
+        over_count = self.max_messages is not None and len(self.messages) > self.max_messages
+        if not (over_tokens or over_count):
+            return []
+
+        # Never evict the newest message - it's what we're about to answer
+        last = len(self.messages) - 1
+        cut = self.pinned
+
+        if self.max_messages is not None:
+            keep = max(2, int((self.max_messages - self.pinned) * self.low_water))
+            cut = max(cut, len(self.messages) - keep)
+
+        if self.token_budget is not None:
+            target = int(self.token_budget * self.low_water)
+            tokens = self.total_tokens - sum(self._tokens[self.pinned:cut])
+            while cut < last and tokens > target:
+                tokens -= self._tokens[cut]
+                cut += 1
+
+        # Start the kept history on a user turn so the model never sees an orphan reply
+        while cut < last and self.messages[cut]["role"] != "user":
+            cut += 1
+        cut = min(cut, last)
+
+        evicted = self.messages[self.pinned:cut]
+        if not evicted:
+            return []
+
+        self.total_tokens -= sum(self._tokens[self.pinned:cut])
+        del self.messages[self.pinned:cut]
+        del self._tokens[self.pinned:cut]
+
+        self.evictions += 1
+        self.evicted_messages += len(evicted)
+        return evicted
+
+    def observe(self, prompt: list):
+        """
+        Record a prompt that is about to be sent, for prefix reuse stats
+
+        A request counts as a prefix hit when everything in the previous
+        prompt (except possibly its final, one-off message) is reused as-is.
+        """
+        self._sync()
+        keys = [(m["role"], m["content"]) for m in prompt]
+
+        common = 0
+        for old, new in zip(self._last_prompt, keys):
+            if old != new:
+                break
+            common += 1
+
+        self.requests += 1
+        if self._last_prompt and common >= max(1, len(self._last_prompt) - 1):
+            self.prefix_hits += 1
+
+        self.prompt_chars += sum(len(content) for _, content in keys)
+        self.reused_chars += sum(len(content) for _, content in keys[:common])
+        self._last_prompt = keys
+
+    def stats(self):
+        """Budget, prefix reuse and eviction counters"""
+        self._sync()
+        return {
+            "messages": len(self.messages),
+            "tokens": self.total_tokens,
+            "token_budget": self.token_budget,
+            "requests": self.requests,
+            "prefix_hits": self.prefix_hits,
+            "prefix_hit_rate": round(self.prefix_hits / self.requests, 3) if self.requests else 0.0,
+            "reused_prompt_fraction": round(self.reused_chars / self.prompt_chars, 3) if self.prompt_chars else 0.0,
+            "evictions": self.evictions,
+            "evicted_messages": self.evicted_messages,
+            "truncated_messages": self.truncated_messages,
+        }
+
+    def describe(self):
+        """One-line summary for console output"""
+        s = self.stats()
+        budget = f"/{s['token_budget']}" if s["token_budget"] else ""
+        return (f"~{s['tokens']}{budget} tokens, prefix reused on {s['prefix_hits']}/{s['requests']} "
+                f"requests ({s['prefix_hit_rate']:.0%}), {s['evictions']} evictions")
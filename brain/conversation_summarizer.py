@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Lucy Conversation Summarizer
+Compacts turns evicted from the context window into a rolling summary, off the request path
+"""
+
+import threading
+
+SUMMARY_MAX_CHARS = 1200
+MAX_PENDING_MESSAGES = 200  # Cap the backlog if the LLM is down or nobody compacts it
+
+def format_transcript(messages, user_label: str = "Child", assistant_label: str = "Lucy"):
+    """Render chat messages as a plain transcript for the summarizer prompt"""
+    lines = []
+    for message in messages:
+        if message["role"] == "user":
+            lines.append(f"{user_label}: {message['content']}")
+        elif message["role"] == "assistant":
+            lines.append(f"{assistant_label}: {message['content']}")
+    return "\n".join(lines)
+
+class ConversationSummarizer:
+    """
+    Folds evicted conversation turns into a "conversation so far" summary
+
+    Evicted messages are queued with submit() and compacted either by a
+    background worker thread or, with background=False, whenever the owner
+    calls run_pending() (e.g. when Lucy notices the child has gone quiet).
+    Finished summaries are collected with take_update() so they can be
+    installed between requests.
+    """
+
+    def __init__(self, summarize_fn, background: bool = True, max_chars: int = SUMMARY_MAX_CHARS):
+        # summarize_fn(previous_summary, messages) -> new summary text (or None on failure)
+        self.summarize_fn = summarize_fn
+        self.max_chars = max_chars
+        self.summary = ""
+
+        self._pending = []
+        self._update = None
+        self._lock = threading.Lock()
+        self._run_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = False
+
+        self.compactions = 0
+        self.failures = 0
+        self.dropped = 0
+
+        self._worker = None
+        if background:
+            self._worker = threading.Thread(target=self._run, name="lucy-summarizer", daemon=True)
+            self._worker.start()
+
+    def submit(self, messages):
+        """Queue evicted messages for compaction"""
+        if not messages:
+            return
+        with self._lock:
+            self._pending.extend(messages)
+            # Oldest turns go first; they would be the least of the summary anyway
+            overflow = len(self._pending) - MAX_PENDING_MESSAGES
+            if overflow > 0:
+                del self._pending[:overflow]
+                self.dropped += overflow
+        self._wakeup.set()
+
+    def has_pending(self):
+        """True if evicted turns are waiting to be compacted"""
+        with self._lock:
+            return bool(self._pending)
+
+    def run_pending(self):
+        """Compact everything queued so far; returns True if the summary changed"""
+        # Only one compaction at a time, whichever thread gets here first
+        if not self._run_lock.acquire(blocking=False):
+            return False
+
+        try:
+            with self._lock:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return False
+
+            try:
+                summary = self.summarize_fn(self.summary, batch)
+            except Exception as e:
+                print(f"[Summary] Error: {e}")
+                summary = None
+
+            if not summary:
+                # Put the turns back so the next attempt still covers them
+                self.failures += 1
+                with self._lock:
+                    self._pending = (batch + self._pending)[-MAX_PENDING_MESSAGES:]
+                return False
+
+            summary = summary.strip()[:self.max_chars]
+            with self._lock:
+                self.summary = summary
+                self._update = summary
+            self.compactions += 1
+            print(f"[Summary] Compacted {len(batch)} messages ({len(summary)} chars)")
+            return True
+        finally:
+            self._run_lock.release()
+
+    def take_update(self):
+        """Return a newly finished summary once, or None"""
+        with self._lock:
+            update, self._update = self._update, None
+        return update
+
+    def _run(self):
+        """Worker thread: compact whenever new turns are submitted"""
+        while True:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            if self._stopped:
+                return
+            self.run_pending()
+
+    def stop(self):
+        """Stop the background worker (pending turns are dropped)"""
+        self._stopped = True
+        self._wakeup.set()
+
+    def stats(self):
+        """Compaction counters"""
+        with self._lock:
+            pending = len(self._pending)
+        return {
+            "compactions": self.compactions,
+            "failures": self.failures,
+            "pending_messages": pending,
+            "dropped_messages": self.dropped,
+            "summary_chars": len(self.summary),
+        }
@@ -7,6 +7,9 @@ Simple module to send state updates to Lucy's face display
 import socket
 import json
 
+from metrics import timed
+import tracing
+
 FACE_HOST = 'localhost'
 FACE_PORT = 5555
 
@@ -19,17 +22,20 @@ def update_face_state(talking=False, listening=False):
         listening: True if Lucy is currently listening
     """
     try:
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.settimeout(0.5)
-        sock.connect((FACE_HOST, FACE_PORT))
+        with timed("face_ipc"), tracing.span("face_ipc", talking=talking, listening=listening):
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.settimeout(0.5)
+            sock.connect((FACE_HOST, FACE_PORT))
 
-        state = json.dumps({
-            'talking': talking,
-            'listening': listening
-        })
+            # Sent along so the face can add its redraw to the same trace
+            state = json.dumps({
+                'talking': talking,
+                'listening': listening,
+                **tracing.propagate()
+            })
 
-        sock.send(state.encode())
-        sock.close()
+            sock.send(state.encode())
+            sock.close()
         return True
     except Exception as e:
         # Silently fail if face isn't running
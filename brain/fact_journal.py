@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Lucy Fact Journal
+Remembered facts as an append-only journal plus a snapshot, so remembering a fact writes one line
+
+learned_facts.json (the snapshot) keeps its old format. New facts are appended to
+learned_facts.journal and folded into the snapshot in the background every
+COMPACT_EVERY lines; loading reads the snapshot and replays the journal over it.
+"""
+
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+COMPACT_EVERY = 200     # Journal lines before they are folded into the snapshot
+
+# One lock per journal file, shared by every LucyMemory in this process (the
+# voice page has one per websocket, all on the same memory folder)
+_locks = {}
+_locks_lock = threading.Lock()
+
+def _lock_for(path: Path):
+    with _locks_lock:
+        return _locks.setdefault(str(path.resolve()), threading.Lock())
+
+def _write_atomic(path: Path, text: str):
+    """Write to a temp file, flush it to disk, then rename over path (never a half-written file)"""
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+class FactJournal:
+    """
+    Append-only storage for LucyMemory.facts ({category: {key: fact}})
+
+    Each journal line holds one fact's whole new value, so replaying a line
+    twice does no harm. Compaction moves the journal aside, folds it into a
+    new snapshot read from disk (not from memory, which may be missing facts
+    another session remembered), renames that into place and only then
+    deletes the old journal. A crash at any point leaves either the old
+    snapshot and its journal or the new snapshot.
+    """
+
+    def __init__(self, snapshot_path, journal_path=None, compact_every: int = COMPACT_EVERY,
+                 background: bool = True):
+        self.snapshot_path = Path(snapshot_path)
+        self.journal_path = Path(journal_path) if journal_path else self.snapshot_path.with_suffix(".journal")
+        self.compacting_path = self.journal_path.with_name(self.journal_path.name + ".compacting")
+        self.compact_every = compact_every
+        self.background = background
+        self.lines = 0              # Lines in the journal since the last compaction
+        self.appended = 0
+        self.compactions = 0
+        self.skipped = 0            # Journal lines that couldn't be read (cut short by a crash)
+        self._torn = False          # The journal doesn't end with a newline
+        self._lock = _lock_for(self.journal_path)
+        self._worker = None
+
+    def _read_snapshot(self):
+        if not self.snapshot_path.exists():
+            return {}
+        try:
+            facts = json.loads(self.snapshot_path.read_text(encoding="utf-8"))
+            if isinstance(facts, dict):
+                return facts
+            raise ValueError("not a JSON object")
+        except (OSError, ValueError) as e:
+            # Keep it for a human to look at instead of overwriting it at the next compaction
+            aside = self.snapshot_path.with_name(
+                f"{self.snapshot_path.name}.corrupt-{time.strftime('%Y%m%d_%H%M%S')}")
+            print(f"[Memory] Could not read {self.snapshot_path.name} ({e}); moved it to {aside.name}")
+            try:
+                os.replace(self.snapshot_path, aside)
+            except OSError:
+                pass
+            return {}
+
+    def _replay(self, facts: dict, path: Path):
+        """Apply a journal file to facts; returns how many lines it had"""
+        if not path.exists():
+            return 0
+        data = path.read_bytes()
+        if path == self.journal_path:
+            self._torn = bool(data) and not data.endswith(b"\n")
+        count = 0
+        for line in data.splitlines():
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+                facts.setdefault(entry["category"], {})[entry["key"]] = entry["fact"]
+                count += 1
+            except (ValueError, KeyError, TypeError):
+                self.skipped += 1
+        return count
+
+    def load(self):
+        """Facts from the snapshot with the journal replayed over it"""
+        with self._lock:
+            facts = self._read_snapshot()
+            # A compaction that was cut short left its journal behind
+            self._replay(facts, self.compacting_path)
+            self.lines = self._replay(facts, self.journal_path)
+        if self.skipped:
+            print(f"[Memory] Skipped {self.skipped} unreadable journal line(s)")
+        if self.lines >= self.compact_every or self.compacting_path.exists():
+            self.compact_soon()
+        return facts
+
+    def append(self, category: str, key: str, fact: dict):
+        """Record one fact's new value (a single line, flushed to disk)"""
+        line = json.dumps({"category": category, "key": key, "fact": fact}, ensure_ascii=False) + "\n"
+        with self._lock:
+            self.journal_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.journal_path, "a", encoding="utf-8") as f:
+                if self._torn:
+                    f.write("\n")  # Don't glue this fact onto a line cut short by a crash
+                    self._torn = False
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+            self.lines += 1
+            self.appended += 1
+        if self.lines >= self.compact_every:
+            self.compact_soon()
+
+    def compact(self):
+        """Fold the journal into a new snapshot"""
+        with self._lock:
+            if self.journal_path.exists():
+                if self.compacting_path.exists():
+                    # Left over from an interrupted compaction; keep both in order
+                    with open(self.compacting_path, "ab") as old:
+                        old.write(self.journal_path.read_bytes())
+                    self.journal_path.unlink()
+                else:
+                    os.replace(self.journal_path, self.compacting_path)
+            if not self.compacting_path.exists():
+                return False
+            facts = self._read_snapshot()
+            self._replay(facts, self.compacting_path)
+            _write_atomic(self.snapshot_path, json.dumps(facts, indent=2))
+            self.compacting_path.unlink()
+            self.lines = 0
+            self._torn = False
+            self.compactions += 1
+        return True
+
+    def compact_soon(self):
+        """Compact in a background thread (or right away if background is off)"""
+        if not self.background:
+            self._compact_logged()
+            return
+        if self._worker is not None and self._worker.is_alive():
+            return
+        self._worker = threading.Thread(target=self._compact_logged, name="lucy-fact-journal", daemon=True)
+        self._worker.start()
+
+    def _compact_logged(self):
+        try:
+            self.compact()
+        except OSError as e:
+            print(f"[Memory] Could not compact {self.journal_path.name}: {e}")
+
+    def close(self):
+        """Wait for a running compaction and fold in what's left (end of a session)"""
+        if self._worker is not None:
+            self._worker.join()
+        if self.lines:
+            self._compact_logged()
+
+    def stats(self):
+        return {
+            "journal_lines": self.lines,
+            "appended": self.appended,
+            "compactions": self.compactions,
+            "skipped_lines": self.skipped,
+        }
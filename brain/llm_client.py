@@ -0,0 +1,501 @@
+#!/usr/bin/env python3
+"""
+Lucy LLM Client
+Shared helpers for talking to the OpenAI-compatible /chat/completions API
+"""
+
+import json
+import time
+import socket
+import asyncio
+import threading
+import weakref
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from llm_scheduler import get_scheduler
+from cancellation import CancelToken, GenerationCancelled
+from metrics import observe
+import tracing
+
+# Optional: native async HTTP for the web servers (falls back to threads)
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+TOOL_PREFIX = "TOOL:"
+
+# ==============================
+# POOLED HTTP SESSION
+# ==============================
+
+# Per-endpoint (connect, read) timeouts in seconds
+TIMEOUTS = {
+    "chat": (3.05, 120),
+    "tags": (3.05, 5),
+    "health": (3.05, 3),
+    "default": (3.05, 30),
+}
+
+POOL_SIZE = 10      # Keep-alive connections per host
+RETRIES = 2         # Connection failures and 502/503/504 responses
+BACKOFF = 0.5       # Seconds, doubled on each retry
+
+_session = None
+_session_lock = threading.Lock()
+
+def configure(timeouts: dict = None, pool_size: int = None,
+              retries: int = None, backoff: float = None):
+    """
+    Override client settings (usually from the "http" section of config.json)
+
+    Must be called before the first request to affect pooling and retries.
+    """
+    global POOL_SIZE, RETRIES, BACKOFF
+    for endpoint, value in (timeouts or {}).items():
+        TIMEOUTS[endpoint] = tuple(value) if isinstance(value, (list, tuple)) else value
+    if pool_size is not None:
+        POOL_SIZE = pool_size
+    if retries is not None:
+        RETRIES = retries
+    if backoff is not None:
+        BACKOFF = backoff
+
+def _build_session():
+    """Create a requests session with keep-alive pooling and retry/backoff"""
+    retry = Retry(
+        total=RETRIES,
+        connect=RETRIES,
+        read=0,  # Never replay a generation that timed out mid-read
+        status=RETRIES,
+        backoff_factor=BACKOFF,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset(["GET", "POST"]),
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=POOL_SIZE, max_retries=retry)
+
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+def get_session():
+    """Shared session used for every LLM and gateway call"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = _build_session()
+        return _session
+
+def _timeout_for(endpoint: str, timeout=None):
+    """Resolve the timeout for a call; a bare number overrides the read timeout"""
+    default = TIMEOUTS.get(endpoint, TIMEOUTS["default"])
+    if timeout is None:
+        return default
+    if isinstance(timeout, (int, float)) and isinstance(default, tuple):
+        return (default[0], timeout)
+    return timeout
+
+def http_request(method: str, url: str, endpoint: str = "default", timeout=None, **kwargs):
+    """Send a request through the shared pooled session"""
+    return get_session().request(method, url, timeout=_timeout_for(endpoint, timeout), **kwargs)
+
+def http_get(url: str, endpoint: str = "default", **kwargs):
+    """GET through the shared session"""
+    return http_request("GET", url, endpoint, **kwargs)
+
+def http_post(url: str, endpoint: str = "default", **kwargs):
+    """POST through the shared session"""
+    return http_request("POST", url, endpoint, **kwargs)
+
+def ollama_base(api_base: str) -> str:
+    """Native Ollama API root for an OpenAI-compatible /v1 base URL"""
+    return api_base.replace('/v1', '')
+
+# ==============================
+# ASYNC CLIENT
+# ==============================
+
+# One httpx client per event loop - connections can't be shared across loops
+_async_clients = weakref.WeakKeyDictionary()
+
+def _httpx_timeout(endpoint: str, timeout=None):
+    """Same timeout rules as the sync client, as an httpx.Timeout"""
+    timeout = _timeout_for(endpoint, timeout)
+    if isinstance(timeout, tuple):
+        return httpx.Timeout(timeout[1], connect=timeout[0])
+    return httpx.Timeout(timeout)
+
+def get_async_client():
+    """Shared httpx.AsyncClient for the running event loop"""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = httpx.AsyncClient(transport=httpx.AsyncHTTPTransport(
+            retries=RETRIES,  # Connection failures only
+            limits=httpx.Limits(max_connections=POOL_SIZE, max_keepalive_connections=POOL_SIZE)
+        ))
+        _async_clients[loop] = client
+    return client
+
+async def aiter_cancellable(stream, cancel: CancelToken):
+    """
+    Iterate an async token stream, abandoning it as soon as cancel fires
+
+    The stream runs in its own task, so cancelling it (which closes the HTTP
+    connection) never touches the caller's task. Ends quietly when cancelled.
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    done = object()
+
+    async def pump():
+        try:
+            async for token in stream:
+                queue.put_nowait(token)
+            queue.put_nowait(done)
+        except BaseException as e:
+            queue.put_nowait(e)
+
+    task = asyncio.ensure_future(pump())
+    unregister = cancel.on_cancel(lambda: loop.call_soon_threadsafe(task.cancel))
+    try:
+        while True:
+            item = await queue.get()
+            if item is done:
+                return
+            if isinstance(item, BaseException):
+                if cancel.cancelled:
+                    return
+                raise item
+            yield item
+    finally:
+        unregister()
+        task.cancel()
+
+async def await_cancellable(coro, cancel: CancelToken):
+    """Await coro in its own task; raises GenerationCancelled if cancel fires first"""
+    loop = asyncio.get_running_loop()
+    task = asyncio.ensure_future(coro)
+    unregister = cancel.on_cancel(lambda: loop.call_soon_threadsafe(task.cancel))
+    try:
+        return await task
+    except asyncio.CancelledError:
+        if cancel.cancelled and task.cancelled():
+            raise GenerationCancelled(cancel.reason)
+        raise
+    finally:
+        unregister()
+
+async def aiter_in_thread(iterator):
+    """Drive a blocking iterator from a worker thread without stalling the event loop"""
+    done = object()
+    iterator = iter(iterator)
+    while True:
+        item = await asyncio.to_thread(next, iterator, done)
+        if item is done:
+            break
+        yield item
+
+# ==============================
+# CHAT COMPLETIONS
+# ==============================
+
+def _parse_sse_line(line: str):
+    """Return (done, delta) for one server-sent event line"""
+    if not line or not line.startswith("data:"):
+        return False, None
+
+    data = line[len("data:"):].strip()
+    if data == "[DONE]":
+        return True, None
+
+    try:
+        chunk = json.loads(data)
+    except ValueError:
+        return False, None
+
+    choices = chunk.get("choices") or []
+    if not choices:
+        return False, None
+
+    return False, choices[0].get("delta", {}).get("content") or None
+
+def iter_sse_deltas(resp):
+    """
+    Yield content deltas from a streaming /chat/completions response
+
+    Ollama (and other OpenAI-compatible servers) send server-sent events of the
+    form ``data: {...}`` and finish with ``data: [DONE]``.
+    """
+    for line in resp.iter_lines(decode_unicode=True):
+        done, delta = _parse_sse_line(line)
+        if done:
+            break
+        if delta:
+            yield delta
+
+def abort_response(resp):
+    """
+    Close a streaming response from another thread
+
+    Shutting the socket down wakes a read blocked waiting for the next token
+    (a plain close() wouldn't until the server sent more).
+    """
+    sock = getattr(getattr(resp.raw, "_connection", None), "sock", None)
+    if sock is not None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+    resp.close()
+
+# Routers spreading requests for an api_base over several backends (see llm_router)
+_routers = {}
+
+def install_router(api_base: str, router):
+    """Send chat calls for api_base through a router (None to remove it)"""
+    if router is None:
+        _routers.pop(api_base, None)
+    else:
+        _routers[api_base] = router
+
+def chat_completion(api_base: str, payload: dict, timeout=None, cancel: CancelToken = None) -> str:
+    """
+    Blocking (non-streaming) chat completion; returns the reply text
+
+    Raises requests exceptions on connection problems and RuntimeError on a
+    non-200 response, like stream_chat. Waits for a scheduler slot first.
+    With a cancel token the call raises GenerationCancelled once cancelled.
+    """
+    router = _routers.get(api_base)
+    start = time.perf_counter()
+    with tracing.span("llm", model=payload.get("model")) as span:
+        if router is not None:
+            reply = router.chat(payload, timeout, cancel)
+        else:
+            reply = chat_once(api_base, payload, timeout, cancel)
+        span.set(chars=len(reply))
+    observe("llm_total", time.perf_counter() - start)
+    return reply
+
+def chat_once(api_base: str, payload: dict, timeout=None, cancel: CancelToken = None, timer=None) -> str:
+    """chat_completion against exactly this api_base (no routing); timer is an llm_scheduler.SlotTimer"""
+    if cancel is not None:
+        # Streamed underneath so the connection can be dropped mid-generation
+        reply = "".join(stream_once(api_base, payload, timeout, cancel, timer))
+        cancel.raise_if_cancelled()
+        return reply
+
+    with get_scheduler(api_base).slot(timer=timer):
+        resp = http_post(f"{api_base}/chat/completions", "chat", json=payload, timeout=timeout)
+    if resp.status_code != 200:
+        raise RuntimeError(f"LLM API error: {resp.status_code} - {resp.text}")
+    return resp.json()["choices"][0]["message"]["content"]
+
+def stream_chat(api_base: str, payload: dict, timeout=None, cancel: CancelToken = None):
+    """
+    Stream a chat completion, yielding text tokens as the model produces them
+
+    Raises requests exceptions on connection problems and RuntimeError on a
+    non-200 response, so each caller can keep its own error messages.
+    The scheduler slot is held until the stream ends (or is closed).
+    Cancelling the token closes the connection and ends the stream early.
+    """
+    router = _routers.get(api_base)
+    # Started here, not in the generator, so its parent is the caller's span
+    span = tracing.start_span("llm", model=payload.get("model"), stream=True)
+    if router is not None:
+        return _timed_stream(router.stream(payload, timeout, cancel), span, cancel)
+    return _timed_stream(stream_once(api_base, payload, timeout, cancel), span, cancel)
+
+def _timed_stream(tokens, span, cancel: CancelToken = None):
+    """Record time to first token and total time of a token stream"""
+    start = time.perf_counter()
+    first = True
+    count = 0
+    with span:
+        try:
+            for token in tokens:
+                if first:
+                    observe("llm_first_token", time.perf_counter() - start)
+                    span.mark("first_token")
+                    first = False
+                count += 1
+                yield token
+        finally:
+            tokens.close()
+            span.set(tokens=count)
+            if cancel is not None and cancel.cancelled:
+                span.set(cancelled=cancel.reason)
+            if not first:
+                observe("llm_total", time.perf_counter() - start)
+
+def stream_once(api_base: str, payload: dict, timeout=None, cancel: CancelToken = None, timer=None):
+    """stream_chat against exactly this api_base (no routing)"""
+    payload = dict(payload, stream=True)
+    try:
+        with get_scheduler(api_base).slot(cancel=cancel, timer=timer), \
+                http_post(f"{api_base}/chat/completions", "chat", json=payload, stream=True,
+                          timeout=timeout) as resp:
+            if resp.status_code != 200:
+                raise RuntimeError(f"LLM API error: {resp.status_code} - {resp.text}")
+
+            # Ollama streams UTF-8 but doesn't always say so in the headers
+            # (requests would otherwise fall back to ISO-8859-1 for text/*)
+            resp.encoding = "utf-8"
+            if cancel is None:
+                yield from iter_sse_deltas(resp)
+                return
+
+            # Closing the response from the cancelling thread drops the
+            # connection, which is what makes Ollama stop generating
+            unregister = cancel.on_cancel(lambda: abort_response(resp))
+            try:
+                for delta in iter_sse_deltas(resp):
+                    if cancel.cancelled:
+                        return
+                    yield delta
+            except Exception:
+                if not cancel.cancelled:
+                    raise
+            finally:
+                unregister()
+    except GenerationCancelled:
+        return
+
+async def astream_chat(api_base: str, payload: dict, timeout=None, cancel: CancelToken = None):
+    """
+    Async version of stream_chat for code running on an event loop
+
+    Uses httpx when it is installed, otherwise runs the blocking stream in a
+    worker thread. Either way other coroutines keep running between tokens.
+    """
+    router = _routers.get(api_base)
+    if router is not None:
+        stream = router.astream(payload, timeout, cancel)
+    else:
+        stream = astream_once(api_base, payload, timeout, cancel)
+    start = time.perf_counter()
+    first = True
+    count = 0
+    with tracing.start_span("llm", model=payload.get("model"), stream=True) as span:
+        try:
+            async for token in stream:
+                if first:
+                    observe("llm_first_token", time.perf_counter() - start)
+                    span.mark("first_token")
+                    first = False
+                count += 1
+                yield token
+        finally:
+            await stream.aclose()  # Stopping early drops the connection now, not at garbage collection
+            span.set(tokens=count)
+            if cancel is not None and cancel.cancelled:
+                span.set(cancelled=cancel.reason)
+            if not first:
+                observe("llm_total", time.perf_counter() - start)
+
+async def astream_once(api_base: str, payload: dict, timeout=None, cancel: CancelToken = None, timer=None):
+    """astream_chat against exactly this api_base (no routing)"""
+    if httpx is None:
+        stream = aiter_in_thread(stream_once(api_base, payload, timeout, cancel, timer))
+    else:
+        stream = _astream_httpx(api_base, payload, timeout, timer)
+    if cancel is not None:
+        stream = aiter_cancellable(stream, cancel)
+    try:
+        async for token in stream:
+            yield token
+    finally:
+        await stream.aclose()
+
+async def _astream_httpx(api_base: str, payload: dict, timeout=None, timer=None):
+    payload = dict(payload, stream=True)
+    client = get_async_client()
+    async with get_scheduler(api_base).aslot(timer=timer):
+        async with client.stream("POST", f"{api_base}/chat/completions", json=payload,
+                                 timeout=_httpx_timeout("chat", timeout)) as resp:
+            if resp.status_code != 200:
+                body = (await resp.aread()).decode("utf-8", "replace")
+                raise RuntimeError(f"LLM API error: {resp.status_code} - {body}")
+
+            async for line in resp.aiter_lines():
+                done, delta = _parse_sse_line(line)
+                if done:
+                    break
+                if delta:
+                    yield delta
+
+async def achat(api_base: str, payload: dict, timeout=None, cancel: CancelToken = None) -> str:
+    """Async non-streaming chat completion; returns the reply text"""
+    router = _routers.get(api_base)
+    start = time.perf_counter()
+    with tracing.span("llm", model=payload.get("model")) as span:
+        if router is not None:
+            reply = await router.achat(payload, timeout, cancel)
+        else:
+            reply = await achat_once(api_base, payload, timeout, cancel)
+        span.set(chars=len(reply))
+    observe("llm_total", time.perf_counter() - start)
+    return reply
+
+async def achat_once(api_base: str, payload: dict, timeout=None, cancel: CancelToken = None, timer=None) -> str:
+    """achat against exactly this api_base (no routing)"""
+    if cancel is not None:
+        if httpx is None:
+            return await asyncio.to_thread(chat_once, api_base, payload, timeout, cancel, timer)
+        return await await_cancellable(achat_once(api_base, payload, timeout, timer=timer), cancel)
+
+    async with get_scheduler(api_base).aslot(timer=timer):
+        if httpx is None:
+            resp = await asyncio.to_thread(http_post, f"{api_base}/chat/completions", "chat",
+                                           json=payload, timeout=timeout)
+        else:
+            resp = await get_async_client().post(f"{api_base}/chat/completions", json=payload,
+                                                 timeout=_httpx_timeout("chat", timeout))
+
+    # requests and httpx responses share status_code/text/json()
+    if resp.status_code != 200:
+        raise RuntimeError(f"LLM API error: {resp.status_code} - {resp.text}")
+    return resp.json()["choices"][0]["message"]["content"]
+
+def tool_call_state(text: str):
+    """
+    Decide whether a partially streamed reply is a tool call
+
+    Returns True once the reply starts with TOOL:, False once it can't,
+    and None while there isn't enough text to tell.
+    """
+    head = text.lstrip()
+    if len(head) < len(TOOL_PREFIX):
+        return None if TOOL_PREFIX.startswith(head) else False
+    return head.startswith(TOOL_PREFIX)
+
+SENTENCE_ENDINGS = ".!?"
+
+def iter_sentences(tokens):
+    """
+    Regroup a token stream into whole sentences
+
+    Lets the voice loop start speaking the first sentence while the rest of
+    the reply is still being generated.
+    """
+    buffer = ""
+    for token in tokens:
+        buffer += token
+        # Split on sentence punctuation followed by whitespace
+        start = 0
+        for i in range(len(buffer) - 1):
+            if buffer[i] in SENTENCE_ENDINGS and buffer[i + 1].isspace():
+                sentence = buffer[start:i + 1].strip()
+                if sentence:
+                    yield sentence
+                start = i + 1
+        buffer = buffer[start:]
+
+    if buffer.strip():
+        yield buffer.strip()
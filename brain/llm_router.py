@@ -0,0 +1,456 @@
+#!/usr/bin/env python3
+"""
+Lucy LLM Router
+Spreads chat requests over several OpenAI-compatible backends, fastest healthy one first
+"""
+
+import asyncio
+import contextvars
+import queue
+import threading
+import time
+from collections import deque
+
+import llm_client
+from llm_client import chat_once, stream_once, achat_once, astream_once
+from cancellation import CancelToken, GenerationCancelled
+import llm_scheduler
+from llm_scheduler import SlotTimer
+
+EWMA_ALPHA = 0.3            # Weight of the newest latency/error sample
+FAILURES_TO_OPEN = 3        # Consecutive failures before a backend is taken out
+COOLDOWN = 30.0             # Seconds out of rotation, doubled on each repeat (max 5 min)
+MAX_COOLDOWN = 300.0
+LATENCY_SAMPLES = 100       # Recent time-to-first-token samples kept for the p95
+HEDGE_POLL = 0.05           # How often to check whether a queued primary got its slot
+
+class Backend:
+    """One OpenAI-compatible server and what we've learned about it"""
+
+    def __init__(self, name: str, api_base: str, model: str = None):
+        self.name = name
+        self.api_base = api_base
+        self.model = model              # Overrides the request's model, if set
+
+        self.latency = None             # EWMA seconds until the first token
+        self.error_rate = 0.0           # EWMA of failures (0..1)
+        self.samples = deque(maxlen=LATENCY_SAMPLES)
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self.cooldown = COOLDOWN
+        self.last_error = None
+
+    def prepare(self, payload: dict) -> dict:
+        return dict(payload, model=self.model) if self.model else payload
+
+    def available(self, now: float) -> bool:
+        """False while the circuit is open after repeated failures"""
+        return now >= self.open_until
+
+    def score(self) -> float:
+        """Lower is better: latency inflated by recent errors (untried backends go first)"""
+        if self.latency is None:
+            return float("inf") if self.failures else 0.0
+        return self.latency * (1 + 2 * self.error_rate)
+
+    def p95(self):
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+    def record_success(self, latency: float):
+        self.requests += 1
+        self.samples.append(latency)
+        self.latency = latency if self.latency is None else (
+            EWMA_ALPHA * latency + (1 - EWMA_ALPHA) * self.latency)
+        self.error_rate *= (1 - EWMA_ALPHA)
+        self.consecutive_failures = 0
+        self.cooldown = COOLDOWN
+
+    def record_lost_race(self, elapsed: float):
+        """A hedged request was cancelled before its first token - it took at least this long"""
+        self.latency = elapsed if self.latency is None else max(
+            self.latency, EWMA_ALPHA * elapsed + (1 - EWMA_ALPHA) * self.latency)
+
+    def record_failure(self, error: Exception):
+        self.requests += 1
+        self.failures += 1
+        self.error_rate = EWMA_ALPHA + (1 - EWMA_ALPHA) * self.error_rate
+        self.consecutive_failures += 1
+        self.last_error = str(error)
+        if self.consecutive_failures >= FAILURES_TO_OPEN:
+            self.open_until = time.monotonic() + self.cooldown
+            print(f"[Router] {self.name} taken out for {self.cooldown:.0f}s: {error}")
+            self.cooldown = min(self.cooldown * 2, MAX_COOLDOWN)
+
+    def stats(self):
+        p95 = self.p95()
+        slots = llm_scheduler.get_scheduler(self.api_base).stats()
+        return {
+            "api_base": self.api_base,
+            "model": self.model,
+            "available": self.available(time.monotonic()),
+            "in_flight": slots["in_flight"],
+            "max_in_flight": slots["max_in_flight"],
+            "queued": slots["queued"],
+            "latency_ms": round(self.latency * 1000, 1) if self.latency is not None else None,
+            "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+            "error_rate": round(self.error_rate, 3),
+            "requests": self.requests,
+            "failures": self.failures,
+            "last_error": self.last_error,
+        }
+
+class LLMRouter:
+    """
+    Picks the fastest healthy backend for each request and fails over on errors
+
+    Backends are ranked by an EWMA of time-to-first-token, inflated by their
+    recent error rate; one that fails repeatedly is taken out of rotation for
+    a cooldown. A request that fails before producing any text is retried on
+    the next backend. With hedging on, a streaming request that hasn't started
+    within the primary's p95 time-to-first-token is also sent to the runner-up,
+    and whichever starts first wins - the other request is cancelled. The
+    hedge clock starts when the primary gets a slot from its backend's
+    scheduler, so waiting behind our own requests doesn't trigger a hedge.
+    """
+
+    def __init__(self, backends: list, hedge: bool = False, hedge_delay: float = 1.0,
+                 min_hedge_delay: float = 0.25):
+        self.backends = backends
+        self.hedge = hedge and len(backends) > 1
+        self.hedge_delay = hedge_delay          # Used until there are enough samples for a p95
+        self.min_hedge_delay = min_hedge_delay
+        self._lock = threading.Lock()
+
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.failovers = 0
+
+    def ranked(self):
+        """Available backends, best first (or the soonest to come back if none are)"""
+        now = time.monotonic()
+        with self._lock:
+            available = [b for b in self.backends if b.available(now)]
+            if not available:
+                return [min(self.backends, key=lambda b: b.open_until)]
+            return sorted(available, key=lambda b: (b.score(), self.backends.index(b)))
+
+    def _delay_for(self, backend: Backend) -> float:
+        """How long to wait for the first token before hedging"""
+        if len(backend.samples) < 10:
+            return self.hedge_delay
+        return max(self.min_hedge_delay, backend.p95())
+
+    def _hedge_wait(self, primary: Backend, timer: SlotTimer):
+        """Seconds until the hedge is due (HEDGE_POLL while the primary is still queued)"""
+        if timer.granted_at is None:
+            return HEDGE_POLL
+        return max(0.0, timer.granted_at + self._delay_for(primary) - time.monotonic())
+
+    # ---------- blocking ----------
+
+    def chat(self, payload: dict, timeout=None, cancel: CancelToken = None) -> str:
+        """Non-streaming completion with failover (hedged via streaming if enabled)"""
+        if self.hedge:
+            reply = "".join(self.stream(payload, timeout, cancel))
+            if cancel is not None:
+                cancel.raise_if_cancelled()
+            return reply
+
+        last_error = None
+        for backend in self.ranked():
+            timer = SlotTimer()  # Latency counts from the scheduler slot, not the queue
+            try:
+                reply = chat_once(backend.api_base, backend.prepare(payload), timeout, cancel, timer)
+            except GenerationCancelled:
+                raise
+            except Exception as e:
+                backend.record_failure(e)
+                last_error = e
+                self.failovers += 1
+                continue
+            backend.record_success(timer.elapsed())
+            return reply
+        raise last_error
+
+    def stream(self, payload: dict, timeout=None, cancel: CancelToken = None):
+        """Streaming completion with failover and optional hedging"""
+        if self.hedge:
+            yield from self._hedged_stream(payload, timeout, cancel)
+            return
+
+        last_error = None
+        for backend in self.ranked():
+            timer = SlotTimer()
+            started = False
+            try:
+                for token in stream_once(backend.api_base, backend.prepare(payload), timeout, cancel, timer):
+                    if not started:
+                        backend.record_success(timer.elapsed())
+                        started = True
+                    yield token
+                return
+            except Exception as e:
+                backend.record_failure(e)
+                if started:
+                    raise  # Can't switch backends halfway through a reply
+                last_error = e
+                self.failovers += 1
+        raise last_error
+
+    def _pump(self, backend: Backend, payload: dict, timeout, events: queue.Queue, cancel: CancelToken,
+              timer: SlotTimer):
+        """Thread body: run one backend's stream into the shared event queue"""
+        started = False
+        try:
+            # Cancelling drops the connection, so the server stops generating
+            for token in stream_once(backend.api_base, backend.prepare(payload), timeout, cancel, timer):
+                if not started:
+                    backend.record_success(timer.elapsed())
+                    started = True
+                events.put((backend, "token", token))
+            if cancel.cancelled and not started:
+                backend.record_lost_race(timer.elapsed())
+            events.put((backend, "done", None))
+        except Exception as e:
+            backend.record_failure(e)
+            events.put((backend, "error", e))
+
+    def _hedged_stream(self, payload: dict, timeout=None, cancel: CancelToken = None):
+        events = queue.Queue()
+        cancels, timers = {}, {}
+        pending = self.ranked()
+
+        def cancel_all():
+            for token in list(cancels.values()):
+                token.cancel()
+
+        def launch():
+            backend = pending.pop(0)
+            cancels[backend] = CancelToken()
+            timers[backend] = SlotTimer()
+            if cancel is not None and cancel.cancelled:
+                cancels[backend].cancel()
+            # Copy the caller's context so the scheduler sees the right priority/session
+            context = contextvars.copy_context()
+            threading.Thread(target=context.run, daemon=True, name=f"lucy-hedge-{backend.name}",
+                             args=(self._pump, backend, payload, timeout, events, cancels[backend],
+                                   timers[backend])).start()
+            return backend
+
+        primary = launch()
+        unregister = cancel.on_cancel(cancel_all) if cancel is not None else (lambda: None)
+        running, winner, last_error = 1, None, None
+
+        try:
+            while True:
+                wait = self._hedge_wait(primary, timers[primary]) if winner is None and pending else None
+                try:
+                    backend, kind, value = events.get(timeout=wait)
+                except queue.Empty:
+                    if self._hedge_wait(primary, timers[primary]) > 0:
+                        continue  # Queued for a slot, or only just got one - not slow yet
+                    launch()
+                    running += 1
+                    self.hedges += 1
+                    continue
+
+                if winner is None:
+                    if kind == "error":
+                        running -= 1
+                        last_error = value
+                        if pending:
+                            launch()
+                            running += 1
+                            self.failovers += 1
+                        elif running == 0:
+                            raise last_error
+                        continue
+
+                    # First backend to produce anything wins; cancel the rest
+                    winner = backend
+                    if backend is not primary:
+                        self.hedge_wins += 1
+                    for other, token in cancels.items():
+                        if other is not backend:
+                            token.cancel()
+
+                if backend is not winner:
+                    continue
+                if kind == "token":
+                    yield value
+                elif kind == "done":
+                    return
+                else:
+                    raise value
+        finally:
+            unregister()
+            cancel_all()
+
+    # ---------- async ----------
+
+    async def achat(self, payload: dict, timeout=None, cancel: CancelToken = None) -> str:
+        """Async chat() for code running on an event loop"""
+        if self.hedge:
+            reply = "".join([token async for token in self.astream(payload, timeout, cancel)])
+            if cancel is not None:
+                cancel.raise_if_cancelled()
+            return reply
+
+        last_error = None
+        for backend in self.ranked():
+            timer = SlotTimer()
+            try:
+                reply = await achat_once(backend.api_base, backend.prepare(payload), timeout, cancel, timer)
+            except GenerationCancelled:
+                raise
+            except Exception as e:
+                backend.record_failure(e)
+                last_error = e
+                self.failovers += 1
+                continue
+            backend.record_success(timer.elapsed())
+            return reply
+        raise last_error
+
+    async def astream(self, payload: dict, timeout=None, cancel: CancelToken = None):
+        """Async stream() for code running on an event loop"""
+        if self.hedge:
+            async for token in self._ahedged_stream(payload, timeout, cancel):
+                yield token
+            return
+
+        last_error = None
+        for backend in self.ranked():
+            timer = SlotTimer()
+            started = False
+            try:
+                async for token in astream_once(backend.api_base, backend.prepare(payload), timeout, cancel, timer):
+                    if not started:
+                        backend.record_success(timer.elapsed())
+                        started = True
+                    yield token
+                return
+            except Exception as e:
+                backend.record_failure(e)
+                if started:
+                    raise
+                last_error = e
+                self.failovers += 1
+        raise last_error
+
+    async def _apump(self, backend: Backend, payload: dict, timeout, events: asyncio.Queue,
+                     cancel: CancelToken, timer: SlotTimer):
+        """Task body: run one backend's stream into the shared event queue"""
+        started = False
+        try:
+            async for token in astream_once(backend.api_base, backend.prepare(payload), timeout, cancel, timer):
+                if not started:
+                    backend.record_success(timer.elapsed())
+                    started = True
+                await events.put((backend, "token", token))
+            await events.put((backend, "done", None))
+        except asyncio.CancelledError:
+            if not started:
+                backend.record_lost_race(timer.elapsed())
+            raise
+        except Exception as e:
+            backend.record_failure(e)
+            await events.put((backend, "error", e))
+
+    async def _ahedged_stream(self, payload: dict, timeout=None, cancel: CancelToken = None):
+        events = asyncio.Queue()
+        tasks, timers = {}, {}
+        pending = self.ranked()
+
+        def launch():
+            backend = pending.pop(0)
+            timers[backend] = SlotTimer()
+            tasks[backend] = asyncio.create_task(self._apump(backend, payload, timeout, events, cancel,
+                                                             timers[backend]))
+            return backend
+
+        primary = launch()
+        running, winner, last_error = 1, None, None
+
+        try:
+            while True:
+                wait = self._hedge_wait(primary, timers[primary]) if winner is None and pending else None
+                try:
+                    backend, kind, value = await asyncio.wait_for(events.get(), wait)
+                except asyncio.TimeoutError:
+                    if self._hedge_wait(primary, timers[primary]) > 0:
+                        continue  # Queued for a slot, or only just got one - not slow yet
+                    launch()
+                    running += 1
+                    self.hedges += 1
+                    continue
+
+                if winner is None:
+                    if kind == "error":
+                        running -= 1
+                        last_error = value
+                        if pending:
+                            launch()
+                            running += 1
+                            self.failovers += 1
+                        elif running == 0:
+                            raise last_error
+                        continue
+
+                    winner = backend
+                    if backend is not primary:
+                        self.hedge_wins += 1
+                    for other, task in tasks.items():
+                        if other is not backend:
+                            task.cancel()
+
+                if backend is not winner:
+                    continue
+                if kind == "token":
+                    yield value
+                elif kind == "done":
+                    return
+                else:
+                    raise value
+        finally:
+            for task in tasks.values():
+                task.cancel()
+
+    def stats(self):
+        """Per-backend latency/health plus hedging counters"""
+        return {
+            "hedging": self.hedge,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "failovers": self.failovers,
+            "backends": {b.name: b.stats() for b in self.backends},
+        }
+
+def configure(cfg: dict, api_base: str):
+    """
+    Route calls for api_base over the "backends" list in the config
+
+    Each backend is {"name", "api_base", "model" (optional), "max_in_flight"
+    (optional)}, and gets its own scheduler slots. Returns the router, or None
+    when fewer than two backends are configured.
+    """
+    entries = cfg.get("backends") or []
+    if len(entries) < 2:
+        return None
+
+    backends = [Backend(entry.get("name", entry["api_base"]), entry["api_base"], entry.get("model"))
+                for entry in entries]
+    for entry in entries:
+        llm_scheduler.configure_backend(entry["api_base"], entry.get("max_in_flight"))
+    hedge = cfg.get("hedge", {})
+    router = LLMRouter(backends, hedge=hedge.get("enabled", False),
+                       hedge_delay=hedge.get("delay", 1.0),
+                       min_hedge_delay=hedge.get("min_delay", 0.25))
+    llm_client.install_router(api_base, router)
+    print(f"[Router] {len(backends)} backends: {', '.join(b.name for b in backends)}")
+    return router
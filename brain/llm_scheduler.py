@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""
+Lucy LLM Scheduler
+Limits how many requests hit Ollama at once and decides who goes next
+"""
+
+import asyncio
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager, asynccontextmanager, nullcontext
+from contextvars import ContextVar
+
+from cancellation import GenerationCancelled
+from metrics import observe
+import tracing
+
+# Priority classes - lower goes first
+PRIORITY_VOICE = 0          # Someone is listening for Lucy's voice right now
+PRIORITY_CHAT = 1           # Web and console chat
+PRIORITY_BACKGROUND = 2     # Summaries, prefetch, audits
+
+PRIORITY_NAMES = {
+    PRIORITY_VOICE: "voice",
+    PRIORITY_CHAT: "chat",
+    PRIORITY_BACKGROUND: "background",
+}
+
+DEFAULT_MAX_IN_FLIGHT = 2   # Match OLLAMA_NUM_PARALLEL
+
+# Who is asking - set per websocket task, thread or voice loop
+_priority = ContextVar("llm_priority", default=PRIORITY_CHAT)
+_session = ContextVar("llm_session", default=None)
+
+def set_request_context(priority: int = None, session=None):
+    """Set the priority and/or session for LLM calls made from the current context"""
+    if priority is not None:
+        _priority.set(priority)
+    if session is not None:
+        _session.set(session)
+
+@contextmanager
+def request_context(priority: int = None, session=None):
+    """Temporarily set the priority and/or session for LLM calls"""
+    tokens = []
+    if priority is not None:
+        tokens.append((_priority, _priority.set(priority)))
+    if session is not None:
+        tokens.append((_session, _session.set(session)))
+    try:
+        yield
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+class SlotTimer:
+    """
+    When a request got its slot, so backend latency can leave out the queue wait
+
+    Pass one to slot()/aslot() (or the llm_client *_once calls); elapsed()
+    counts from the grant, or from creation if the request never queued.
+    """
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.granted_at = None
+
+    def elapsed(self) -> float:
+        return time.monotonic() - (self.granted_at or self.started)
+
+class _Waiter:
+    """One queued request; granted from whichever thread releases a slot"""
+
+    def __init__(self, priority: int, session, loop=None):
+        self.priority = priority
+        self.session = session
+        self.queued_at = time.monotonic()
+        self.granted = False
+        self.cancelled = False
+        self._loop = loop
+        if loop is None:
+            self._event = threading.Event()
+        else:
+            self._future = loop.create_future()
+
+    def grant(self):
+        self.granted = True
+        if self._loop is None:
+            self._event.set()
+        else:
+            self._loop.call_soon_threadsafe(self._resolve)
+
+    def abort(self):
+        """Wake a blocked thread without a slot (its generation was cancelled)"""
+        self._event.set()
+
+    def wait(self):
+        self._event.wait()
+
+    async def wait_async(self):
+        await self._future
+
+    def _resolve(self):
+        if not self._future.done():
+            self._future.set_result(None)
+
+class LLMScheduler:
+    """
+    Bounded in-flight LLM requests with priority classes and per-session fairness
+
+    Up to max_in_flight requests run at once. Everyone else waits in a queue
+    per priority class; within a class, sessions take turns (round robin), so
+    one busy browser tab can't starve the others. Works for threads (slot())
+    and coroutines (aslot()) sharing the same limit.
+    """
+
+    def __init__(self, max_in_flight: int = DEFAULT_MAX_IN_FLIGHT):
+        self.max_in_flight = max_in_flight
+        self._lock = threading.Lock()
+        self._in_flight = 0
+
+        # priority -> session -> deque of waiters, plus the round-robin order of sessions
+        self._queues = {p: {} for p in PRIORITY_NAMES}
+        self._turns = {p: deque() for p in PRIORITY_NAMES}
+
+        # Per-priority wait stats
+        self._granted = {p: 0 for p in PRIORITY_NAMES}
+        self._wait_total = {p: 0.0 for p in PRIORITY_NAMES}
+        self._wait_max = {p: 0.0 for p in PRIORITY_NAMES}
+
+    def _enqueue(self, waiter: _Waiter):
+        """Grant now if a slot is free and nobody is waiting, otherwise queue (lock held)"""
+        if self._in_flight < self.max_in_flight and not self._queued():
+            self._grant(waiter)
+            return
+
+        sessions = self._queues[waiter.priority]
+        if waiter.session not in sessions:
+            sessions[waiter.session] = deque()
+            self._turns[waiter.priority].append(waiter.session)
+        sessions[waiter.session].append(waiter)
+
+    def _queued(self):
+        return sum(len(q) for sessions in self._queues.values() for q in sessions.values())
+
+    def idle(self) -> bool:
+        """True when no request is running or waiting, so background work can start"""
+        with self._lock:
+            return self._in_flight == 0 and not self._queued()
+
+    def _grant(self, waiter: _Waiter):
+        """Hand a slot to a waiter (lock held)"""
+        self._in_flight += 1
+        waited = time.monotonic() - waiter.queued_at
+        self._granted[waiter.priority] += 1
+        self._wait_total[waiter.priority] += waited
+        self._wait_max[waiter.priority] = max(self._wait_max[waiter.priority], waited)
+        observe("llm_queue", waited)
+        waiter.grant()
+
+    def _next_waiter(self):
+        """Highest priority class first, sessions in turn within it (lock held)"""
+        for priority in sorted(self._queues):
+            turns = self._turns[priority]
+            sessions = self._queues[priority]
+            while turns:
+                session = turns.popleft()
+                queue = sessions[session]
+                waiter = queue.popleft()
+                if queue:
+                    turns.append(session)
+                else:
+                    del sessions[session]
+                if not waiter.cancelled:
+                    return waiter
+        return None
+
+    def _remove(self, waiter: _Waiter):
+        """Drop a waiter that gave up before being granted (lock held)"""
+        waiter.cancelled = True
+        queue = self._queues[waiter.priority].get(waiter.session)
+        if queue and waiter in queue:
+            queue.remove(waiter)
+            if not queue:
+                del self._queues[waiter.priority][waiter.session]
+                self._turns[waiter.priority].remove(waiter.session)
+
+    def release(self):
+        """Free a slot and hand it to the next waiter"""
+        with self._lock:
+            self._in_flight -= 1
+            while self._in_flight < self.max_in_flight:
+                waiter = self._next_waiter()
+                if waiter is None:
+                    break
+                self._grant(waiter)
+
+    def _abandon(self, waiter: _Waiter):
+        """Give up a place in the queue, or the slot if it was granted meanwhile"""
+        with self._lock:
+            granted = waiter.granted
+            if not granted:
+                self._remove(waiter)
+        if granted:
+            self.release()
+
+    @contextmanager
+    def slot(self, priority: int = None, session=None, cancel=None, timer: SlotTimer = None):
+        """
+        Hold an LLM slot for the duration of a blocking call
+
+        If the cancel token fires while queued, the place is given up and
+        GenerationCancelled is raised.
+        """
+        waiter = _Waiter(_priority.get() if priority is None else priority,
+                         _session.get() if session is None else session)
+        with self._lock:
+            self._enqueue(waiter)
+            queued = not waiter.granted
+        unregister = cancel.on_cancel(waiter.abort) if cancel is not None else None
+        with tracing.span("llm_queue", priority=PRIORITY_NAMES[waiter.priority]) if queued else nullcontext():
+            waiter.wait()
+        if unregister is not None:
+            unregister()
+            if cancel.cancelled:
+                self._abandon(waiter)
+                raise GenerationCancelled(cancel.reason)
+        if timer is not None:
+            timer.granted_at = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release()
+
+    @asynccontextmanager
+    async def aslot(self, priority: int = None, session=None, timer: SlotTimer = None):
+        """Hold an LLM slot for the duration of an async call"""
+        waiter = _Waiter(_priority.get() if priority is None else priority,
+                         _session.get() if session is None else session,
+                         loop=asyncio.get_running_loop())
+        with self._lock:
+            self._enqueue(waiter)
+            queued = not waiter.granted
+        try:
+            with tracing.span("llm_queue", priority=PRIORITY_NAMES[waiter.priority]) if queued else nullcontext():
+                await waiter.wait_async()
+        except asyncio.CancelledError:
+            self._abandon(waiter)
+            raise
+        if timer is not None:
+            timer.granted_at = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self):
+        """Queue depth and wait times per priority class"""
+        with self._lock:
+            classes = {}
+            for priority, name in PRIORITY_NAMES.items():
+                granted = self._granted[priority]
+                classes[name] = {
+                    "queued": sum(len(q) for q in self._queues[priority].values()),
+                    "waiting_sessions": len(self._queues[priority]),
+                    "granted": granted,
+                    "avg_wait_ms": round(self._wait_total[priority] / granted * 1000, 1) if granted else 0.0,
+                    "max_wait_ms": round(self._wait_max[priority] * 1000, 1),
+                }
+            return {
+                "max_in_flight": self.max_in_flight,
+                "in_flight": self._in_flight,
+                "queued": self._queued(),
+                "priorities": classes,
+            }
+
+_scheduler = LLMScheduler()
+
+# api_base -> scheduler of a routed backend with its own slots (see configure_backend())
+_backend_schedulers = {}
+
+def configure(max_in_flight: int = None):
+    """Override scheduler settings (usually from the "scheduler" section of config.json)"""
+    if max_in_flight is not None:
+        with _scheduler._lock:
+            _scheduler.max_in_flight = max(1, int(max_in_flight))
+
+def configure_backend(api_base: str, max_in_flight: int = None):
+    """
+    Give one backend its own slots, so a busy server doesn't hold up the others
+
+    max_in_flight defaults to the process-wide scheduler's (match that
+    server's OLLAMA_NUM_PARALLEL).
+    """
+    scheduler = LLMScheduler(max(1, int(max_in_flight)) if max_in_flight else _scheduler.max_in_flight)
+    _backend_schedulers[api_base] = scheduler
+    return scheduler
+
+def get_scheduler(api_base: str = None):
+    """The scheduler for calls to api_base: the backend's own, or the process-wide one"""
+    return _backend_schedulers.get(api_base, _scheduler)
+
+def idle() -> bool:
+    """True when no scheduler has a request running or waiting"""
+    return all(scheduler.idle() for scheduler in [_scheduler, *_backend_schedulers.values()])
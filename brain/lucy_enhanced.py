@@ -6,13 +6,37 @@ Designed for kids' conversations with short and long-term memory
 
 import sys
 import json
-import requests
 import os
 import time
 import random
+import sqlite3
+import threading
+import weakref
 from pathlib import Path
 from datetime import datetime, timedelta
 
+import llm_client
+import llm_scheduler
+import llm_router
+from llm_client import chat_completion, stream_chat, achat, astream_chat
+from cancellation import CancelToken, GenerationCancelled
+from llm_scheduler import request_context, PRIORITY_BACKGROUND
+from context_window import ContextWindow, token_budget_for
+from conversation_summarizer import ConversationSummarizer, format_transcript
+from model_residency import ModelResidency
+from prefetch import Prefetcher
+from response_cache import ResponseCache, make_key
+from semantic_cache import SemanticCache, is_cacheable_question
+from fact_journal import FactJournal
+from memory_store import MemoryStore, DB_NAME as MEMORY_DB_NAME
+import model_cascade
+import reply_budget
+import metrics
+import tracing
+import profiling
+import memory_tracker
+import clock as lucy_clock
+
 # --- CONFIG LOADING ---
 def load_config():
     """Load configuration with fallback logic"""
@@ -46,10 +70,86 @@ def load_config():
 
 CFG, _ = load_config()
 
-API_BASE = CFG.get("api_base", "http://localhost:11434/v1")
+# LUCY_API_BASE points a run at another server, e.g. brain/mock_llm.py
+API_BASE = os.environ.get("LUCY_API_BASE") or CFG.get("api_base", "http://localhost:11434/v1")
 CHAT_MODEL = CFG.get("chat_model", "qwen2.5:1.5b")
 DATA_ROOT = Path(CFG.get("data_root", "data"))
 MEMORY_PATH = Path(CFG.get("memory_path", DATA_ROOT / "lucy_memory"))
+REPLY_MAX_TOKENS = 150
+
+# Prompt size per model, leaving room for the reply
+CONTEXT_TOKEN_BUDGET = token_budget_for(CFG, CHAT_MODEL, REPLY_MAX_TOKENS)
+
+# Stage latencies are written here when a console session ends
+METRICS_FILE = DATA_ROOT / "metrics" / "lucy_enhanced.prom"
+
+# One trace per turn (view with: python brain/trace_view.py)
+tracing.from_config(CFG, DATA_ROOT / "traces" / "lucy_traces.jsonl")
+
+# Off unless LUCY_PROFILE or "profiling" in the config says otherwise
+profiling.from_config(CFG, DATA_ROOT / "profiles")
+
+# tracemalloc reports (started on demand, or at startup with "memory_tracking")
+memory_tracker.from_config(CFG, DATA_ROOT / "memory")
+
+# Messages held per conversation; past this they are written to a log and dropped
+HISTORY_LIMIT = CFG.get("history_limit", 400)
+
+# Where facts and conversations are kept: "json" (learned_facts.json and one file per
+# conversation) or "sqlite" (indexed, in lucy_memory.db; the JSON files are imported once)
+MEMORY_BACKEND = CFG.get("memory_backend", "json")
+
+# Compact evicted turns in a worker thread ("thread") or only while idle ("idle")
+SUMMARIZE_MODE = CFG.get("summarize_mode", "thread")
+IDLE_COMPACT_SECONDS = 5    # "idle" mode: quiet this long before old turns are compacted
+SUMMARY_PROMPT = """You keep short notes for Lucy, a robot friend who talks with kids.
+Update the notes with the new part of the conversation. Keep names, ages, likes,
+pets, and anything the child taught Lucy or asked her to remember.
+Reply with the updated notes only, in at most 4 short sentences."""
+
+# Greetings, farewells and idle thoughts generated ahead of time while Lucy is idle
+PREFETCH = CFG.get("prefetch", {})
+PREFETCH_KINDS = ("greeting", "farewell", "idle")
+PREFETCH_PROMPTS = {
+    "greeting": "Say hello and introduce yourself briefly!",
+    "farewell": "Say goodbye briefly!",
+    "idle": "The child has gone quiet. Say one short, curious thing to get them talking again.",
+}
+PREFETCH_IDLE_SECONDS = PREFETCH.get("idle_seconds", 3)
+
+llm_client.configure(**CFG.get("http", {}))
+llm_scheduler.configure(**CFG.get("scheduler", {}))
+
+# Spread requests over several backends if the config lists them
+ROUTER = llm_router.configure(CFG, API_BASE)
+
+# Small model for chit-chat, CHAT_MODEL (or a bigger one) for hard questions
+CASCADE = model_cascade.from_config(CFG, CHAT_MODEL)
+
+# Keeps every model the cascade can pick (and CHAT_MODEL) loaded in Ollama while anyone is chatting
+RESIDENCY = ModelResidency(API_BASE, CASCADE.models() + [CHAT_MODEL], keep_alive=CFG.get("keep_alive", "10m"),
+                           ping_interval=CFG.get("keep_alive_interval", 120))
+
+# Replies to repeated prompts, shared by every LucyBrain in the process
+CACHE_CFG = CFG.get("response_cache", {})
+RESPONSE_CACHE = None
+if CACHE_CFG.get("enabled", True):
+    RESPONSE_CACHE = ResponseCache(
+        max_entries=CACHE_CFG.get("max_entries", 256),
+        ttl=CACHE_CFG.get("ttl", 24 * 3600),
+        disk_path=(DATA_ROOT / "response_cache") if CACHE_CFG.get("disk", True) else None,
+        max_disk_entries=CACHE_CFG.get("max_disk_entries", 2000)
+    )
+
+# Answers to general questions, reused for paraphrases of the same question
+SEMANTIC_CFG = CFG.get("semantic_cache", {})
+SEMANTIC_CACHE = None
+if SEMANTIC_CFG.get("enabled", True):
+    SEMANTIC_CACHE = SemanticCache(
+        max_entries=SEMANTIC_CFG.get("max_entries", 500),
+        threshold=SEMANTIC_CFG.get("threshold", 0.82),
+        ttl=SEMANTIC_CFG.get("ttl", 7 * 24 * 3600)
+    )
 
 # Ensure directories exist
 MEMORY_PATH.mkdir(parents=True, exist_ok=True)
@@ -64,6 +164,15 @@ if prompt_path.exists():
 else:
     SYSTEM_PROMPT = "You are Lucy, a curious robot who loves learning from kids!"
 
+# Semantic cache entries are only shared between brains with the same model and prompt
+# (and sentence budget - see LucyBrain.semantic_namespace)
+SEMANTIC_NAMESPACE = f"{CHAT_MODEL}:{hash(SYSTEM_PROMPT)}"
+
+FALLBACK_REPLY = "Oops, I'm having trouble thinking right now. Can you say that again? 😅"
+
+def _cancelled(cancel) -> bool:
+    return cancel is not None and cancel.cancelled
+
 # ==============================
 # MEMORY SYSTEM
 # ==============================
@@ -71,16 +180,20 @@ else:
 class LucyMemory:
     """Manages Lucy's short and long-term memory"""
 
-    def __init__(self, memory_path: Path):
+    def __init__(self, memory_path: Path, clock=None):
         self.memory_path = memory_path
+        self.clock = clock or lucy_clock.SYSTEM
         self.memory_path.mkdir(parents=True, exist_ok=True)
 
         # Short-term: Current conversation context
         self.conversation_history = []
-        self.conversation_start = datetime.now()
+        self.conversation_start = self.clock.now()
+        self.message_count = 0  # Including messages already written to a log
 
-        # Long-term: Persistent facts about kids and world
+        # Long-term: Persistent facts about kids and world (a snapshot plus
+        # an append-only journal, so remembering a fact writes one line)
         self.facts_file = memory_path / "learned_facts.json"
+        self.journal = FactJournal(self.facts_file)
         self.facts = self._load_facts()
 
         # Conversation logs
@@ -89,18 +202,25 @@ class LucyMemory:
 
     def _load_facts(self):
         """Load learned facts from disk"""
-        if self.facts_file.exists():
-            try:
-                return json.loads(self.facts_file.read_text())
-            except:
-                return {"kids": {}, "world": {}, "preferences": {}}
-        return {"kids": {}, "world": {}, "preferences": {}}
+        facts = {"kids": {}, "world": {}, "preferences": {}}
+        try:
+            facts.update(self.journal.load())
+        except OSError as e:
+            print(f"[Memory] Error loading facts: {e}")
+        return facts
 
-    def _save_facts(self):
-        """Save learned facts to disk"""
+    def _save_fact(self, category: str, key: str):
+        """Append one changed fact to the journal"""
         try:
-            self.facts_file.write_text(json.dumps(self.facts, indent=2))
-        except Exception as e:
+            self.journal.append(category, key, self.facts[category][key])
+        except OSError as e:
+            print(f"[Memory] Error saving facts: {e}")
+
+    def close(self):
+        """Fold the fact journal into learned_facts.json (end of a session)"""
+        try:
+            self.journal.close()
+        except OSError as e:
             print(f"[Memory] Error saving facts: {e}")
 
     def remember_fact(self, category: str, key: str, value: str):
@@ -110,10 +230,10 @@ class LucyMemory:
 
         self.facts[category][key] = {
             "value": value,
-            "learned_at": datetime.now().isoformat(),
+            "learned_at": self.clock.now().isoformat(),
             "mentions": self.facts[category].get(key, {}).get("mentions", 0) + 1
         }
-        self._save_facts()
+        self._save_fact(category, key)
         print(f"[Memory] Remembered: {category}/{key} = {value}")
 
     def recall_facts(self, category: str = None):
@@ -132,11 +252,23 @@ class LucyMemory:
 
     def add_to_conversation(self, role: str, content: str):
         """Add message to short-term conversation history"""
-        self.conversation_history.append({
+        message = {
             "role": role,
             "content": content,
-            "timestamp": datetime.now().isoformat()
-        })
+            "timestamp": self.clock.now().isoformat()
+        }
+        self.conversation_history.append(message)
+        self._record_message(message)
+        self.message_count += 1
+
+        # A robot that talks all day would otherwise keep every message in memory
+        if HISTORY_LIMIT and len(self.conversation_history) >= HISTORY_LIMIT:
+            self.save_conversation_log()
+            self.conversation_history = []
+            self.conversation_start = self.clock.now()
+
+    def _record_message(self, message: dict):
+        """Nothing to do here; the whole conversation is written by save_conversation_log"""
 
     def get_conversation_context(self, max_messages: int = 10):
         """Get recent conversation for context"""
@@ -147,12 +279,12 @@ class LucyMemory:
         if not self.conversation_history:
             return
 
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        timestamp = self.clock.now().strftime("%Y%m%d_%H%M%S")
         log_file = self.logs_dir / f"conversation_{timestamp}.json"
 
         log_data = {
             "started_at": self.conversation_start.isoformat(),
-            "ended_at": datetime.now().isoformat(),
+            "ended_at": self.clock.now().isoformat(),
             "messages": self.conversation_history,
             "facts_learned": len([m for m in self.conversation_history if "remember" in m.get("content", "").lower()])
         }
@@ -160,16 +292,143 @@ class LucyMemory:
         log_file.write_text(json.dumps(log_data, indent=2))
         print(f"[Memory] Conversation saved to {log_file.name}")
 
+    def saved_conversations(self) -> int:
+        """How many conversations have been saved"""
+        return len(list(self.logs_dir.glob("*.json")))
+
+class SQLiteMemory(LucyMemory):
+    """
+    LucyMemory kept in lucy_memory.db ("memory_backend": "sqlite")
+
+    Facts and every turn are written as they happen, tagged with the child's
+    name once Lucy learns it, so "what did Felicity say last month" is an
+    index lookup (python brain/memory_store.py <memory folder> search ...).
+    """
+
+    def __init__(self, memory_path: Path, clock=None):
+        memory_path.mkdir(parents=True, exist_ok=True)
+        self.store = MemoryStore(memory_path / MEMORY_DB_NAME)
+        if self.store.created:
+            counts = self.store.migrate_json(memory_path)
+            if counts["facts"] or counts["conversations"]:
+                print(f"[Memory] Imported {counts['facts']} facts and {counts['conversations']} "
+                      f"conversations into {MEMORY_DB_NAME}")
+        self.conversation_id = None     # Row in conversations, started with the first message
+        self.child = ""                 # The child's name, once they tell us
+        super().__init__(memory_path, clock)
+
+    def _load_facts(self):
+        facts = {"kids": {}, "world": {}, "preferences": {}}
+        try:
+            facts.update(self.store.load_facts())
+        except sqlite3.Error as e:
+            print(f"[Memory] Error loading facts: {e}")
+        return facts
+
+    def _save_fact(self, category: str, key: str):
+        fact = self.facts[category][key]
+        # "I'm 6 years old" also looks like a name to _try_extract_fact
+        if category == "kids" and key == "current_child_name" and str(fact["value"]).isalpha():
+            self._set_child(fact["value"])
+        try:
+            fact["mentions"] = self.store.remember(category, key, fact["value"], fact["learned_at"], self.child)
+        except sqlite3.Error as e:
+            print(f"[Memory] Error saving facts: {e}")
+
+    def _set_child(self, name: str):
+        self.child = name
+        if self.conversation_id is not None:
+            try:
+                self.store.set_child(self.conversation_id, name)
+            except sqlite3.Error as e:
+                print(f"[Memory] Error saving conversation: {e}")
+
+    def _record_message(self, message: dict):
+        try:
+            if self.conversation_id is None:
+                self.conversation_id = self.store.start_conversation(
+                    self.conversation_start.isoformat(), self.child)
+            self.store.add_turn(self.conversation_id, message["role"], message["content"],
+                                message["timestamp"], self.child)
+        except sqlite3.Error as e:
+            print(f"[Memory] Error saving conversation: {e}")
+
+    def save_conversation_log(self):
+        """Mark the conversation finished (its turns are already saved)"""
+        if self.conversation_id is None:
+            return
+        try:
+            self.store.end_conversation(self.conversation_id, self.clock.now().isoformat())
+            print(f"[Memory] Conversation {self.conversation_id} saved to {MEMORY_DB_NAME}")
+        except sqlite3.Error as e:
+            print(f"[Memory] Error saving conversation: {e}")
+        self.conversation_id = None
+
+    def saved_conversations(self) -> int:
+        return self.store.conversation_count()
+
+    def close(self):
+        """Close the database (it opens again if this memory is used after the session)"""
+        self.store.close()
+
 # ==============================
 # LUCY BRAIN
 # ==============================
 
+# Every LucyBrain still alive; one that outlives its websocket shows up here
+LIVE_BRAINS = weakref.WeakSet()
+memory_tracker.get_tracker().gauge("live LucyBrain", lambda: len(LIVE_BRAINS))
+memory_tracker.get_tracker().gauge(
+    "conversation messages held",
+    lambda: sum(len(brain.memory.conversation_history) for brain in list(LIVE_BRAINS)))
+
+# One prefetcher for the whole process, shared by the brains that want prefetched lines
+PREFETCHER = None
+PREFETCH_BRAINS = weakref.WeakSet()
+_prefetcher_lock = threading.Lock()
+
+def _prefetch_idle():
+    """Prefetch only while the LLM has nothing else to do and no child has just spoken"""
+    brains = list(PREFETCH_BRAINS)
+    if not brains or not llm_scheduler.idle():
+        return False
+    return all(brain._is_idle() for brain in brains)
+
+def _prefetch_generate(kind: str, prompt: str):
+    """Generate a line with the memory of the brain that was talked to last"""
+    brains = list(PREFETCH_BRAINS)
+    if not brains:
+        return None
+    return max(brains, key=lambda brain: brain.last_interaction)._prefetch_generate(kind, prompt)
+
+def get_prefetcher(kinds):
+    """The process-wide prefetcher, started on first use and extended to these kinds"""
+    global PREFETCHER
+    with _prefetcher_lock:
+        if PREFETCHER is None:
+            PREFETCHER = Prefetcher(_prefetch_generate, {}, depth=PREFETCH.get("depth", 2),
+                                    is_idle=_prefetch_idle)
+            PREFETCHER.start()
+        PREFETCHER.add_kinds({kind: PREFETCH_PROMPTS[kind] for kind in kinds})
+        return PREFETCHER
+
 class LucyBrain:
     """Lucy's conversational brain with memory and curiosity"""
 
-    def __init__(self):
-        self.memory = LucyMemory(MEMORY_PATH)
-        self.last_interaction = time.time()
+    def __init__(self, prefetch=PREFETCH_KINDS, mode: str = "web", clock=None, memory_path=None,
+                 summarize_mode: str = None):
+        # A clock.VirtualClock lets tests skip pauses and idle time instead of sleeping
+        self.clock = clock or lucy_clock.SYSTEM
+        memory_class = SQLiteMemory if MEMORY_BACKEND == "sqlite" else LucyMemory
+        self.memory = memory_class(Path(memory_path) if memory_path else MEMORY_PATH, self.clock)
+        self.last_interaction = self.clock.time()
+        self._in_flight = 0
+        self.session_id = f"brain-{id(self):x}"  # Background work queues as this session
+        LIVE_BRAINS.add(self)
+
+        # Replies stop after a few sentences ("voice" replies are spoken, "web" ones read)
+        self.budget = reply_budget.from_config(CFG, mode)
+        self.semantic_namespace = f"{SEMANTIC_NAMESPACE}:{self.budget.max_sentences}"
         self.idle_thoughts = [
             "I wonder what clouds taste like... do you think they're sweet? ☁️",
             "Do you have a favorite animal? I want to learn about animals!",
@@ -181,8 +440,31 @@ class LucyBrain:
             "Do you have any pets? I'd love to hear about them! 🐕",
         ]
 
-        # Initialize conversation with memory context
-        self.messages = self._build_initial_context()
+        # Initialize conversation with memory context. The window evicts old
+        # turns in chunks once over the token budget, so Ollama can keep
+        # reusing its prompt cache in between.
+        self.context = ContextWindow(self._build_initial_context(), token_budget=CONTEXT_TOKEN_BUDGET)
+
+        # Evicted turns are folded into a rolling summary instead of forgotten
+        # ("off" only queues them until someone calls summarizer.run_pending())
+        self.summarize_mode = summarize_mode or SUMMARIZE_MODE
+        self.summarizer = ConversationSummarizer(
+            self._summarize, background=(self.summarize_mode == "thread")
+        )
+
+        # Ready-made lines for the turns that don't depend on what was just said.
+        # Leftovers from the last session are loaded so the first greeting is instant.
+        self.prefetcher = None
+        self.prefetch_file = self.memory.memory_path / "prefetched.json"
+        if prefetch and PREFETCH.get("enabled", True):
+            self.prefetcher = get_prefetcher(prefetch)
+            self.prefetcher.load(self.prefetch_file, PREFETCH.get("max_age", 12 * 3600))
+            PREFETCH_BRAINS.add(self)
+
+    @property
+    def messages(self):
+        """Messages sent to the LLM (system prompt, memory, recent turns)"""
+        return self.context.messages
 
     def _build_initial_context(self):
         """Build initial context with system prompt and memories"""
@@ -198,53 +480,368 @@ class LucyBrain:
 
         return context
 
-    def call_llm(self, messages):
-        """Call the LLM with error handling"""
-        try:
-            resp = requests.post(f"{API_BASE}/chat/completions", json={
-                "model": CHAT_MODEL,
-                "messages": messages,
-                "temperature": 0.8,  # Higher for more creativity
-                "max_tokens": 150
-            }, timeout=30)
+    def _llm_payload(self, messages, model=None):
+        """Request body shared by the blocking and streaming calls"""
+        return self.budget.apply({
+            "model": model or CHAT_MODEL,
+            "messages": messages,
+            "temperature": 0.8,  # Higher for more creativity
+            "max_tokens": REPLY_MAX_TOKENS
+        })
 
-            if resp.status_code != 200:
-                return None
+    def _cache_lookup(self, messages, model=None):
+        """Return (key, cached reply) for a request; both None when caching is off"""
+        if RESPONSE_CACHE is None:
+            return None, None
+        payload = self._llm_payload(messages, model)
+        key = make_key(payload["model"], messages, temperature=payload["temperature"],
+                       max_tokens=payload["max_tokens"], sentences=self.budget.max_sentences)
+        cached = RESPONSE_CACHE.get(key)
+        if cached:
+            tracing.annotate(response_cache=True)
+        return key, cached
+
+    def _cache_store(self, key, reply):
+        if RESPONSE_CACHE is not None and reply:
+            RESPONSE_CACHE.put(key, reply.strip())
+
+    def call_llm(self, messages, model=None, cancel: CancelToken = None):
+        """Call the LLM with error handling (repeated prompts come from the cache)"""
+        key, cached = self._cache_lookup(messages, model)
+        if cached:
+            return cached
+
+        self.context.observe(messages)
+        self._in_flight += 1
+        try:
+            payload = self._llm_payload(messages, model)
+            if self.budget.max_sentences:
+                # Streamed underneath so generation stops at the sentence budget
+                reply = "".join(self.budget.limit(stream_chat(API_BASE, payload, timeout=30, cancel=cancel)))
+                if _cancelled(cancel):
+                    raise GenerationCancelled(cancel.reason)
+            else:
+                reply = chat_completion(API_BASE, payload, timeout=30, cancel=cancel)
+            self._cache_store(key, reply)
+            return reply
+        except GenerationCancelled:
+            print("[LLM] Cancelled")
+            return None
+        except Exception as e:
+            print(f"[LLM] Error: {e}")
+            return None
+        finally:
+            self._in_flight -= 1
+
+    def stream_llm(self, messages, model=None, cancel: CancelToken = None):
+        """Stream the LLM reply token by token (yields nothing on error, stops when cancelled)"""
+        key, cached = self._cache_lookup(messages, model)
+        if cached:
+            yield cached
+            return
 
-            return resp.json()["choices"][0]["message"]["content"]
+        self.context.observe(messages)
+        self._in_flight += 1
+        parts = []
+        try:
+            stream = stream_chat(API_BASE, self._llm_payload(messages, model), timeout=30, cancel=cancel)
+            for token in self.budget.limit(stream):
+                parts.append(token)
+                yield token
+            if _cancelled(cancel):
+                print("[LLM] Cancelled")
+            else:
+                self._cache_store(key, "".join(parts))
+        except Exception as e:
+            print(f"[LLM] Stream error: {e}")
+        finally:
+            self._in_flight -= 1
+
+    async def acall_llm(self, messages, model=None, cancel: CancelToken = None):
+        """Async call_llm for use on an event loop"""
+        key, cached = self._cache_lookup(messages, model)
+        if cached:
+            return cached
+
+        self.context.observe(messages)
+        self._in_flight += 1
+        try:
+            payload = self._llm_payload(messages, model)
+            if self.budget.max_sentences:
+                stream = astream_chat(API_BASE, payload, timeout=30, cancel=cancel)
+                reply = "".join([token async for token in self.budget.alimit(stream)])
+                if _cancelled(cancel):
+                    raise GenerationCancelled(cancel.reason)
+            else:
+                reply = await achat(API_BASE, payload, timeout=30, cancel=cancel)
+            self._cache_store(key, reply)
+            return reply
+        except GenerationCancelled:
+            print("[LLM] Cancelled")
+            return None
         except Exception as e:
             print(f"[LLM] Error: {e}")
             return None
+        finally:
+            self._in_flight -= 1
+
+    async def astream_llm(self, messages, model=None, cancel: CancelToken = None):
+        """Async stream_llm for use on an event loop"""
+        key, cached = self._cache_lookup(messages, model)
+        if cached:
+            yield cached
+            return
 
-    def process_message(self, user_input: str):
-        """Process user input and generate response"""
-        self.last_interaction = time.time()
+        self.context.observe(messages)
+        self._in_flight += 1
+        parts = []
+        try:
+            stream = astream_chat(API_BASE, self._llm_payload(messages, model), timeout=30, cancel=cancel)
+            async for token in self.budget.alimit(stream):
+                parts.append(token)
+                yield token
+            if _cancelled(cancel):
+                print("[LLM] Cancelled")
+            else:
+                self._cache_store(key, "".join(parts))
+        except Exception as e:
+            print(f"[LLM] Stream error: {e}")
+        finally:
+            self._in_flight -= 1
+
+    def _is_idle(self):
+        """True when no reply is being generated and the child hasn't just spoken"""
+        return self._in_flight == 0 and self.clock.time() - self.last_interaction > PREFETCH_IDLE_SECONDS
+
+    def _facts_hint(self):
+        """A few remembered facts, to make prefetched lines personal"""
+        hints = []
+        for category, facts in self.memory.recall_facts().items():
+            for key, data in facts.items():
+                hints.append(f"{key.replace('_', ' ')}: {data.get('value', '')}")
+        return "; ".join(hints[-6:])
+
+    def _prefetch_generate(self, kind: str, prompt: str):
+        """Generate one greeting, farewell or idle thought (runs in the shared prefetch thread)"""
+        facts = self._facts_hint()
+        if facts:
+            prompt = f"Things you remember about the child: {facts}\n\n{prompt}"
+
+        # Same pinned prefix as the conversation, so Ollama reuses its prompt cache
+        pinned = self.context.messages[:self.context.pinned]
+        with request_context(PRIORITY_BACKGROUND, self.session_id), tracing.span("prefetch", kind=kind):
+            return chat_completion(API_BASE, {
+                "model": CHAT_MODEL,
+                "messages": pinned + [{"role": "user", "content": prompt}],
+                "temperature": 0.9,
+                "max_tokens": 60
+            }, timeout=60)
+
+    def _prefetched_or_live(self, kind: str):
+        """A prefetched line if one is ready, otherwise ask the LLM now"""
+        text = self.prefetcher.get(kind) if self.prefetcher else None
+        if text:
+            return text
+        return self.call_llm(self.messages + [
+            {"role": "user", "content": PREFETCH_PROMPTS[kind]}
+        ])
+
+    def _summarize(self, previous_summary: str, messages):
+        """Fold evicted messages into the running summary (runs off the request path)"""
+        notes = previous_summary or "(none yet)"
+        with request_context(PRIORITY_BACKGROUND, self.session_id), tracing.span("summarize", messages=len(messages)):
+            return chat_completion(API_BASE, {
+                "model": CHAT_MODEL,
+                "messages": [
+                    {"role": "system", "content": SUMMARY_PROMPT},
+                    {"role": "user", "content": f"Notes so far: {notes}\n\nNew conversation:\n{format_transcript(messages)}"}
+                ],
+                "temperature": 0.2,
+                "max_tokens": 150
+            }, timeout=60)
+
+    def _trim_context(self):
+        """Evict old turns if over budget and hand them to the summarizer"""
+        evicted = self.context.trim()
+        if evicted:
+            self.summarizer.submit(evicted)
+
+    def _start_turn(self, user_input: str):
+        """Record the user's message before asking the LLM"""
+        self.last_interaction = self.clock.time()
+        self._turn_started = time.perf_counter()
+
+        # Pick up a summary the summarizer finished since the last turn
+        summary = self.summarizer.take_update()
+        if summary:
+            self.context.set_summary(summary)
 
         # Add to short-term memory
         self.memory.add_to_conversation("user", user_input)
-        self.messages.append({"role": "user", "content": user_input})
+        self.context.append("user", user_input)
+        self._trim_context()
 
-        # Get Lucy's response
-        reply = self.call_llm(self.messages)
-
-        if reply:
-            # Add to short-term memory
-            self.memory.add_to_conversation("assistant", reply)
-            self.messages.append({"role": "assistant", "content": reply})
+    def _finish_turn(self, user_input: str, reply: str):
+        """Record Lucy's reply and learn from the exchange"""
+        # Add to short-term memory
+        self.memory.add_to_conversation("assistant", reply)
+        self.context.append("assistant", reply)
 
-            # Check if Lucy learned something (simple keyword detection)
-            if any(keyword in user_input.lower() for keyword in ["my favorite", "i like", "i love", "i have"]):
-                # Extract potential facts (simplified)
-                self._try_extract_fact(user_input, reply)
+        # Check if Lucy learned something (simple keyword detection)
+        if any(keyword in user_input.lower() for keyword in ["my favorite", "i like", "i love", "i have"]):
+            # Extract potential facts (simplified)
+            self._try_extract_fact(user_input, reply)
 
-            # Trim conversation history to prevent token overflow
-            if len(self.messages) > 20:
-                # Keep system message and last 18 messages
-                self.messages = [self.messages[0]] + self.messages[-18:]
+        # Trim conversation history to prevent token overflow
+        self._trim_context()
+        metrics.observe("turn", time.perf_counter() - self._turn_started)
 
-            return reply
-        else:
-            return "Oops, I'm having trouble thinking right now. Can you say that again? 😅"
+    def _semantic_answer(self, user_input: str):
+        """A cached answer to an earlier wording of the same general question, or None"""
+        if SEMANTIC_CACHE is None or not is_cacheable_question(user_input):
+            return None
+        with tracing.span("semantic_cache") as span:
+            reply, score = SEMANTIC_CACHE.lookup(self.semantic_namespace, user_input)
+            span.set(hit=bool(reply))
+        if reply:
+            print(f"[Cache] Reusing answer for a similar question ({score:.2f})")
+        return reply
+
+    def _semantic_store(self, user_input: str, reply: str):
+        if SEMANTIC_CACHE is not None and reply and is_cacheable_question(user_input):
+            SEMANTIC_CACHE.add(self.semantic_namespace, user_input, reply)
+
+    def _interrupted(self, user_input: str, partial: str):
+        """
+        Record a cancelled turn: whatever Lucy already said stays in the
+        conversation, but nothing is cached
+        """
+        tracing.annotate(cancelled=True)
+        if partial:
+            self._finish_turn(user_input, partial)
+
+    @profiling.profiled("brain.process_message")
+    def process_message(self, user_input: str, cancel: CancelToken = None):
+        """
+        Process user input and generate response
+
+        Returns None if the cancel token fired before the reply was ready.
+        """
+        with tracing.span("brain.turn", session=self.session_id, mode=self.budget.mode):
+            self._start_turn(user_input)
+
+            # Get Lucy's response
+            reply = self._semantic_answer(user_input)
+            if not reply:
+                model, tier = CASCADE.route(user_input)
+                start = time.time()
+                reply = self.call_llm(self.messages, model, cancel)
+                if _cancelled(cancel):
+                    self._interrupted(user_input, "")
+                    return None
+                CASCADE.record(tier, time.time() - start)
+                self._semantic_store(user_input, reply)
+
+            if reply:
+                self._finish_turn(user_input, reply)
+                return reply
+            else:
+                return FALLBACK_REPLY
+
+    @profiling.profiled("brain.process_message")
+    def process_message_stream(self, user_input: str, cancel: CancelToken = None):
+        """
+        Process user input, yielding Lucy's reply as it is generated
+
+        The full reply is recorded in memory once the stream finishes, just
+        like process_message. If the cancel token fires the stream stops
+        early and only the part already yielded is remembered.
+        """
+        with tracing.span("brain.turn", session=self.session_id, mode=self.budget.mode):
+            self._start_turn(user_input)
+
+            cached = self._semantic_answer(user_input)
+            if cached:
+                yield cached
+                self._finish_turn(user_input, cached)
+                return
+
+            model, tier = CASCADE.route(user_input)
+            start, first_token = time.time(), None
+            parts = []
+            for token in self.stream_llm(self.messages, model, cancel):
+                if first_token is None:
+                    first_token = time.time() - start
+                parts.append(token)
+                yield token
+
+            reply = "".join(parts).strip()
+            if _cancelled(cancel):
+                self._interrupted(user_input, reply)
+                return
+            CASCADE.record(tier, time.time() - start, first_token)
+
+            self._semantic_store(user_input, reply)
+            if reply:
+                self._finish_turn(user_input, reply)
+            else:
+                yield FALLBACK_REPLY
+
+    @profiling.profiled("brain.process_message")
+    async def aprocess_message(self, user_input: str, cancel: CancelToken = None):
+        """Async process_message - lets other sessions run while Lucy thinks"""
+        with tracing.span("brain.turn", session=self.session_id, mode=self.budget.mode):
+            self._start_turn(user_input)
+
+            reply = self._semantic_answer(user_input)
+            if not reply:
+                model, tier = CASCADE.route(user_input)
+                start = time.time()
+                reply = await self.acall_llm(self.messages, model, cancel)
+                if _cancelled(cancel):
+                    self._interrupted(user_input, "")
+                    return None
+                CASCADE.record(tier, time.time() - start)
+                self._semantic_store(user_input, reply)
+
+            if reply:
+                self._finish_turn(user_input, reply)
+                return reply
+            else:
+                return FALLBACK_REPLY
+
+    @profiling.profiled("brain.process_message")
+    async def aprocess_message_stream(self, user_input: str, cancel: CancelToken = None):
+        """Async process_message_stream for the web servers"""
+        with tracing.span("brain.turn", session=self.session_id, mode=self.budget.mode):
+            self._start_turn(user_input)
+
+            cached = self._semantic_answer(user_input)
+            if cached:
+                yield cached
+                self._finish_turn(user_input, cached)
+                return
+
+            model, tier = CASCADE.route(user_input)
+            start, first_token = time.time(), None
+            parts = []
+            async for token in self.astream_llm(self.messages, model, cancel):
+                if first_token is None:
+                    first_token = time.time() - start
+                parts.append(token)
+                yield token
+
+            reply = "".join(parts).strip()
+            if _cancelled(cancel):
+                self._interrupted(user_input, reply)
+                return
+            CASCADE.record(tier, time.time() - start, first_token)
+
+            self._semantic_store(user_input, reply)
+            if reply:
+                self._finish_turn(user_input, reply)
+            else:
+                yield FALLBACK_REPLY
 
     def _try_extract_fact(self, user_input: str, lucy_reply: str):
         """Try to extract and remember facts from conversation"""
@@ -267,13 +864,23 @@ class LucyBrain:
             elif "animal" in lower_input:
                 self.memory.remember_fact("preferences", "favorite_animal", user_input)
 
+    def get_greeting(self):
+        """Lucy's hello at the start of a conversation"""
+        return self._prefetched_or_live("greeting")
+
+    def get_farewell(self):
+        """Lucy's goodbye at the end of a conversation"""
+        return self._prefetched_or_live("farewell")
+
     def get_idle_thought(self):
         """Generate an idle thought when conversation pauses"""
-        return random.choice(self.idle_thoughts)
+        thought = self.prefetcher.get("idle") if self.prefetcher else None
+        return thought or random.choice(self.idle_thoughts)
 
     def should_speak_up(self):
         """Determine if Lucy should say something during idle time"""
-        idle_duration = time.time() - self.last_interaction
+        idle_duration = self.clock.time() - self.last_interaction
+        self.compact_when_idle()
 
         # After 30 seconds of silence, occasionally speak up
         if idle_duration > 30:
@@ -281,13 +888,42 @@ class LucyBrain:
 
         return False
 
+    def compact_when_idle(self):
+        """In "idle" mode, a quiet moment is when old turns get compacted"""
+        if self.summarize_mode != "idle" or self._in_flight:
+            return False
+        if self.clock.time() - self.last_interaction <= IDLE_COMPACT_SECONDS:
+            return False
+        return self.summarizer.has_pending() and self.summarizer.run_pending()
+
     def end_conversation(self):
         """Clean up and save conversation"""
+        self.summarizer.stop()
+        if self.prefetcher:
+            # The prefetcher keeps going for the other sessions; this one's leftovers are saved
+            PREFETCH_BRAINS.discard(self)
+            self.prefetcher.save(self.prefetch_file, PREFETCH.get("max_age", 12 * 3600))
         self.memory.save_conversation_log()
+        self.memory.close()
 
         print("\n" + "="*60)
-        print(f"[Session] Conversation lasted {len(self.memory.conversation_history)} messages")
+        print(f"[Session] Conversation lasted {self.memory.message_count} messages")
         print(f"[Memory] Total facts remembered: {self.memory.get_memory_summary()}")
+        print(f"[Context] {self.context.describe()}")
+        if self.prefetcher:
+            p = self.prefetcher.stats()
+            print(f"[Prefetch] {p['hits']} served instantly, {p['misses']} live, {p['generated']} generated "
+                  f"(all sessions)")
+        if RESPONSE_CACHE is not None:
+            c = RESPONSE_CACHE.stats()
+            print(f"[Cache] {c['hits']} hits ({c['disk_hits']} from disk), {c['misses']} misses, "
+                  f"{c['entries']} cached")
+        if SEMANTIC_CACHE is not None:
+            c = SEMANTIC_CACHE.stats()
+            print(f"[Cache] {c['hits']} similar questions answered from {c['entries']} cached answers")
+        if CASCADE.enabled:
+            print(f"[Cascade] {CASCADE.describe()}")
+        print(f"[Budget] {self.budget.describe()}")
         print("="*60)
 
 # ==============================
@@ -306,12 +942,12 @@ def conversation_test(iterations: int = None):
     print("          'idle' to trigger idle behavior")
     print("="*60 + "\n")
 
+    # Start loading the model while Lucy's memory loads
+    RESIDENCY.acquire()
     lucy = LucyBrain()
 
     # Initial greeting
-    greeting = lucy.call_llm(lucy.messages + [
-        {"role": "user", "content": "Say hello and introduce yourself briefly!"}
-    ])
+    greeting = lucy.get_greeting()
     print(f"Lucy: {greeting}\n")
 
     iteration_count = 0
@@ -327,17 +963,16 @@ def conversation_test(iterations: int = None):
 
             # Handle commands
             if user_input.lower() in ["exit", "quit", "bye", "goodbye"]:
-                farewell = lucy.call_llm(lucy.messages + [
-                    {"role": "user", "content": "Say goodbye briefly!"}
-                ])
+                farewell = lucy.get_farewell()
                 print(f"Lucy: {farewell}\n")
                 break
 
             elif user_input.lower() == "memory":
                 print(f"\n[Lucy's Memory]")
                 print(f"  Facts: {lucy.memory.get_memory_summary()}")
-                print(f"  Conversation: {len(lucy.memory.conversation_history)} messages")
-                print(f"  Saved logs: {len(list(lucy.memory.logs_dir.glob('*.json')))}\n")
+                print(f"  Conversation: {lucy.memory.message_count} messages")
+                print(f"  Context: {lucy.context.describe()}")
+                print(f"  Saved logs: {lucy.memory.saved_conversations()}\n")
                 continue
 
             elif user_input.lower() == "idle":
@@ -345,9 +980,24 @@ def conversation_test(iterations: int = None):
                 print(f"Lucy: {idle_thought}\n")
                 continue
 
-            # Process message
-            reply = lucy.process_message(user_input)
-            print(f"Lucy: {reply}\n")
+            # Process message, printing Lucy's words as they arrive
+            # (Ctrl+C interrupts Lucy instead of ending the conversation)
+            print("Lucy: ", end="", flush=True)
+            cancel = CancelToken()
+            stream = lucy.process_message_stream(user_input, cancel)
+            said = []
+            try:
+                for token in stream:
+                    said.append(token)
+                    print(token, end="", flush=True)
+            except KeyboardInterrupt:
+                # Usually lands in the stream's blocking read, which ends the generator
+                # before it can record anything, so remember what was said here
+                cancel.cancel("interrupted")
+                stream.close()
+                lucy._interrupted(user_input, "".join(said).strip())
+                print(" [Interrupted]", end="")
+            print("\n")
 
             iteration_count += 1
 
@@ -366,6 +1016,11 @@ def conversation_test(iterations: int = None):
 
     # End conversation
     lucy.end_conversation()
+    RESIDENCY.release()
+    metrics.get_metrics().dump(METRICS_FILE)
+    print(f"[Metrics] Stage latency (saved to {METRICS_FILE}):\n{metrics.get_metrics().describe()}")
+    print(f"[Trace] {tracing.get_tracer().describe()}")
+    print(f"[Memory] {memory_tracker.get_tracker().describe()}")
 
 if __name__ == "__main__":
     import argparse
@@ -5,13 +5,19 @@ Lucy Unified 2.5 - Configurable Brain
 
 import sys
 import json
-import requests
 import os
 import subprocess
 import argparse
 from pathlib import Path
 from datetime import datetime
 
+import llm_client
+import llm_scheduler
+import llm_router
+from llm_client import chat_completion, stream_chat, tool_call_state
+from llm_scheduler import set_request_context, PRIORITY_BACKGROUND
+from metrics import timed
+
 # --- CONFIG LOADING ---
 CONFIG_PATH = "/home/z/lucy_brains_config/config.json"
 DEFAULT_CONFIG = {
@@ -34,6 +40,12 @@ CHAT_MODEL = CFG.get("chat_model", DEFAULT_CONFIG["chat_model"])
 GREENHOUSE_ROOT = CFG.get("greenhouse_root", DEFAULT_CONFIG["greenhouse_root"])
 DATABASE_PATH = CFG.get("database_path", DEFAULT_CONFIG["database_path"])
 
+llm_client.configure(**CFG.get("http", {}))
+llm_scheduler.configure(**CFG.get("scheduler", {}))
+
+# Spread requests over several backends if the config lists them
+ROUTER = llm_router.configure(CFG, API_BASE)
+
 # Load System Prompt
 try:
     with open(CFG.get("prompt_path", DEFAULT_CONFIG["prompt_path"]), "r") as f:
@@ -76,20 +88,42 @@ TOOLS = {
 
 def call_llm(messages):
     try:
-        resp = requests.post(f"{API_BASE}/chat/completions", json={
+        return chat_completion(API_BASE, {
             "model": CHAT_MODEL,
             "messages": messages,
             "temperature": 0.1
-        }, timeout=120)
-        return resp.json()["choices"][0]["message"]["content"]
+        })
     except Exception as e: return f"❌ LLM Error: {e}"
 
+def stream_llm(messages):
+    try:
+        yield from stream_chat(API_BASE, {
+            "model": CHAT_MODEL,
+            "messages": messages,
+            "temperature": 0.1
+        })
+    except Exception as e: yield f"❌ LLM Error: {e}"
+
+def stream_reply(messages, show_tools=False):
+    """Print a streamed reply as it arrives (unless it's a tool call) and return it"""
+    reply, printing = "", False
+    for token in stream_llm(messages):
+        reply += token
+        if not printing and (show_tools or tool_call_state(reply) is False):
+            printing = True
+            print(f"lucy> {reply}", end="", flush=True)
+        elif printing: print(token, end="", flush=True)
+    if printing: print()
+    elif show_tools or not tool_call_state(reply): print(f"lucy> {reply}")
+    return reply
+
 def perform_audit():
     messages = [
         {"role": "system", "content": SYSTEM_PROMPT},
         {"role": "user", "content": "Lucy, perform your standard system audit. Ensure everything is running correctly. If the service is stopped, restart it."}
     ]
     print(f"🛡️ Lucy Guardian: Commencing System Audit at {datetime.now()}")
+    set_request_context(PRIORITY_BACKGROUND, session="audit")  # Never ahead of someone talking to Lucy
 
     for i in range(10):
         reply = call_llm(messages)
@@ -99,14 +133,16 @@ def perform_audit():
             print(f"\n✅ AUDIT COMPLETE: {reply.split('SUMMARY:')[1].strip()}\n")
             break
 
+        # Not streamed, so nothing was shown yet: "Checking the service. TOOL: ..." still runs
         if "TOOL:" in reply:
-            parts = reply.split("|")
+            parts = reply[reply.index("TOOL:"):].split("|")
             t_name = parts[0].replace("TOOL:", "").strip()
             t_args = parts[1].replace("ARGS:", "").strip() if len(parts) > 1 else ""
 
             print(f"🤖 Step {i+1}: {t_name} {t_args}")
             if t_name in TOOLS:
-                result = TOOLS[t_name](t_args) if t_args else TOOLS[t_name]()
+                with timed("tool"):
+                    result = TOOLS[t_name](t_args) if t_args else TOOLS[t_name]()
                 print(f"🔧 Tool Result: {result}")
                 messages.append({"role": "assistant", "content": reply})
                 messages.append({"role": "user", "content": f"TOOL RESULT: {result}"})
@@ -133,19 +169,18 @@ def main():
                 if not inp: continue
                 if inp.lower() in ["exit", "quit"]: break
                 messages.append({"role": "user", "content": inp})
-                reply = call_llm(messages)
-                if "TOOL:" in reply:
+                reply = stream_reply(messages)
+                if tool_call_state(reply):
                     parts = reply.split("|")
                     t_name = parts[0].replace("TOOL:", "").strip()
                     t_args = parts[1].replace("ARGS:", "").strip() if len(parts) > 1 else ""
                     if t_name in TOOLS:
-                        result = TOOLS[t_name](t_args) if t_args else TOOLS[t_name]()
+                        with timed("tool"):
+                            result = TOOLS[t_name](t_args) if t_args else TOOLS[t_name]()
                         print(result)
                         messages.append({"role": "assistant", "content": f"TOOL RESULT: {result}"})
-                        follow_up = call_llm(messages)
-                        print(f"lucy> {follow_up}")
+                        stream_reply(messages, show_tools=True)
                     else: print(f"❌ Unknown tool: {t_name}")
-                else: print(f"lucy> {reply}")
             except:
                 break
 
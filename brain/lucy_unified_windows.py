@@ -9,11 +9,29 @@ import json
 import requests
 import os
 import subprocess
+import asyncio
+import time
 import argparse
 import platform
 from pathlib import Path
 from datetime import datetime
 
+import llm_client
+import llm_scheduler
+import llm_router
+import model_cascade
+import reply_budget
+import metrics
+import tracing
+import profiling
+import memory_tracker
+from context_window import ContextWindow, token_budget_for
+from model_residency import ModelResidency
+from llm_client import (
+    http_get, ollama_base, chat_completion, stream_chat, achat, astream_chat, tool_call_state
+)
+from cancellation import CancelToken, GenerationCancelled
+
 # --- CONFIG LOADING ---
 def load_config():
     """Load configuration with fallback logic"""
@@ -61,10 +79,41 @@ def load_config():
 
 CFG, CONFIG_PATH = load_config()
 
-API_BASE = CFG.get("api_base", "http://localhost:11434/v1")
+# LUCY_API_BASE points a run at another server, e.g. brain/mock_llm.py
+API_BASE = os.environ.get("LUCY_API_BASE") or CFG.get("api_base", "http://localhost:11434/v1")
 CHAT_MODEL = CFG.get("chat_model", "qwen2.5-coder:1.5b")
 GREENHOUSE_ROOT = CFG.get("greenhouse_root", ".")
 DATABASE_PATH = CFG.get("database_path", "./greenhouse.db")
+REPLY_MAX_TOKENS = 500
+
+# Prompt size per model, leaving room for the reply
+CONTEXT_TOKEN_BUDGET = token_budget_for(CFG, CHAT_MODEL, REPLY_MAX_TOKENS)
+
+llm_client.configure(**CFG.get("http", {}))
+llm_scheduler.configure(**CFG.get("scheduler", {}))
+
+# Spread requests over several backends if the config lists them
+ROUTER = llm_router.configure(CFG, API_BASE)
+
+# Small model for chit-chat, CHAT_MODEL (or a bigger one) for tool use and hard questions
+CASCADE = model_cascade.from_config(CFG, CHAT_MODEL)
+
+# Keeps every model the cascade can pick (and CHAT_MODEL) loaded in Ollama while anyone is chatting
+RESIDENCY = ModelResidency(API_BASE, CASCADE.models() + [CHAT_MODEL], keep_alive=CFG.get("keep_alive", "10m"),
+                           ping_interval=CFG.get("keep_alive_interval", 120))
+
+# Tool loop replies stop after a few sentences (tool calls are never cut)
+BUDGET = reply_budget.from_config(CFG, "tool")
+
+# Stage latencies are written here when the console session ends
+METRICS_FILE = Path(CFG.get("data_root", GREENHOUSE_ROOT)) / "metrics" / "lucy_windows.prom"
+
+# One trace per turn (view with: python brain/trace_view.py)
+tracing.from_config(CFG, Path(CFG.get("data_root", GREENHOUSE_ROOT)) / "traces" / "lucy_traces.jsonl")
+
+# Off unless LUCY_PROFILE or "profiling" in the config says otherwise
+profiling.from_config(CFG, Path(CFG.get("data_root", GREENHOUSE_ROOT)) / "profiles")
+memory_tracker.from_config(CFG, Path(CFG.get("data_root", GREENHOUSE_ROOT)) / "memory")
 
 # Load System Prompt
 SYSTEM_PROMPT = ""
@@ -103,11 +152,17 @@ def tool_system_info() -> str:
 def tool_check_ollama() -> str:
     """Check if Ollama is running and available"""
     try:
-        resp = requests.get(f"{API_BASE.replace('/v1', '')}/api/tags", timeout=5)
+        resp = http_get(f"{ollama_base(API_BASE)}/api/tags", "tags")
         if resp.status_code == 200:
             models = resp.json().get("models", [])
             model_names = [m["name"] for m in models]
-            return f"✅ Ollama is running\n📦 Available models: {', '.join(model_names)}"
+            residency = RESIDENCY.status()
+            loaded = ", ".join(f"{name}: {'loaded' if info['resident'] else 'not loaded'}"
+                               for name, info in residency["models"].items())
+            load_time = residency["last_load_seconds"]
+            load_time = f"{load_time}s" if load_time is not None else "n/a"
+            return (f"✅ Ollama is running\n📦 Available models: {', '.join(model_names)}\n"
+                    f"🧠 {loaded} (state: {residency['state']}, last load: {load_time})")
         return f"⚠️ Ollama responded but unexpected status: {resp.status_code}"
     except requests.exceptions.ConnectionError:
         return "❌ Ollama is not running. Start it with: ollama serve"
@@ -225,30 +280,104 @@ To use a tool, respond with: TOOL: <tool_name> | ARGS: <arguments>
 When done with all tasks, respond with: SUMMARY: <brief summary>
 """
 
-def call_llm(messages):
-    """Call the LLM API"""
+def _llm_payload(messages, model=None):
+    """Request body shared by the blocking and streaming calls"""
+    return BUDGET.apply({
+        "model": model or CHAT_MODEL,
+        "messages": messages,
+        "temperature": 0.7,
+        "max_tokens": REPLY_MAX_TOKENS
+    })
+
+def call_llm(messages, model=None, cancel=None):
+    """Call the LLM API (returns "" if cancelled)"""
     try:
-        resp = requests.post(f"{API_BASE}/chat/completions", json={
-            "model": CHAT_MODEL,
-            "messages": messages,
-            "temperature": 0.7,
-            "max_tokens": 500
-        }, timeout=120)
-
-        if resp.status_code != 200:
-            return f"❌ LLM API error: {resp.status_code} - {resp.text}"
-
-        return resp.json()["choices"][0]["message"]["content"]
+        return BUDGET.trim(chat_completion(API_BASE, _llm_payload(messages, model), cancel=cancel))
+    except GenerationCancelled:
+        return ""
     except requests.exceptions.ConnectionError:
         return "❌ Cannot connect to Ollama. Make sure it's running: ollama serve"
+    except RuntimeError as e:
+        return f"❌ {e}"
     except Exception as e:
         return f"❌ LLM Error: {e}"
 
+def stream_llm(messages, model=None, cancel=None):
+    """Stream the LLM reply token by token (errors are yielded as text, like call_llm)"""
+    try:
+        yield from BUDGET.limit(stream_chat(API_BASE, _llm_payload(messages, model), cancel=cancel))
+    except requests.exceptions.ConnectionError:
+        yield "❌ Cannot connect to Ollama. Make sure it's running: ollama serve"
+    except Exception as e:
+        yield f"❌ LLM Error: {e}"
+
+async def acall_llm(messages, model=None, cancel=None):
+    """Async call_llm for the web server's event loop"""
+    try:
+        return BUDGET.trim(await achat(API_BASE, _llm_payload(messages, model), cancel=cancel))
+    except GenerationCancelled:
+        return ""
+    except Exception as e:
+        if "connect" in type(e).__name__.lower():
+            return "❌ Cannot connect to Ollama. Make sure it's running: ollama serve"
+        return f"❌ LLM Error: {e}"
+
+async def astream_llm(messages, model=None, cancel=None):
+    """Async stream_llm for the web server's event loop"""
+    try:
+        stream = astream_chat(API_BASE, _llm_payload(messages, model), cancel=cancel)
+        async for token in BUDGET.alimit(stream):
+            yield token
+    except Exception as e:
+        if "connect" in type(e).__name__.lower():
+            yield "❌ Cannot connect to Ollama. Make sure it's running: ollama serve"
+        else:
+            yield f"❌ LLM Error: {e}"
+
+async def arun_tool(tool, args: str = ""):
+    """Run a (blocking, often subprocess-based) tool in a worker thread"""
+    with metrics.timed("tool"), tracing.span("tool", tool=getattr(tool, "__name__", "tool"), args=args):
+        if args:
+            return await asyncio.to_thread(tool, args)
+        return await asyncio.to_thread(tool)
+
+def print_streamed_reply(messages, model=None, cancel=None):
+    """
+    Stream a reply to the console and return the full text
+
+    Tool calls aren't printed as they arrive; the tool loop reports them.
+    Ctrl+C cancels the generation and returns what was said so far.
+    """
+    reply = ""
+    printing = False
+    try:
+        for token in stream_llm(messages, model, cancel):
+            reply += token
+            if not printing and tool_call_state(reply) is False:
+                printing = True
+                print(f"Lucy: {reply}", end="", flush=True)
+            elif printing:
+                print(token, end="", flush=True)
+    except KeyboardInterrupt:
+        if cancel is None:
+            raise
+        cancel.cancel("interrupted")
+        print(" [Interrupted]" if printing else "[Interrupted]", end="")
+        printing = True
+
+    if printing:
+        print("\n")
+    elif not tool_call_state(reply):
+        # Too short to tell (e.g. "T") - still show it
+        print(f"Lucy: {reply}\n")
+    return reply
+
 def interactive_mode():
     """Interactive chat mode"""
-    messages = [
+    context = ContextWindow([
         {"role": "system", "content": SYSTEM_PROMPT + "\n\n" + TOOL_DESCRIPTIONS}
-    ]
+    ], token_budget=CONTEXT_TOKEN_BUDGET)
+    messages = context.messages
 
     print(f"\n{'='*60}")
     print(f"💬 Lucy Interactive Mode")
@@ -258,6 +387,8 @@ def interactive_mode():
     print(f"API: {API_BASE}")
     print(f"{'='*60}\n")
 
+    RESIDENCY.acquire()
+
     # Initial greeting
     greeting = call_llm(messages + [{"role": "user", "content": "Introduce yourself briefly."}])
     print(f"Lucy: {greeting}\n")
@@ -272,42 +403,62 @@ def interactive_mode():
             if user_input.lower() in ["exit", "quit", "bye"]:
                 farewell = call_llm(messages + [{"role": "user", "content": "Say goodbye briefly."}])
                 print(f"Lucy: {farewell}")
+                print(f"[Context] {context.describe()}")
+                if CASCADE.enabled:
+                    print(f"[Cascade] {CASCADE.describe()}")
+                print(f"[Budget] {BUDGET.describe()}")
                 break
 
-            messages.append({"role": "user", "content": user_input})
-
-            # Allow multiple tool uses
-            for _ in range(5):  # Max 5 tool uses per turn
-                reply = call_llm(messages)
-
-                # Check for tool use
-                if "TOOL:" in reply:
-                    parts = reply.split("|")
-                    tool_name = parts[0].replace("TOOL:", "").strip()
-                    tool_args = parts[1].replace("ARGS:", "").strip() if len(parts) > 1 else ""
-
-                    print(f"🔧 Using tool: {tool_name} {tool_args}")
-
-                    if tool_name in TOOLS:
-                        result = TOOLS[tool_name](tool_args) if tool_args else TOOLS[tool_name]()
-                        print(result)
+            with tracing.span("console.turn"):
+                messages.append({"role": "user", "content": user_input})
+
+                # One model for the whole turn, tool rounds included
+                model, tier = CASCADE.route(user_input, tools=True)
+                start = time.time()
+                cancel = CancelToken()
+
+                # Allow multiple tool uses
+                for _ in range(5):  # Max 5 tool uses per turn
+                    # Tool results can be long - make room before each call
+                    context.trim()
+                    context.observe(messages)
+                    reply = print_streamed_reply(messages, model, cancel)
+
+                    if cancel.cancelled:
+                        # Keep what was said; drop a half-written tool call
+                        if reply.strip() and not tool_call_state(reply):
+                            messages.append({"role": "assistant", "content": reply})
+                        break
 
-                        messages.append({"role": "assistant", "content": reply})
-                        messages.append({"role": "user", "content": f"TOOL RESULT: {result}"})
+                    # Check for tool use
+                    if tool_call_state(reply):
+                        parts = reply.split("|")
+                        tool_name = parts[0].replace("TOOL:", "").strip()
+                        tool_args = parts[1].replace("ARGS:", "").strip() if len(parts) > 1 else ""
+
+                        print(f"🔧 Using tool: {tool_name} {tool_args}")
+
+                        if tool_name in TOOLS:
+                            with metrics.timed("tool"), tracing.span("tool", tool=tool_name, args=tool_args):
+                                result = TOOLS[tool_name](tool_args) if tool_args else TOOLS[tool_name]()
+                            print(result)
+
+                            messages.append({"role": "assistant", "content": reply})
+                            messages.append({"role": "user", "content": f"TOOL RESULT: {result}"})
+                        else:
+                            print(f"❌ Unknown tool: {tool_name}")
+                            messages.append({"role": "assistant", "content": reply})
+                            messages.append({"role": "user", "content": f"ERROR: Unknown tool '{tool_name}'"})
+                            break
                     else:
-                        print(f"❌ Unknown tool: {tool_name}")
+                        # Regular response (already streamed to the console)
                         messages.append({"role": "assistant", "content": reply})
-                        messages.append({"role": "user", "content": f"ERROR: Unknown tool '{tool_name}'"})
                         break
-                else:
-                    # Regular response
-                    print(f"Lucy: {reply}\n")
-                    messages.append({"role": "assistant", "content": reply})
-                    break
 
-            # Trim conversation history
-            if len(messages) > 20:
-                messages = [messages[0]] + messages[-18:]
+                CASCADE.record(tier, time.time() - start)
+
+                # Trim conversation history (in chunks, to keep the prompt cache warm)
+                context.trim()
 
         except KeyboardInterrupt:
             print("\n\nBye!")
@@ -315,6 +466,12 @@ def interactive_mode():
         except Exception as e:
             print(f"Error: {e}")
 
+    RESIDENCY.release()
+    metrics.get_metrics().dump(METRICS_FILE)
+    print(f"[Metrics] Stage latency (saved to {METRICS_FILE}):\n{metrics.get_metrics().describe()}")
+    print(f"[Trace] {tracing.get_tracer().describe()}")
+    print(f"[Memory] {memory_tracker.get_tracker().describe()}")
+
 def test_mode():
     """Test Lucy's capabilities"""
     print(f"\n{'='*60}")
@@ -346,6 +503,14 @@ def test_mode():
         except Exception as e:
             print(f"❌ {e}")
 
+    print("\nTesting model residency...")
+    if RESIDENCY.preload():
+        status = RESIDENCY.status()
+        print(f"  ✅ {', '.join(RESIDENCY.models)} loaded in {status['last_load_seconds']}s "
+              f"(resident: {status['resident']})")
+    else:
+        print(f"  ❌ Could not load {', '.join(RESIDENCY.models)}: {RESIDENCY.last_error}")
+
     print("\nTesting LLM connection...")
     try:
         test_msg = [
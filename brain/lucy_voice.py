@@ -10,7 +10,17 @@ import sys
 import os
 import time
 import json
-import requests
+
+from llm_client import stream_chat, iter_sentences
+from cancellation import CancelToken
+from reply_budget import ReplyBudget
+from metrics import get_metrics, configure as configure_metrics, timed
+import tracing
+import profiling
+import memory_tracker
+from llm_scheduler import set_request_context, PRIORITY_VOICE
+from context_window import ContextWindow
+from model_residency import ModelResidency
 
 # Add Lucy's brain path
 sys.path.append('/home/z/lucy')
@@ -22,6 +32,13 @@ PLAYBACK_DEVICE = "hw:3,0"  # JBL Quantum One speakers
 # Lucy brain configuration
 API_BASE = "http://localhost:11434/v1"
 CHAT_MODEL = "qwen2.5-coder:1.5b"
+REPLY_MAX_TOKENS = 100  # Keep responses short
+CONTEXT_TOKENS = 2048   # Small prompts keep the Pi responsive
+SENTENCE_BUDGET = 3     # Stop generating once Lucy has this many sentences to say
+METRICS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'metrics', 'lucy_voice.prom')
+TRACE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'traces', 'lucy_traces.jsonl')
+PROFILE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'profiles')
+MEMORY_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'memory')
 
 # Child-friendly system prompt
 SYSTEM_PROMPT = """You are Lucy, a friendly AI assistant for a 6-year-old girl named Felicity. You are kind, patient, and love teaching about the world.
@@ -41,15 +58,19 @@ Keep your answers:
 When you don't know something, admit it cheerfully and suggest exploring it together.
 Be warm, friendly, and make learning fun!"""
 
+FALLBACK_REPLY = "Hmm, I'm having trouble thinking right now. Can you ask me again?"
+
 def set_talking():
     """Update face to talking mode"""
     try:
         import socket
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.settimeout(0.5)
-        sock.connect(('localhost', 5555))
-        sock.send(json.dumps({'talking': True, 'listening': False}).encode())
-        sock.close()
+        with timed("face_ipc"), tracing.span("face_ipc", state="talking"):
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.settimeout(0.5)
+            sock.connect(('localhost', 5555))
+            # The trace ID lets the face record when it actually drew the change
+            sock.send(json.dumps({'talking': True, 'listening': False, **tracing.propagate()}).encode())
+            sock.close()
     except:
         pass
 
@@ -57,11 +78,12 @@ def set_listening():
     """Update face to listening mode"""
     try:
         import socket
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.settimeout(0.5)
-        sock.connect(('localhost', 5555))
-        sock.send(json.dumps({'talking': False, 'listening': True}).encode())
-        sock.close()
+        with timed("face_ipc"), tracing.span("face_ipc", state="listening"):
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.settimeout(0.5)
+            sock.connect(('localhost', 5555))
+            sock.send(json.dumps({'talking': False, 'listening': True, **tracing.propagate()}).encode())
+            sock.close()
     except:
         pass
 
@@ -69,11 +91,12 @@ def set_idle():
     """Update face to idle mode"""
     try:
         import socket
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.settimeout(0.5)
-        sock.connect(('localhost', 5555))
-        sock.send(json.dumps({'talking': False, 'listening': False}).encode())
-        sock.close()
+        with timed("face_ipc"), tracing.span("face_ipc", state="idle"):
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.settimeout(0.5)
+            sock.connect(('localhost', 5555))
+            sock.send(json.dumps({'talking': False, 'listening': False, **tracing.propagate()}).encode())
+            sock.close()
     except:
         pass
 
@@ -82,16 +105,21 @@ class LucyVoice:
         self.recognizer = sr.Recognizer()
         self.recognizer.energy_threshold = 1500
         self.recognizer.dynamic_energy_threshold = True
-        self.messages = [{'role': 'system', 'content': SYSTEM_PROMPT}]
+        # Small token budget, evicted in chunks so the LLM's prompt cache stays warm
+        self.context = ContextWindow(
+            [{'role': 'system', 'content': SYSTEM_PROMPT}],
+            token_budget=CONTEXT_TOKENS - REPLY_MAX_TOKENS
+        )
+        self.messages = self.context.messages
         self.running = True
-
-    def speak(self, text):
-        """Convert text to speech and play through JBL speakers"""
-        print(f"Lucy: {text}")
-        set_talking()
-
-        try:
-            # Use espeak with higher pitch for child-friendly voice
+        self.residency = ModelResidency(API_BASE, CHAT_MODEL)
+        self.cancel = None  # Token for the reply being spoken, if any
+        self.budget = ReplyBudget("voice", SENTENCE_BUDGET)
+
+    def _say(self, text):
+        """Run espeak for one piece of text"""
+        # Use espeak with higher pitch for child-friendly voice
+        with timed("tts"), tracing.span("tts", chars=len(text)):
             subprocess.run([
                 'espeak',
                 '-v', 'en+f4',  # Female voice variant 4
@@ -101,6 +129,28 @@ class LucyVoice:
                 text
             ], check=True)
 
+    def speak(self, text):
+        """Convert text to speech and play through JBL speakers"""
+        print(f"Lucy: {text}")
+        set_talking()
+
+        try:
+            self._say(text)
+        except Exception as e:
+            print(f"Speech error: {e}")
+        finally:
+            set_idle()
+
+    def speak_stream(self, tokens, cancel=None):
+        """Speak a streamed reply sentence by sentence as it is generated"""
+        set_talking()
+
+        try:
+            for sentence in iter_sentences(tokens):
+                if cancel is not None and cancel.cancelled:
+                    break
+                print(f"Lucy: {sentence}")
+                self._say(sentence)
         except Exception as e:
             print(f"Speech error: {e}")
         finally:
@@ -117,14 +167,16 @@ class LucyVoice:
                 self.recognizer.adjust_for_ambient_noise(source, duration=0.3)
 
                 # Listen for audio
-                audio = self.recognizer.listen(source, timeout=timeout, phrase_time_limit=8)
+                with timed("listen"), tracing.span("listen"):
+                    audio = self.recognizer.listen(source, timeout=timeout, phrase_time_limit=8)
 
                 set_idle()
                 print("Got it! Processing...")
 
                 try:
                     # Use Google Speech Recognition
-                    text = self.recognizer.recognize_google(audio)
+                    with timed("stt"), tracing.span("stt"):
+                        text = self.recognizer.recognize_google(audio)
                     return text
                 except sr.UnknownValueError:
                     print("Didn't catch that")
@@ -141,52 +193,111 @@ class LucyVoice:
             print(f"Listening error: {e}")
             return None
 
+    def _llm_payload(self):
+        """Request body shared by the blocking and streaming calls"""
+        self.context.observe(self.messages)
+        return self.budget.apply({
+            "model": CHAT_MODEL,
+            "messages": self.messages,
+            "temperature": 0.7,
+            "max_tokens": REPLY_MAX_TOKENS
+        })
+
+    def _remember_reply(self, reply):
+        """Add Lucy's reply to the conversation and trim it"""
+        self.messages.append({'role': 'assistant', 'content': reply})
+
+        # Keep conversation history manageable
+        self.context.trim()
+
     def get_lucy_response(self, user_input):
         """Get response from Lucy's brain"""
         try:
             self.messages.append({'role': 'user', 'content': user_input})
+            self.context.trim()
 
-            response = requests.post(f"{API_BASE}/chat/completions", json={
-                "model": CHAT_MODEL,
-                "messages": self.messages,
-                "temperature": 0.7,
-                "max_tokens": 100  # Keep responses short
-            }, timeout=30)
+            # Streamed underneath so generation stops at the sentence budget
+            tokens = stream_chat(API_BASE, self._llm_payload(), timeout=30)
+            reply = "".join(self.budget.limit(tokens)).strip()
+            if not reply:
+                return FALLBACK_REPLY
+            self._remember_reply(reply)
 
-            reply = response.json()["choices"][0]["message"]["content"]
-            self.messages.append({'role': 'assistant', 'content': reply})
+            return reply
 
-            # Keep conversation history manageable
-            if len(self.messages) > 10:
-                self.messages = [self.messages[0]] + self.messages[-8:]
+        except Exception as e:
+            print(f"Brain error: {e}")
+            return FALLBACK_REPLY
 
-            return reply
+    def stream_lucy_response(self, user_input, cancel=None):
+        """Get response from Lucy's brain, yielding tokens as they are generated"""
+        self.messages.append({'role': 'user', 'content': user_input})
+        self.context.trim()
 
+        parts = []
+        try:
+            tokens = stream_chat(API_BASE, self._llm_payload(), timeout=30, cancel=cancel)
+            for token in self.budget.limit(tokens):
+                parts.append(token)
+                yield token
         except Exception as e:
             print(f"Brain error: {e}")
-            return "Hmm, I'm having trouble thinking right now. Can you ask me again?"
+        finally:
+            # Also runs when the reply is interrupted, so Lucy remembers what she said
+            reply = "".join(parts).strip()
+            if reply:
+                self._remember_reply(reply)
+
+        if not parts and not (cancel is not None and cancel.cancelled):
+            yield FALLBACK_REPLY
+
+    def interrupt(self):
+        """
+        Stop the reply being generated and spoken (safe to call from any thread)
+
+        Closes the LLM stream, so Ollama stops generating; Lucy finishes the
+        sentence she is on and goes quiet.
+        """
+        if self.cancel is not None:
+            self.cancel.cancel("interrupted")
 
     def conversation_loop(self):
         """Main conversation loop"""
-        self.speak("Hi Felicity! I'm Lucy. Ask me anything about animals, computers, or nature!")
+        # Load the model while the greeting plays, and keep it loaded
+        self.residency.acquire()
+        set_request_context(PRIORITY_VOICE, session="voice")
+        with tracing.span("voice.greeting"):
+            self.speak("Hi Felicity! I'm Lucy. Ask me anything about animals, computers, or nature!")
 
         while self.running:
             try:
-                user_text = self.listen(timeout=10)
-
-                if user_text:
-                    print(f"Felicity: {user_text}")
-
-                    # Check for exit commands
-                    lower_text = user_text.lower()
-                    if any(word in lower_text for word in ["goodbye", "bye", "stop talking", "go away"]):
-                        self.speak("Bye bye! Come back soon!")
-                        self.running = False
-                        break
-
-                    # Get and speak response
-                    response = self.get_lucy_response(user_text)
-                    self.speak(response)
+                # One trace per turn, from listening to the end of the reply
+                with tracing.span("voice.turn"):
+                    user_text = self.listen(timeout=10)
+
+                    if user_text:
+                        print(f"Felicity: {user_text}")
+
+                        # Check for exit commands
+                        lower_text = user_text.lower()
+                        if any(word in lower_text for word in ["goodbye", "bye", "stop talking", "go away"]):
+                            self.speak("Bye bye! Come back soon!")
+                            self.running = False
+                            break
+
+                        # Speak the response as it streams in
+                        # (Ctrl+C while Lucy talks interrupts her instead of quitting)
+                        self.cancel = CancelToken()
+                        try:
+                            self.speak_stream(self.stream_lucy_response(user_text, self.cancel), self.cancel)
+                        except KeyboardInterrupt:
+                            self.interrupt()
+                            tracing.annotate(cancelled="interrupted")
+                            print("[Interrupted]")
+                        finally:
+                            self.cancel = None
+                    else:
+                        tracing.discard()  # Only silence or noise - not a turn
 
                 time.sleep(0.3)
 
@@ -199,13 +310,32 @@ class LucyVoice:
                 print(f"Error: {e}")
                 time.sleep(1)
 
+        self.residency.release()
+
 def main():
     print("=== Lucy Voice for Felicity ===")
     print("Starting voice interaction...")
 
+    # Runs for days - keep the stage latencies on disk, not just in memory
+    configure_metrics("voice")
+    get_metrics().start_dump(METRICS_FILE)
+    tracing.configure(path=TRACE_FILE, app="voice")
+    # LUCY_PROFILE=sample to profile continuously; kill -USR1 <pid> profiles the next 30 s
+    profiling.from_config({}, PROFILE_DIR, app="voice")
+    profiling.get_profiler().install_signal_handler()
+    # kill -USR2 <pid> writes a memory report to data/memory (the first one starts tracing)
+    memory_tracker.from_config({}, MEMORY_DIR, app="voice")
+    memory_tracker.get_tracker().install_signal_handler()
+
     lucy = LucyVoice()
     lucy.conversation_loop()
 
+    print(f"[Context] {lucy.context.describe()}")
+    print(f"[Budget] {lucy.budget.describe()}")
+    get_metrics().dump(METRICS_FILE)
+    print(f"[Metrics] Stage latency:\n{get_metrics().describe()}")
+    print(f"[Trace] {tracing.get_tracer().describe()}")
+    print(f"[Memory] {memory_tracker.get_tracker().describe()}")
     print("Voice system stopped.")
 
 if __name__ == "__main__":
@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+"""
+Lucy Memory Store
+Facts and conversation turns in SQLite, so lookups stay fast after a year of daily chats
+
+    python brain/memory_store.py data/lucy_memory migrate     # Import the JSON files (once)
+    python brain/memory_store.py data/lucy_memory search dolphins --child Felicity --since 2026-09-01
+    python brain/memory_store.py data/lucy_memory stats
+
+Used by LucyMemory when the config has "memory_backend": "sqlite".
+"""
+
+import argparse
+import json
+import re
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+
+DB_NAME = "lucy_memory.db"
+BUSY_TIMEOUT_MS = 5000      # Wait this long for another session's write instead of failing
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS facts (
+    category   TEXT NOT NULL,
+    key        TEXT NOT NULL,
+    value      TEXT,
+    child      TEXT NOT NULL DEFAULT '',
+    learned_at TEXT NOT NULL,
+    mentions   INTEGER NOT NULL DEFAULT 1,
+    PRIMARY KEY (category, key)
+);
+CREATE INDEX IF NOT EXISTS facts_child ON facts (child, category);
+CREATE INDEX IF NOT EXISTS facts_learned_at ON facts (learned_at);
+
+CREATE TABLE IF NOT EXISTS conversations (
+    id         INTEGER PRIMARY KEY,
+    child      TEXT NOT NULL DEFAULT '',
+    started_at TEXT NOT NULL,
+    ended_at   TEXT,
+    source     TEXT
+);
+CREATE INDEX IF NOT EXISTS conversations_child ON conversations (child, started_at);
+CREATE INDEX IF NOT EXISTS conversations_started_at ON conversations (started_at);
+
+CREATE TABLE IF NOT EXISTS turns (
+    id              INTEGER PRIMARY KEY,
+    conversation_id INTEGER NOT NULL REFERENCES conversations (id),
+    child           TEXT NOT NULL DEFAULT '',
+    role            TEXT NOT NULL,
+    content         TEXT NOT NULL,
+    timestamp       TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS turns_child ON turns (child, timestamp);
+CREATE INDEX IF NOT EXISTS turns_timestamp ON turns (timestamp);
+CREATE INDEX IF NOT EXISTS turns_conversation ON turns (conversation_id);
+
+CREATE TABLE IF NOT EXISTS migrations (
+    source      TEXT PRIMARY KEY,
+    migrated_at TEXT NOT NULL
+);
+"""
+
+_NAME = re.compile(r"\bmy name is (\w+)", re.IGNORECASE)
+
+def _now() -> str:
+    return datetime.now().isoformat()
+
+class MemoryStore:
+    """
+    One SQLite database per memory folder
+
+    WAL mode lets the voice page's sessions (one LucyMemory each) read while
+    another writes. Timestamps are ISO strings, which sort and compare like
+    the times they stand for, so "last month" is an index range scan.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.created = not self.path.exists()
+        self._lock = threading.Lock()
+        self._conn = None
+        with self._lock:
+            self._db.executescript(SCHEMA)
+
+    @property
+    def _db(self):
+        """The connection (callers hold self._lock); opened again if close() was called"""
+        if self._conn is None:
+            # Called from the event loop and from worker threads; the lock serializes them
+            self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+            self._conn.row_factory = sqlite3.Row
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")  # Safe with WAL; a crash loses at most the last commit
+            self._conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+        return self._conn
+
+    def _execute(self, sql: str, params=()):
+        with self._lock:
+            return self._db.execute(sql, params)
+
+    def _query(self, sql: str, params=()):
+        with self._lock:
+            return self._db.execute(sql, params).fetchall()
+
+    def close(self):
+        """Close the connection (the next call opens it again)"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    # --- Facts ---
+
+    def load_facts(self):
+        """All facts as LucyMemory.facts: {category: {key: {value, learned_at, mentions}}}"""
+        facts = {}
+        for row in self._query("SELECT * FROM facts ORDER BY category, key"):
+            fact = {"value": row["value"], "learned_at": row["learned_at"], "mentions": row["mentions"]}
+            if row["child"]:
+                fact["child"] = row["child"]
+            facts.setdefault(row["category"], {})[row["key"]] = fact
+        return facts
+
+    def remember(self, category: str, key: str, value, learned_at: str = None, child: str = "",
+                 mentions: int = None):
+        """
+        Insert or update a fact; returns its mention count
+
+        mentions=None counts one more mention (right even when several
+        sessions share the database); a number sets it (for migration).
+        """
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO facts (category, key, value, child, learned_at, mentions) VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (category, key) DO UPDATE SET value = excluded.value, "
+                "child = CASE WHEN excluded.child != '' THEN excluded.child ELSE facts.child END, "
+                "learned_at = excluded.learned_at, "
+                "mentions = CASE WHEN ? IS NULL THEN facts.mentions + 1 ELSE excluded.mentions END",
+                (category, key, str(value), child or "", learned_at or _now(), mentions or 1, mentions))
+            row = self._db.execute("SELECT mentions FROM facts WHERE category = ? AND key = ?",
+                                   (category, key)).fetchone()
+        return row["mentions"]
+
+    def recall(self, category: str = None, child: str = None, since: str = None):
+        """Facts as rows, newest first, optionally by category, child and learned since"""
+        sql, params = "SELECT * FROM facts WHERE 1 = 1", []
+        if category:
+            sql += " AND category = ?"
+            params.append(category)
+        if child:
+            sql += " AND child = ?"
+            params.append(child)
+        if since:
+            sql += " AND learned_at >= ?"
+            params.append(since)
+        return [dict(row) for row in self._query(sql + " ORDER BY learned_at DESC", params)]
+
+    # --- Conversations ---
+
+    def start_conversation(self, started_at: str = None, child: str = "", source: str = None) -> int:
+        cursor = self._execute("INSERT INTO conversations (child, started_at, source) VALUES (?, ?, ?)",
+                               (child or "", started_at or _now(), source))
+        return cursor.lastrowid
+
+    def add_turn(self, conversation_id: int, role: str, content: str, timestamp: str = None, child: str = ""):
+        self._execute("INSERT INTO turns (conversation_id, child, role, content, timestamp) VALUES (?, ?, ?, ?, ?)",
+                      (conversation_id, child or "", role, content, timestamp or _now()))
+
+    def set_child(self, conversation_id: int, child: str):
+        """Name the child of a conversation, including the turns before we knew who it was"""
+        with self._lock:
+            self._db.execute("BEGIN")
+            self._db.execute("UPDATE conversations SET child = ? WHERE id = ?", (child, conversation_id))
+            self._db.execute("UPDATE turns SET child = ? WHERE conversation_id = ? AND child = ''",
+                             (child, conversation_id))
+            self._db.execute("COMMIT")
+
+    def end_conversation(self, conversation_id: int, ended_at: str = None):
+        self._execute("UPDATE conversations SET ended_at = ? WHERE id = ?", (ended_at or _now(), conversation_id))
+
+    def conversation_count(self) -> int:
+        return self._query("SELECT COUNT(*) FROM conversations WHERE ended_at IS NOT NULL")[0][0]
+
+    def search_turns(self, text: str = None, child: str = None, role: str = None,
+                     since: str = None, until: str = None, limit: int = 50):
+        """
+        Turns containing text (case-insensitive), newest first, e.g.
+        search_turns("dolphin", child="Felicity", role="user", since="2026-09-01")
+        """
+        sql, params = "SELECT * FROM turns WHERE 1 = 1", []
+        if child:
+            sql += " AND child = ?"
+            params.append(child)
+        if role:
+            sql += " AND role = ?"
+            params.append(role)
+        if since:
+            sql += " AND timestamp >= ?"
+            params.append(since)
+        if until:
+            sql += " AND timestamp < ?"
+            params.append(until)
+        if text:
+            sql += " AND content LIKE ? ESCAPE '\\'"
+            params.append("%" + re.sub(r"([%_\\])", r"\\\1", text) + "%")
+        sql += " ORDER BY timestamp DESC LIMIT ?"
+        params.append(limit)
+        return [dict(row) for row in self._query(sql, params)]
+
+    # --- Migration from the JSON files ---
+
+    def _migrated(self, source: str) -> bool:
+        return bool(self._query("SELECT 1 FROM migrations WHERE source = ?", (source,)))
+
+    def _mark_migrated(self, source: str):
+        self._execute("INSERT OR REPLACE INTO migrations (source, migrated_at) VALUES (?, ?)", (source, _now()))
+
+    def migrate_json(self, memory_path) -> dict:
+        """
+        Import learned_facts.json (with its journal) and conversations/*.json
+
+        Each file is imported once; running it again only picks up new files.
+        The JSON files are left where they are.
+        """
+        from fact_journal import FactJournal
+
+        memory_path = Path(memory_path)
+        counts = {"facts": 0, "conversations": 0, "turns": 0}
+
+        facts_file = memory_path / "learned_facts.json"
+        if not self._migrated("learned_facts.json") and \
+                (facts_file.exists() or facts_file.with_suffix(".journal").exists()):
+            facts = FactJournal(facts_file, background=False).load()
+            for category, entries in facts.items():
+                for key, fact in entries.items():
+                    self.remember(category, key, fact.get("value"), fact.get("learned_at"),
+                                  mentions=fact.get("mentions", 1))
+                    counts["facts"] += 1
+            self._mark_migrated("learned_facts.json")
+
+        for log_file in sorted((memory_path / "conversations").glob("*.json")):
+            source = f"conversations/{log_file.name}"
+            if self._migrated(source):
+                continue
+            try:
+                log = json.loads(log_file.read_text(encoding="utf-8"))
+            except (OSError, ValueError) as e:
+                print(f"[Memory] Skipped {source}: {e}")
+                continue
+            messages = log.get("messages", [])
+            named = next((m for m in (_NAME.search(str(msg.get("content", ""))) for msg in messages
+                                      if msg.get("role") == "user") if m), None)
+            child = named.group(1).title() if named else ""
+            with self._lock:
+                self._db.execute("BEGIN")
+                cursor = self._db.execute(
+                    "INSERT INTO conversations (child, started_at, ended_at, source) VALUES (?, ?, ?, ?)",
+                    (child, log.get("started_at") or _now(), log.get("ended_at"), source))
+                self._db.executemany(
+                    "INSERT INTO turns (conversation_id, child, role, content, timestamp) VALUES (?, ?, ?, ?, ?)",
+                    [(cursor.lastrowid, child, msg.get("role", ""), str(msg.get("content", "")),
+                      msg.get("timestamp") or log.get("started_at") or _now()) for msg in messages])
+                self._db.execute("INSERT OR REPLACE INTO migrations (source, migrated_at) VALUES (?, ?)",
+                                 (source, _now()))
+                self._db.execute("COMMIT")
+            counts["conversations"] += 1
+            counts["turns"] += len(messages)
+        return counts
+
+    def stats(self):
+        counts = {}
+        for table in ("facts", "conversations", "turns"):
+            counts[table] = self._query(f"SELECT COUNT(*) FROM {table}")[0][0]
+        counts["children"] = self._query("SELECT COUNT(DISTINCT child) FROM turns WHERE child != ''")[0][0]
+        counts["size_mb"] = round(self.path.stat().st_size / (1024 * 1024), 2)
+        return counts
+
+def main():
+    parser = argparse.ArgumentParser(description="Lucy's SQLite memory")
+    parser.add_argument("memory_path", help="Memory folder, e.g. data/lucy_memory")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("migrate", help="Import learned_facts.json and the conversation logs")
+    sub.add_parser("stats", help="How much is stored")
+    search = sub.add_parser("search", help="Find what was said")
+    search.add_argument("text", nargs="?", help="Words to look for")
+    search.add_argument("--child", help="Only this child, e.g. Felicity")
+    search.add_argument("--role", choices=("user", "assistant"), help="Only the child's or Lucy's lines")
+    search.add_argument("--since", help="From this date, e.g. 2026-09-01")
+    search.add_argument("--until", help="Before this date")
+    search.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+
+    store = MemoryStore(Path(args.memory_path) / DB_NAME)
+    if args.command == "migrate":
+        counts = store.migrate_json(args.memory_path)
+        print(f"[Memory] Imported {counts['facts']} facts, {counts['conversations']} conversations "
+              f"({counts['turns']} turns) into {store.path}")
+    elif args.command == "stats":
+        for name, value in store.stats().items():
+            print(f"  {name}: {value}")
+    else:
+        rows = store.search_turns(args.text, args.child, args.role, args.since, args.until, args.limit)
+        for row in rows:
+            who = row["child"] or "child" if row["role"] == "user" else "Lucy"
+            print(f"  {row['timestamp'][:16].replace('T', ' ')}  {who}: {row['content']}")
+        print(f"[Memory] {len(rows)} turn(s)")
+    store.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+Lucy Memory Tracker
+tracemalloc snapshots and diffs, to find what keeps growing in processes that run for days
+
+Tracing starts with the first snapshot (or at startup with PYTHONTRACEMALLOC=1, or
+"memory_tracking": {"enabled": true} in the config); each later snapshot shows which
+modules grew since the one before.
+"""
+
+import gc
+import signal
+import sysconfig
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+
+import metrics
+
+FRAMES = 1          # Stack depth kept per allocation (deeper = better blame, more overhead)
+TOP = 15            # Modules and lines listed in a report
+KEEP_REPORTS = 10   # Report files kept per app; older ones are deleted
+
+# The tracker's own allocations and the import system's aren't worth reporting
+IGNORE = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, __file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+_STDLIB = Path(sysconfig.get_paths()["stdlib"])
+
+def rss_bytes():
+    """Resident set size of this process, or None where /proc isn't available"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+def module_name(filename: str) -> str:
+    """The module (or installed package) a source file belongs to"""
+    path = Path(filename)
+    for marker in ("site-packages", "dist-packages"):
+        if marker in path.parts:
+            i = path.parts.index(marker)
+            if i + 1 < len(path.parts):
+                return path.parts[i + 1].split(".")[0]
+    try:
+        return path.relative_to(_STDLIB).parts[0].removesuffix(".py")
+    except ValueError:
+        pass
+    return path.stem if path.suffix == ".py" else filename
+
+def _mb(size: float) -> str:
+    return f"{size / (1024 * 1024):.1f} MB"
+
+def _signed_mb(size: float) -> str:
+    return f"{'+' if size >= 0 else '-'}{_mb(abs(size))}"
+
+class MemoryTracker:
+    """
+    Snapshots of where memory is allocated, grouped by module
+
+    Keeps the first snapshot (the baseline) and the latest, so a report can
+    show growth since the previous look or since tracing started.
+    """
+
+    def __init__(self, app: str = "lucy", out_dir=None, frames: int = FRAMES):
+        self.app = app
+        self.out_dir = Path(out_dir) if out_dir else Path("data") / "memory"
+        self.frames = frames
+        self.baseline = None
+        self.previous = None
+        self.started = None
+        self.reports = 0
+        self._gauges = {}
+        self._lock = threading.Lock()
+
+    @property
+    def tracing(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def start(self, frames: int = None):
+        """Start tracing allocations (no-op if already tracing)"""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames or self.frames)
+            self.started = time.time()
+            print(f"[Memory] Tracing allocations ({frames or self.frames} frame(s) each)")
+        elif self.started is None:
+            self.started = time.time()  # Started with PYTHONTRACEMALLOC
+
+    def stop(self):
+        """Stop tracing and drop the snapshots (frees tracemalloc's own memory)"""
+        tracemalloc.stop()
+        self.baseline = self.previous = None
+        self.started = None
+
+    def gauge(self, name: str, func):
+        """Show func()'s value in every report, e.g. ("live LucyBrain", lambda: len(...))"""
+        self._gauges[name] = func
+
+    def gauges(self):
+        values = {}
+        for name, func in self._gauges.items():
+            try:
+                values[name] = func()
+            except Exception as e:
+                values[name] = f"error: {e}"
+        return values
+
+    def snapshot(self):
+        """Take a snapshot (starting tracing first if needed); returns (snapshot, the one before)"""
+        self.start()
+        gc.collect()  # Only count what is really still reachable
+        snap = tracemalloc.take_snapshot().filter_traces(IGNORE)
+        with self._lock:
+            before = self.previous
+            self.previous = snap
+            if self.baseline is None:
+                self.baseline = snap
+        return snap, before
+
+    def report(self, top: int = TOP, since: str = "previous"):
+        """
+        Text report: RSS, traced memory, the biggest modules and lines, and
+        which modules grew since the previous snapshot (or since="start")
+        """
+        first = not self.tracing
+        snap, before = self.snapshot()
+        if since == "start":
+            before = self.baseline if self.baseline is not snap else None
+
+        current, peak = tracemalloc.get_traced_memory()
+        rss = rss_bytes()
+        lines = [
+            f"Memory of {self.app} at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}",
+            f"  RSS {_mb(rss) if rss is not None else 'n/a'}, traced {_mb(current)} (peak {_mb(peak)}), "
+            f"tracing for {(time.time() - self.started) / 60:.0f} min",
+        ]
+        for name, value in self.gauges().items():
+            lines.append(f"  {name}: {value}")
+        if first:
+            lines += ["", "Tracing just started - only allocations from now on are seen.",
+                      "Take another snapshot later to see what grew."]
+
+        sizes, blocks = Counter(), Counter()
+        for stat in snap.statistics("filename"):
+            module = module_name(stat.traceback[0].filename)
+            sizes[module] += stat.size
+            blocks[module] += stat.count
+        lines += ["", "Top modules:"]
+        for module, size in sizes.most_common(top):
+            lines.append(f"  {_mb(size):>10}  {blocks[module]:>9,} blocks  {module}")
+
+        lines += ["", "Top lines:"]
+        for stat in snap.statistics("lineno")[:top]:
+            frame = stat.traceback[0]
+            lines.append(f"  {_mb(stat.size):>10}  {stat.count:>9,} blocks  "
+                         f"{module_name(frame.filename)}:{frame.lineno}")
+
+        if before is not None:
+            grown, grown_blocks = Counter(), Counter()
+            for stat in snap.compare_to(before, "filename"):
+                module = module_name(stat.traceback[0].filename)
+                grown[module] += stat.size_diff
+                grown_blocks[module] += stat.count_diff
+            label = "tracing started" if since == "start" else "the previous snapshot"
+            lines += ["", f"Growth since {label}:"]
+            changed = [(m, s) for m, s in grown.most_common() if s]
+            for module, size in changed[:top]:
+                lines.append(f"  {_signed_mb(size):>10}  {grown_blocks[module]:>+9,} blocks  {module}")
+            if not changed:
+                lines.append("  (no change)")
+        return "\n".join(lines)
+
+    def dump(self, since: str = "previous"):
+        """Write a report to <out_dir>/<app>-<time>.txt (keeping the newest few); returns the path"""
+        text = self.report(since=since)
+        try:
+            self.out_dir.mkdir(parents=True, exist_ok=True)
+            old = sorted(self.out_dir.glob(f"{self.app}-*.txt"))
+            for stale in old[:max(0, len(old) - KEEP_REPORTS + 1)]:
+                stale.unlink()
+            path = self.out_dir / f"{self.app}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.txt"
+            path.write_text(text + "\n", encoding="utf-8")
+        except OSError as e:
+            print(f"[Memory] Could not write report: {e}")
+            return None
+        self.reports += 1
+        rss = rss_bytes()
+        print(f"[Memory] Report saved to {path} (RSS {_mb(rss) if rss is not None else 'n/a'})")
+        return path
+
+    def install_signal_handler(self):
+        """
+        kill -USR2 <pid> writes a report (the first one starts tracing);
+        no-op where SIGUSR2 doesn't exist, e.g. Windows
+        """
+        if not hasattr(signal, "SIGUSR2"):
+            return False
+        try:
+            signal.signal(signal.SIGUSR2, lambda signum, frame: threading.Thread(
+                target=self.dump, daemon=True, name="lucy-memory").start())
+        except ValueError:
+            return False  # Not the main thread
+        return True
+
+    def describe(self):
+        """One-line summary for console output"""
+        rss = rss_bytes()
+        parts = [f"RSS {_mb(rss)}" if rss is not None else "RSS n/a"]
+        if self.tracing:
+            current, peak = tracemalloc.get_traced_memory()
+            parts.append(f"traced {_mb(current)} (peak {_mb(peak)})")
+        parts += [f"{name} {value}" for name, value in self.gauges().items()]
+        return ", ".join(parts)
+
+_tracker = MemoryTracker()
+
+def configure(app: str = None, out_dir=None, frames: int = None):
+    """Name this process and say where reports go (unset arguments are kept)"""
+    if app is not None:
+        _tracker.app = app
+    if out_dir is not None:
+        _tracker.out_dir = Path(out_dir)
+    if frames is not None:
+        _tracker.frames = frames
+
+def from_config(cfg: dict, default_dir, app: str = None):
+    """
+    Memory tracking from "memory_tracking" in the config
+
+    e.g. {"memory_tracking": {"enabled": true, "frames": 1, "dir": "data/memory"}} traces
+    from startup; without it tracing starts with the first snapshot.
+    """
+    memory_cfg = cfg.get("memory_tracking", {})
+    configure(app=app, out_dir=memory_cfg.get("dir", default_dir), frames=memory_cfg.get("frames", FRAMES))
+    if memory_cfg.get("enabled", False):
+        _tracker.start()
+
+    # RSS on /metrics (and in the .prom dumps) shows a slow leak long before a report is needed
+    metrics.get_metrics().gauge("memory_rss_bytes", rss_bytes, "Resident set size of the process")
+    metrics.get_metrics().gauge("memory_traced_bytes",
+                                lambda: tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else None,
+                                "Memory allocated by Python code since tracing started")
+
+def get_tracker():
+    return _tracker
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Lucy Metrics
+Per-stage latency (STT, LLM, tools, TTS, face IPC) with p50/p95/p99, for /metrics and the CLIs
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from pathlib import Path
+
+WINDOW = 1000               # Recent samples per stage used for the percentiles
+QUANTILES = (0.5, 0.95, 0.99)
+DUMP_INTERVAL = 60.0        # Seconds between background dumps
+
+def _percentile(ordered, fraction: float):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+class _Stage:
+    """Samples and running totals for one stage"""
+
+    def __init__(self, window: int):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        self.samples.append(seconds)
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+class StageMetrics:
+    """
+    Latency per named stage
+
+    observe() and time() are cheap enough for every turn (a deque append
+    under a lock); percentiles are only computed when someone asks for
+    them. Quantiles come from the most recent WINDOW samples, so a
+    regression shows up without restarting the process; count and sum
+    cover its whole lifetime, like a Prometheus summary.
+    """
+
+    def __init__(self, app: str = "lucy", window: int = WINDOW):
+        self.app = app
+        self.window = window
+        self.started = time.time()
+        self._stages = {}
+        self._gauges = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage: str, seconds: float):
+        """Record one duration for a stage"""
+        with self._lock:
+            entry = self._stages.get(stage)
+            if entry is None:
+                entry = self._stages[stage] = _Stage(self.window)
+            entry.observe(seconds)
+
+    @contextmanager
+    def time(self, stage: str):
+        """Time the body of a with block (also when it raises)"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def gauge(self, name: str, func, help_text: str = ""):
+        """Export func()'s value at scrape time as lucy_<name> (None = leave it out)"""
+        self._gauges[name] = (func, help_text or name.replace("_", " "))
+
+    def snapshot(self):
+        """{stage: {count, sum, max, p50, p95, p99}} in seconds"""
+        with self._lock:
+            stages = {name: (sorted(s.samples), s.count, s.total, s.max)
+                      for name, s in self._stages.items()}
+
+        result = {}
+        for name, (ordered, count, total, longest) in sorted(stages.items()):
+            entry = {"count": count, "sum": round(total, 4), "max": round(longest, 4)}
+            for q in QUANTILES:
+                entry[f"p{int(q * 100)}"] = round(_percentile(ordered, q), 4) if ordered else None
+            result[name] = entry
+        return result
+
+    def render_prometheus(self) -> str:
+        """Prometheus text exposition format (a summary per stage)"""
+        lines = [
+            "# HELP lucy_stage_seconds Time spent in each stage of a turn",
+            "# TYPE lucy_stage_seconds summary",
+        ]
+        for stage, s in self.snapshot().items():
+            labels = f'app="{self.app}",stage="{stage}"'
+            for q in QUANTILES:
+                value = s[f"p{int(q * 100)}"]
+                if value is not None:
+                    lines.append(f'lucy_stage_seconds{{{labels},quantile="{q}"}} {value}')
+            lines.append(f"lucy_stage_seconds_sum{{{labels}}} {s['sum']}")
+            lines.append(f"lucy_stage_seconds_count{{{labels}}} {s['count']}")
+        lines += [
+            "# HELP lucy_uptime_seconds Seconds since the process started",
+            "# TYPE lucy_uptime_seconds gauge",
+            f'lucy_uptime_seconds{{app="{self.app}"}} {round(time.time() - self.started, 1)}',
+        ]
+        for name, (func, help_text) in sorted(self._gauges.items()):
+            try:
+                value = func()
+            except Exception:
+                value = None
+            if value is not None:
+                lines += [
+                    f"# HELP lucy_{name} {help_text}",
+                    f"# TYPE lucy_{name} gauge",
+                    f'lucy_{name}{{app="{self.app}"}} {value}',
+                ]
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path):
+        """
+        Write the metrics to a file (atomically)
+
+        A .prom file in node_exporter's textfile directory is picked up as is.
+        """
+        path = Path(path)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(path.suffix + ".tmp")
+            tmp.write_text(self.render_prometheus(), encoding="utf-8")
+            os.replace(tmp, path)
+        except OSError as e:
+            print(f"[Metrics] Could not write {path}: {e}")
+
+    def start_dump(self, path, interval: float = DUMP_INTERVAL):
+        """Dump every interval seconds from a daemon thread (for long-running CLIs)"""
+        def run():
+            while True:
+                time.sleep(interval)
+                self.dump(path)
+
+        threading.Thread(target=run, daemon=True, name="lucy-metrics").start()
+
+    def describe(self):
+        """Console table: one line per stage"""
+        lines = []
+        for stage, s in self.snapshot().items():
+            p50, p95, p99 = (f"{s[k] * 1000:.0f}" for k in ("p50", "p95", "p99"))
+            lines.append(f"  {stage:<16} n={s['count']:<5} p50 {p50} ms  p95 {p95} ms  p99 {p99} ms")
+        return "\n".join(lines) or "  (no samples yet)"
+
+_metrics = StageMetrics()
+
+def configure(app: str):
+    """Name this process in the exported metrics (e.g. "web", "voice")"""
+    _metrics.app = app
+
+def get_metrics():
+    """The process-wide metrics every stage reports to"""
+    return _metrics
+
+def observe(stage: str, seconds: float):
+    _metrics.observe(stage, seconds)
+
+def timed(stage: str):
+    """with timed("tts"): ... - time a block into the process-wide metrics"""
+    return _metrics.time(stage)
@@ -0,0 +1,447 @@
+#!/usr/bin/env python3
+"""
+Lucy Mock LLM
+A stand-in for Ollama's OpenAI-compatible API, so Lucy can be tested and benchmarked offline
+
+    python brain/mock_llm.py                                  # Synthetic replies on :11435
+    python brain/mock_llm.py --ttft 0.4 --tps 15              # ... as slow as the Pi
+    python brain/mock_llm.py --mode record --upstream http://localhost:11434
+    python brain/mock_llm.py --mode replay                    # Play back what was recorded
+
+Then point Lucy at it with "api_base": "http://localhost:11435/v1" in the config.
+
+Serves /v1/chat/completions (streaming and not), /api/tags, /api/ps and
+/api/generate (keep-alive pings). Standard library only.
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from pathlib import Path
+
+PORT = 11435                    # Next to Ollama's 11434
+MODES = ("synthetic", "record", "replay")
+DEFAULT_MODEL = "qwen2.5:1.5b"
+DEFAULT_CASSETTE = Path("data") / "cassettes" / "lucy.json"
+TTFT = 0.2                      # Synthetic seconds until the first token
+TOKENS_PER_SECOND = 30.0        # Synthetic generation speed
+UPSTREAM_TIMEOUT = 300
+
+# Synthetic replies, picked by a hash of the conversation so a run is repeatable
+REPLIES = [
+    "That sounds like so much fun! What happened next?",
+    "Wow, I love hearing about that! Can you tell me more?",
+    "Dolphins are amazing! They talk to each other with clicks and whistles. What's your favorite thing about them?",
+    "I didn't know that! You're teaching me so much today. What else do you like?",
+    "Hello, friend! I'm Lucy. I'm so happy to talk with you!",
+    "Ooh, good question! Let me think... I wonder what you think about it?",
+    "Bye for now! I can't wait to talk again soon!",
+    "Space is so big! There are more stars than grains of sand on a beach. Isn't that cool?",
+]
+SUMMARY_REPLY = "The child likes dolphins and the color purple, and has a dog named Buddy."
+
+def _last_user(messages):
+    for message in reversed(messages or []):
+        if message.get("role") == "user":
+            return str(message.get("content", ""))
+    return ""
+
+def request_keys(body: dict):
+    """
+    (exact, loose) cassette keys for a chat request
+
+    exact covers the whole conversation; loose only the model, the system
+    prompt's first line and the last user message, so a replay still finds
+    an answer when remembered facts have changed the rest of the prompt.
+    """
+    messages = [{"role": m.get("role"), "content": m.get("content")} for m in body.get("messages") or []]
+    exact = json.dumps([body.get("model"), messages], sort_keys=True, ensure_ascii=False)
+    system = next((str(m["content"]).split("\n")[0] for m in messages if m["role"] == "system"), "")
+    loose = json.dumps([body.get("model"), system, _last_user(messages)], ensure_ascii=False)
+    return (hashlib.sha256(exact.encode("utf-8")).hexdigest()[:24],
+            hashlib.sha256(loose.encode("utf-8")).hexdigest()[:24])
+
+def _tokens(text: str):
+    """Split a reply into word-sized deltas, spaces kept, like a tokenizer would stream them"""
+    words = text.split(" ")
+    return [w + " " for w in words[:-1]] + [words[-1]] if words else []
+
+def _apply_stop(text: str, stop):
+    if not stop:
+        return text
+    for s in ([stop] if isinstance(stop, str) else stop):
+        if s and s in text:
+            text = text[:text.index(s)]
+    return text
+
+class Cassette:
+    """Recorded replies in a JSON file: {"interactions": [{"key", "loose", "reply", "deltas", ...}]}"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.interactions = []
+        self._exact = {}
+        self._loose = {}
+        self._lock = threading.Lock()
+        if self.path.exists():
+            try:
+                data = json.loads(self.path.read_text(encoding="utf-8"))
+                for entry in data.get("interactions", []):
+                    self._index(entry)
+            except (OSError, ValueError) as e:
+                print(f"[Mock] Could not read cassette {self.path}: {e}")
+
+    def _index(self, entry):
+        self.interactions.append(entry)
+        self._exact[entry["key"]] = entry
+        self._loose.setdefault(entry["loose"], entry)
+
+    def find(self, body: dict):
+        """The recorded interaction for this request (exact match first), or None"""
+        exact, loose = request_keys(body)
+        return self._exact.get(exact) or self._loose.get(loose)
+
+    def add(self, body: dict, reply: str, deltas=None, ttft: float = 0.0, seconds: float = 0.0):
+        exact, loose = request_keys(body)
+        entry = {
+            "key": exact,
+            "loose": loose,
+            "model": body.get("model"),
+            "last_user": _last_user(body.get("messages"))[:200],
+            "reply": reply,
+            "ttft": round(ttft, 4),
+            "seconds": round(seconds, 4),
+        }
+        if deltas:
+            entry["deltas"] = [[round(t, 4), d] for t, d in deltas]
+        with self._lock:
+            self._index(entry)
+            self._save()
+
+    def _save(self):
+        """Written whole after every new interaction (temp file + rename, so a crash can't truncate it)"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        tmp.write_text(json.dumps({"version": 1, "interactions": self.interactions},
+                                  indent=2, ensure_ascii=False), encoding="utf-8")
+        tmp.replace(self.path)
+
+    def models(self):
+        return sorted({entry["model"] for entry in self.interactions if entry.get("model")})
+
+class MockLLM:
+    """
+    What the server answers with
+
+    synthetic: canned replies streamed at --ttft/--tps (with optional jitter)
+    record:    forwards to a real server and saves each reply to the cassette
+    replay:    answers from the cassette, at the recorded speed or --speed times faster
+    """
+
+    def __init__(self, mode: str = "synthetic", cassette=None, upstream: str = None,
+                 ttft: float = TTFT, tps: float = TOKENS_PER_SECOND, jitter: float = 0.0,
+                 seed: int = 0, speed: float = 1.0, on_miss: str = "synthetic",
+                 models=(DEFAULT_MODEL,)):
+        if mode not in MODES:
+            raise ValueError(f"mode must be one of {MODES}")
+        if mode == "record" and not upstream:
+            raise ValueError("record mode needs an upstream server")
+        self.mode = mode
+        self.cassette = Cassette(cassette or DEFAULT_CASSETTE) if mode != "synthetic" else None
+        self.upstream = upstream.rstrip("/").replace("/v1", "") if upstream else None
+        self.ttft = ttft
+        self.tps = tps
+        self.jitter = jitter
+        self.seed = seed
+        self.speed = speed
+        self.on_miss = on_miss
+        self.models = list(models)
+        self.loaded = []    # Models a keep-alive ping asked for, as /api/ps reports them
+        self.stats = {"requests": 0, "streamed": 0, "recorded": 0, "replayed": 0, "misses": 0,
+                      "cancelled": 0}
+        self._lock = threading.Lock()
+
+    def count(self, name: str):
+        with self._lock:
+            self.stats[name] += 1
+
+    def _rng(self, body: dict):
+        """Random numbers seeded by the request, so the same conversation gets the same timing"""
+        return random.Random(f"{self.seed}:{request_keys(body)[0]}")
+
+    def synthetic(self, body: dict):
+        """(reply, [(seconds since request, delta), ...]) for a made-up answer"""
+        rng = self._rng(body)
+        # The summarizer asks for updated notes rather than a reply
+        is_summary = _last_user(body.get("messages")).startswith("Notes so far:")
+        reply = SUMMARY_REPLY if is_summary else rng.choice(REPLIES)
+        reply = _apply_stop(reply, body.get("stop"))
+        tokens = _tokens(reply)
+        max_tokens = body.get("max_tokens")
+        if max_tokens:
+            tokens = tokens[:max_tokens]
+
+        def vary(seconds):
+            return seconds * (1 + rng.uniform(-self.jitter, self.jitter)) if self.jitter else seconds
+
+        at = vary(self.ttft)
+        deltas = []
+        for token in tokens:
+            deltas.append((at, token))
+            at += vary(1.0 / self.tps) if self.tps > 0 else 0
+        return "".join(tokens), deltas
+
+    def replay(self, body: dict):
+        """Recorded (reply, deltas) for a request; None on a miss that shouldn't fall back"""
+        entry = self.cassette.find(body)
+        if entry is None:
+            self.count("misses")
+            print(f"[Mock] No recording for: {_last_user(body.get('messages'))[:60]!r}")
+            return self.synthetic(body) if self.on_miss == "synthetic" else None
+        self.count("replayed")
+        deltas = entry.get("deltas") or [(entry.get("ttft", 0.0), entry["reply"])]
+        scale = 1.0 / self.speed if self.speed > 0 else 0.0
+        return entry["reply"], [(t * scale, d) for t, d in deltas]
+
+    def describe(self):
+        s = self.stats
+        text = f"{self.mode}: {s['requests']} requests ({s['streamed']} streamed, {s['cancelled']} cancelled)"
+        if self.mode == "record":
+            text += f", {s['recorded']} recorded to {self.cassette.path}"
+        elif self.mode == "replay":
+            text += f", {s['replayed']} replayed, {s['misses']} not in {self.cassette.path}"
+        return text
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "LucyMock/1.0"
+    mock: MockLLM = None        # Set by make_server
+
+    def log_message(self, format, *args):
+        pass  # One line per token stream would drown the output
+
+    def _json(self, obj, status: int = 200):
+        data = json.dumps(obj).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        try:
+            return json.loads(raw or b"{}")
+        except ValueError:
+            return None
+
+    def _upstream(self, method: str, path: str, body: dict = None):
+        """(status, parsed JSON) from the real server in record mode"""
+        data = json.dumps(body).encode("utf-8") if body is not None else None
+        req = urllib.request.Request(f"{self.mock.upstream}{path}", data=data, method=method,
+                                     headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(req, timeout=UPSTREAM_TIMEOUT) as resp:
+                return resp.status, json.loads(resp.read() or b"{}")
+        except urllib.error.HTTPError as e:
+            return e.code, {"error": e.read().decode("utf-8", "replace")}
+        except (urllib.error.URLError, OSError) as e:
+            return 502, {"error": f"upstream {self.mock.upstream}: {e}"}
+
+    def do_GET(self):
+        mock = self.mock
+        if mock.mode == "record" and self.path.startswith("/api/"):
+            status, obj = self._upstream("GET", self.path)
+            return self._json(obj, status)
+        models = mock.models + [m for m in (mock.cassette.models() if mock.cassette else [])
+                                if m not in mock.models]
+        if self.path == "/api/tags":
+            self._json({"models": [{"name": m, "model": m, "size": 0} for m in models]})
+        elif self.path == "/api/ps":
+            self._json({"models": [{"name": m, "model": m, "size_vram": 0, "expires_at": "0001-01-01T00:00:00Z"}
+                                   for m in (mock.loaded or models[:1])]})
+        elif self.path == "/v1/models":
+            self._json({"object": "list", "data": [{"id": m, "object": "model", "owned_by": "lucy-mock"}
+                                                   for m in models]})
+        elif self.path in ("/", "/api/version"):
+            self._json({"version": "mock", "mode": mock.mode, "stats": mock.stats})
+        else:
+            self._json({"error": f"not found: {self.path}"}, 404)
+
+    def do_POST(self):
+        body = self._body()
+        if body is None:
+            return self._json({"error": "invalid JSON"}, 400)
+        if self.path == "/api/generate":
+            # Keep-alive pings from model_residency; nothing to generate
+            if self.mock.mode == "record":
+                status, obj = self._upstream("POST", self.path, body)
+                return self._json(obj, status)
+            if body.get("model") and body["model"] not in self.mock.loaded:
+                self.mock.loaded.append(body["model"])
+            return self._json({"model": body.get("model"), "response": "", "done": True})
+        if self.path.rstrip("/") not in ("/v1/chat/completions", "/chat/completions"):
+            return self._json({"error": f"not found: {self.path}"}, 404)
+        self.chat(body)
+
+    def chat(self, body: dict):
+        mock = self.mock
+        mock.count("requests")
+        start = time.perf_counter()
+        if mock.mode == "record":
+            return self.record(body, start)
+        reply, deltas = (mock.synthetic(body) if mock.mode == "synthetic" else mock.replay(body) or (None, None))
+        if reply is None:
+            return self._json({"error": "no recording for this request (run with --on-miss synthetic)"}, 404)
+        if body.get("stream"):
+            mock.count("streamed")
+            self.stream(body, deltas, start)
+        else:
+            total = deltas[-1][0] if deltas else 0.0
+            time.sleep(max(0.0, total - (time.perf_counter() - start)))
+            self._json(self.completion(body, reply))
+
+    def record(self, body: dict, start: float):
+        """Forward a chat to the real server as a stream, saving the deltas and when they came"""
+        upstream = dict(body, stream=True)
+        req = urllib.request.Request(f"{self.mock.upstream}/v1/chat/completions",
+                                     data=json.dumps(upstream).encode("utf-8"), method="POST",
+                                     headers={"Content-Type": "application/json"})
+        deltas = []
+        try:
+            with urllib.request.urlopen(req, timeout=UPSTREAM_TIMEOUT) as resp:
+                for raw in resp:
+                    line = raw.decode("utf-8").strip()
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[5:].strip()
+                    if data == "[DONE]":
+                        break
+                    choices = json.loads(data).get("choices") or [{}]
+                    delta = (choices[0].get("delta") or {}).get("content")
+                    if delta:
+                        deltas.append((time.perf_counter() - start, delta))
+        except urllib.error.HTTPError as e:
+            return self._json({"error": e.read().decode("utf-8", "replace")}, e.code)
+        except (urllib.error.URLError, OSError) as e:
+            return self._json({"error": f"upstream {self.mock.upstream}: {e}"}, 502)
+
+        reply = "".join(d for _, d in deltas)
+        self.mock.cassette.add(body, reply, deltas, ttft=deltas[0][0] if deltas else 0.0,
+                               seconds=time.perf_counter() - start)
+        self.mock.count("recorded")
+        # The client already waited for the real reply, so there's nothing to pace
+        if body.get("stream"):
+            self.mock.count("streamed")
+            self.stream(body, [(0.0, d) for _, d in deltas], time.perf_counter())
+        else:
+            self._json(self.completion(body, reply))
+
+    def stream(self, body: dict, deltas, start: float):
+        """Server-sent events, each delta sent when its time comes"""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        created = int(time.time())
+        try:
+            for at, delta in deltas:
+                wait = at - (time.perf_counter() - start)
+                if wait > 0:
+                    time.sleep(wait)
+                self._event({"id": "chatcmpl-mock", "object": "chat.completion.chunk", "created": created,
+                             "model": body.get("model"),
+                             "choices": [{"index": 0, "delta": {"content": delta}, "finish_reason": None}]})
+            self._event({"id": "chatcmpl-mock", "object": "chat.completion.chunk", "created": created,
+                         "model": body.get("model"),
+                         "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+            self._chunk(b"data: [DONE]\n\n")
+            self._chunk(b"")
+        except (BrokenPipeError, ConnectionResetError):
+            self.mock.count("cancelled")  # Lucy was interrupted and hung up
+            self.close_connection = True
+
+    def _event(self, obj):
+        self._chunk(f"data: {json.dumps(obj, ensure_ascii=False)}\n\n".encode("utf-8"))
+
+    def _chunk(self, data: bytes):
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    @staticmethod
+    def completion(body: dict, reply: str):
+        words = len(reply.split())
+        return {
+            "id": "chatcmpl-mock",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": reply},
+                         "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 0, "completion_tokens": words, "total_tokens": words},
+        }
+
+def make_server(mock: MockLLM, host: str = "127.0.0.1", port: int = PORT):
+    """An HTTP server answering with mock (port 0 picks a free one)"""
+    handler = type("MockHandler", (Handler,), {"mock": mock})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+def start(mock: MockLLM = None, host: str = "127.0.0.1", port: int = 0):
+    """
+    Run a mock server in a background thread (e.g. from a test harness);
+    returns (server, api_base). Stop it with server.shutdown()
+    """
+    server = make_server(mock or MockLLM(), host, port)
+    threading.Thread(target=server.serve_forever, daemon=True, name="lucy-mock-llm").start()
+    return server, f"http://{host}:{server.server_address[1]}/v1"
+
+def main():
+    parser = argparse.ArgumentParser(description="OpenAI-compatible stand-in for Ollama")
+    parser.add_argument("--mode", choices=MODES, default="synthetic")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--cassette", default=str(DEFAULT_CASSETTE),
+                        help="Recordings file for record/replay (default: data/cassettes/lucy.json)")
+    parser.add_argument("--upstream", default="http://localhost:11434",
+                        help="Real server to record from (default: local Ollama)")
+    parser.add_argument("--ttft", type=float, default=TTFT, help="Synthetic seconds to the first token")
+    parser.add_argument("--tps", type=float, default=TOKENS_PER_SECOND, help="Synthetic tokens per second")
+    parser.add_argument("--jitter", type=float, default=0.0,
+                        help="Vary synthetic timing by up to this fraction, e.g. 0.2")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for replies and jitter")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="Replay this many times faster than recorded (0 = instantly)")
+    parser.add_argument("--on-miss", choices=("synthetic", "error"), default="synthetic",
+                        help="What replay does for a request that wasn't recorded")
+    parser.add_argument("--model", action="append", help="Model name(s) to list (default: qwen2.5:1.5b)")
+    args = parser.parse_args()
+
+    mock = MockLLM(args.mode, cassette=args.cassette, upstream=args.upstream, ttft=args.ttft,
+                   tps=args.tps, jitter=args.jitter, seed=args.seed,
+                   speed=args.speed,
+                   on_miss=args.on_miss, models=args.model or [DEFAULT_MODEL])
+    server = make_server(mock, args.host, args.port)
+    detail = {
+        "synthetic": f"first token after {args.ttft}s, {args.tps} tokens/s",
+        "record": f"recording {args.upstream} to {args.cassette}",
+        "replay": f"replaying {args.cassette} ({len(mock.cassette.interactions) if mock.cassette else 0} recordings)",
+    }[args.mode]
+    print(f"[Mock] Serving on http://{args.host}:{server.server_address[1]}/v1 - {detail}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    print(f"\n[Mock] {mock.describe()}")
+
+if __name__ == "__main__":
+    main()
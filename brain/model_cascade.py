@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Lucy Model Cascade
+Sends easy chit-chat to a small fast model and hard questions to a bigger one
+"""
+
+import re
+import threading
+from collections import deque
+
+from semantic_cache import vectorize, cosine
+import tracing
+
+TIER_SMALL = "small"
+TIER_LARGE = "large"
+
+LATENCY_SAMPLES = 200       # Recent turns per tier kept for percentiles
+CLASSIFIER_MARGIN = 0.05    # Closer than this and we play it safe with the large tier
+
+# Openers that ask for an explanation
+HARD_STARTS = (
+    "why", "how does", "how do", "how come", "how is", "how are", "how can", "explain",
+    "what makes", "what happens", "what is the difference", "whats the difference",
+    "can you explain", "tell me about", "teach me",
+)
+
+# Topics where a tiny model tends to get facts wrong
+HARD_WORDS = {
+    "science", "planet", "planets", "universe", "gravity", "electricity", "volcano", "volcanoes",
+    "dinosaur", "dinosaurs", "photosynthesis", "internet", "computer", "computers", "history",
+    "weather", "space", "atom", "atoms", "energy", "magnet", "magnets", "rainbow", "earthquake",
+    "multiply", "multiplication", "fraction", "fractions", "difference",
+}
+
+# Sums are hard, but "three times" and "plus" are also everyday words, so these only count
+# between two numbers ("twelve times seven", "10 divided by 2")
+ARITHMETIC_WORDS = {"times", "plus", "minus", "divided", "multiplied", "over"}
+NUMBER_WORDS = {
+    "zero", "one", "two", "three", "four", "five", "six", "seven", "eight", "nine", "ten",
+    "eleven", "twelve", "thirteen", "fourteen", "fifteen", "sixteen", "seventeen", "eighteen",
+    "nineteen", "twenty", "thirty", "forty", "fifty", "sixty", "seventy", "eighty", "ninety",
+    "hundred", "thousand", "million", "half",
+}
+
+# Whole messages that are just chit-chat
+EASY_WORDS = {
+    "hi", "hello", "hey", "bye", "goodbye", "thanks", "thank", "ok", "okay", "yes", "no", "yeah",
+    "yep", "nope", "cool", "wow", "haha", "lol", "sure", "maybe", "nice", "awesome", "good", "great",
+}
+
+# Requests that mean a tool call in the tool loops
+TOOL_WORDS = {
+    "check", "system", "status", "file", "files", "folder", "directory", "run", "command",
+    "note", "notes", "disk", "memory", "process", "ollama", "zpc", "audit", "service", "install",
+}
+
+# Seed examples for the nearest-centroid fallback classifier
+SEED_EXAMPLES = {
+    TIER_SMALL: [
+        "hi lucy", "my name is felicity", "i like purple", "my dog is named buddy",
+        "that is so funny", "do you like ice cream", "what is your name", "i went to the park today",
+        "i have a cat", "i am six years old", "do you have friends", "what is your favorite color",
+        "i love dolphins", "see you later", "i am just thinking", "nothing much",
+    ],
+    TIER_LARGE: [
+        "why is the sky blue", "how do airplanes fly", "what makes thunder", "how does the internet work",
+        "why do leaves change color", "explain photosynthesis", "how big is the sun",
+        "what is the biggest dinosaur", "how do volcanoes erupt", "what is twelve times seven",
+        "how do fish breathe underwater", "why does the moon change shape", "how are rainbows made",
+        "what is inside the earth", "how do computers think", "why do we need to sleep",
+    ],
+}
+
+def _words(text: str):
+    return re.findall(r"[a-z]+", text.lower().replace("'", ""))
+
+def _is_number(word: str) -> bool:
+    return word.isdigit() or word in NUMBER_WORDS
+
+def _has_sum(text: str) -> bool:
+    """An arithmetic word with a number on each side ("by" may follow divided/multiplied)"""
+    words = re.findall(r"[a-z]+|\d+", text.lower())
+    for i, word in enumerate(words):
+        if word not in ARITHMETIC_WORDS or i == 0 or not _is_number(words[i - 1]):
+            continue
+        after = words[i + 2:i + 3] if words[i + 1:i + 2] == ["by"] else words[i + 1:i + 2]
+        if after and _is_number(after[0]):
+            return True
+    return False
+
+def _percentile(values, fraction: float):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+class ModelCascade:
+    """
+    Picks a model tier for each turn
+
+    Cheap rules decide most turns (greetings and short statements are small,
+    "why"/"how" questions and known-hard topics are large). Anything the rules
+    can't place goes to a nearest-centroid classifier over the same hashed
+    word vectors the semantic cache uses; near-ties go to the default tier.
+    Decisions and per-tier latency are logged so the split can be tuned.
+    """
+
+    def __init__(self, tiers: dict, default_tier: str = TIER_LARGE, enabled: bool = True):
+        self.tiers = tiers
+        self.default_tier = default_tier
+        self.enabled = enabled and len(set(tiers.values())) > 1
+
+        self._centroids = {tier: self._centroid(examples) for tier, examples in SEED_EXAMPLES.items()}
+        self._lock = threading.Lock()
+        self._decisions = {tier: 0 for tier in tiers}
+        self._reasons = {}
+        self._total = {tier: deque(maxlen=LATENCY_SAMPLES) for tier in tiers}
+        self._first_token = {tier: deque(maxlen=LATENCY_SAMPLES) for tier in tiers}
+
+    @staticmethod
+    def _centroid(examples):
+        centroid = {}
+        for example in examples:
+            for bucket, weight in vectorize(example).items():
+                centroid[bucket] = centroid.get(bucket, 0.0) + weight
+        norm = sum(w * w for w in centroid.values()) ** 0.5
+        return {bucket: weight / norm for bucket, weight in centroid.items()} if norm else centroid
+
+    def classify(self, text: str, tools: bool = False):
+        """Return (tier, reason) for a user message"""
+        words = _words(text)
+        joined = " ".join(words)
+
+        if tools and TOOL_WORDS.intersection(words):
+            return TIER_LARGE, "tool request"
+        if not words or all(word in EASY_WORDS for word in words):
+            return TIER_SMALL, "chit-chat"
+        if joined.startswith(HARD_STARTS):
+            return TIER_LARGE, "explanation"
+        if HARD_WORDS.intersection(words):
+            return TIER_LARGE, "hard topic"
+        if _has_sum(text):
+            return TIER_LARGE, "arithmetic"
+        if len(words) > 20 or text.count("?") > 1:
+            return TIER_LARGE, "long question"
+        if len(words) <= 6 and "?" not in text:
+            return TIER_SMALL, "short statement"
+
+        vector = vectorize(text)
+        scores = {tier: cosine(vector, centroid) for tier, centroid in self._centroids.items()}
+        small, large = scores[TIER_SMALL], scores[TIER_LARGE]
+        if abs(small - large) < CLASSIFIER_MARGIN:
+            return self.default_tier, "classifier tie"
+        return (TIER_SMALL, "classifier") if small > large else (TIER_LARGE, "classifier")
+
+    def models(self):
+        """Every model route() can pick, small tier first"""
+        if not self.enabled:
+            return [self.tiers[self.default_tier]]
+        ordered = [self.tiers[TIER_SMALL]] + [model for tier, model in self.tiers.items() if tier != TIER_SMALL]
+        return list(dict.fromkeys(ordered))
+
+    def route(self, text: str, tools: bool = False):
+        """Return (model, tier) for a user message, logging the decision"""
+        if not self.enabled:
+            return self.tiers[self.default_tier], self.default_tier
+
+        tier, reason = self.classify(text, tools)
+        with self._lock:
+            self._decisions[tier] += 1
+            self._reasons[reason] = self._reasons.get(reason, 0) + 1
+        print(f"[Cascade] {tier} ({reason}) -> {self.tiers[tier]}")
+        tracing.annotate(tier=tier, route=reason)
+        return self.tiers[tier], tier
+
+    def record(self, tier: str, total: float, first_token: float = None):
+        """Record how long a turn on this tier took (seconds)"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._total[tier].append(total)
+            if first_token is not None:
+                self._first_token[tier].append(first_token)
+
+    def stats(self):
+        """Decisions and latency percentiles per tier"""
+        def ms(value):
+            return round(value * 1000, 1) if value is not None else None
+
+        with self._lock:
+            tiers = {}
+            for tier, model in self.tiers.items():
+                tiers[tier] = {
+                    "model": model,
+                    "turns": self._decisions[tier],
+                    "p50_ms": ms(_percentile(self._total[tier], 0.5)),
+                    "p95_ms": ms(_percentile(self._total[tier], 0.95)),
+                    "first_token_p50_ms": ms(_percentile(self._first_token[tier], 0.5)),
+                }
+            return {"enabled": self.enabled, "tiers": tiers, "reasons": dict(self._reasons)}
+
+    def describe(self):
+        """One-line summary for console output"""
+        parts = []
+        for tier, s in self.stats()["tiers"].items():
+            parts.append(f"{tier} {s['turns']} turns (p50 {s['p50_ms']} ms)")
+        return ", ".join(parts)
+
+def from_config(cfg: dict, chat_model: str):
+    """
+    Build the cascade from "model_tiers" in the config
+
+    e.g. {"small": "qwen2.5:0.5b", "large": "llama3.1:8b"}. Without it both
+    tiers are chat_model and routing is a no-op.
+    """
+    tiers = {TIER_SMALL: chat_model, TIER_LARGE: chat_model}
+    tiers.update(cfg.get("model_tiers", {}))
+    cascade = cfg.get("cascade", {})
+    return ModelCascade(tiers, default_tier=cascade.get("default_tier", TIER_LARGE),
+                        enabled=cascade.get("enabled", True))
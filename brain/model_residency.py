@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Lucy Model Residency
+Preloads the chat models in Ollama and keeps them loaded while anyone is talking to Lucy
+"""
+
+import threading
+import time
+
+from llm_client import http_get, http_post, ollama_base
+
+DEFAULT_KEEP_ALIVE = "10m"      # How long Ollama keeps the model after a request
+DEFAULT_PING_INTERVAL = 120     # Seconds between keep-alive pings
+
+class ModelResidency:
+    """
+    Makes sure the first reply doesn't pay for loading a model
+
+    preload() asks Ollama to load each model with an empty prompt (no tokens
+    are generated). While at least one session is active, a background thread
+    repeats that request every ping_interval seconds so Ollama never unloads
+    them between turns. status() reports what Ollama has loaded.
+
+    models is one model name or a list (e.g. every model tier of the cascade).
+    """
+
+    def __init__(self, api_base: str, models, keep_alive: str = DEFAULT_KEEP_ALIVE,
+                 ping_interval: float = DEFAULT_PING_INTERVAL):
+        self.base = ollama_base(api_base)
+        models = [models] if isinstance(models, str) else models
+        self.models = list(dict.fromkeys(models))   # In order, without repeats
+        self.model = self.models[0]
+        self.keep_alive = keep_alive
+        self.ping_interval = ping_interval
+
+        self.state = "unknown"      # unknown, loading, resident, error
+        self.last_load_seconds = None
+        self.last_ping = None
+        self.last_error = None
+
+        self._sessions = 0
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def preload(self, wait: bool = True, quiet: bool = False):
+        """Load the models now (or in the background with wait=False)"""
+        if not wait:
+            threading.Thread(target=self.preload, name="lucy-preload", daemon=True).start()
+            return None
+
+        if self.state != "resident":
+            self.state = "loading"
+        start = time.time()
+        for model in self.models:
+            loading = time.time()
+            try:
+                resp = http_post(f"{self.base}/api/generate", "chat", json={
+                    "model": model,
+                    "prompt": "",
+                    "keep_alive": self.keep_alive
+                })
+                if resp.status_code != 200:
+                    raise RuntimeError(f"{resp.status_code} - {resp.text}")
+            except Exception as e:
+                self.state = "error"
+                self.last_error = str(e)
+                print(f"[Model] Could not load {model}: {e}")
+                return False
+            if not quiet:
+                print(f"[Model] {model} ready ({time.time() - loading:.2f}s)")
+
+        self.last_ping = time.time()
+        self.state = "resident"
+        if not quiet:
+            self.last_load_seconds = round(self.last_ping - start, 2)
+        return True
+
+    def acquire(self):
+        """A session started - preload if needed and keep the model warm"""
+        with self._lock:
+            self._sessions += 1
+            first = self._sessions == 1
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._keep_alive_loop,
+                                                name="lucy-keepalive", daemon=True)
+                self._thread.start()
+
+        if first and self.state != "resident":
+            self.preload(wait=False)
+
+    def release(self):
+        """A session ended - stop pinging once nobody is left"""
+        with self._lock:
+            self._sessions = max(0, self._sessions - 1)
+        self._wakeup.set()
+
+    def _keep_alive_loop(self):
+        """Ping Ollama while sessions are active; exit when the last one ends"""
+        while True:
+            self._wakeup.wait(self.ping_interval)
+            self._wakeup.clear()
+
+            with self._lock:
+                if self._sessions == 0:
+                    self._thread = None
+                    return
+
+            if self.last_ping is None or time.time() - self.last_ping >= self.ping_interval:
+                self.preload(quiet=True)
+
+    def status(self):
+        """Residency as reported by Ollama (/api/ps) plus our own load stats"""
+        info = {
+            "model": self.model,
+            "models": {model: {"resident": False} for model in self.models},
+            "state": self.state,
+            "resident": False,
+            "active_sessions": self._sessions,
+            "last_load_seconds": self.last_load_seconds,
+            "keep_alive": self.keep_alive,
+        }
+        try:
+            resp = http_get(f"{self.base}/api/ps", "tags")
+            for loaded in resp.json().get("models", []):
+                name = loaded.get("name") if loaded.get("name") in info["models"] else loaded.get("model")
+                if name in info["models"]:
+                    info["models"][name] = {"resident": True, "expires_at": loaded.get("expires_at"),
+                                            "size_vram": loaded.get("size_vram")}
+            info["resident"] = all(m["resident"] for m in info["models"].values())
+            info.update({k: v for k, v in info["models"][self.model].items() if k != "resident"})
+            if self.state == "resident" and not info["resident"]:
+                self.state = info["state"] = "unloaded"
+        except Exception as e:
+            info["error"] = str(e)
+        return info
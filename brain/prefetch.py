@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Lucy Prefetcher
+Generates greetings, farewells and idle thoughts in the background so they are ready instantly
+"""
+
+import json
+import os
+import threading
+import time
+from collections import deque
+from pathlib import Path
+
+DEFAULT_DEPTH = 2           # Items kept ready per kind
+DEFAULT_MAX_AGE = 12 * 3600 # Seconds before a saved item is too stale to use
+
+# Sessions with different prefetchers (e.g. in different processes) can share one prefetched.json
+_save_locks = {}
+_save_locks_lock = threading.Lock()
+
+def _save_lock(path: Path):
+    with _save_locks_lock:
+        return _save_locks.setdefault(str(path.resolve()), threading.Lock())
+
+class Prefetcher:
+    """
+    Keeps a small queue of ready-made lines per kind ("greeting", "idle", ...)
+
+    A daemon thread tops the queues up one item at a time, but only while
+    is_idle() says nobody is waiting on the LLM. get() pops a ready item (or
+    returns None so the caller can fall back to a live call), so when several
+    sessions share one prefetcher each item is handed out once. Queues can be
+    saved at the end of a session and loaded at the start of the next one,
+    which is what makes the very first greeting instant.
+    """
+
+    def __init__(self, generate_fn, prompts: dict, depth: int = DEFAULT_DEPTH,
+                 is_idle=None, interval: float = 1.0):
+        # generate_fn(kind, prompt) -> text or None
+        self.generate_fn = generate_fn
+        self.prompts = dict(prompts)
+        self.depth = depth
+        self.is_idle = is_idle or (lambda: True)
+        self.interval = interval
+
+        self._queues = {kind: deque() for kind in prompts}
+        self._loaded = set()    # (created_at, text) items taken from the saved file
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = False
+        self._thread = None
+
+        self.hits = 0
+        self.misses = 0
+        self.generated = 0
+
+    def start(self):
+        """Start filling the queues in the background"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="lucy-prefetch", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stopped = True
+        self._wakeup.set()
+
+    def add_kinds(self, prompts: dict):
+        """Start prefetching more kinds (for a session that needs lines the others didn't)"""
+        with self._lock:
+            for kind, prompt in prompts.items():
+                if kind not in self._queues:
+                    self.prompts[kind] = prompt
+                    self._queues[kind] = deque()
+        self._wakeup.set()
+
+    def get(self, kind: str):
+        """Pop a ready item of this kind, or None if the queue is empty"""
+        with self._lock:
+            queue = self._queues.get(kind)
+            item = queue.popleft() if queue else None
+
+        if item is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        self._wakeup.set()  # Refill what we just used (or didn't have)
+        return item[1] if item else None
+
+    def _next_kind(self):
+        """The kind with the emptiest queue, or None if all are full"""
+        with self._lock:
+            kinds = [k for k, q in self._queues.items() if len(q) < self.depth]
+            return min(kinds, key=lambda k: len(self._queues[k])) if kinds else None
+
+    def _run(self):
+        """Worker thread: generate one item at a time while Lucy is idle"""
+        while not self._stopped:
+            kind = self._next_kind()
+            if kind is None or not self.is_idle():
+                self._wakeup.wait(self.interval)
+                self._wakeup.clear()
+                continue
+
+            try:
+                text = self.generate_fn(kind, self.prompts[kind])
+            except Exception as e:
+                print(f"[Prefetch] Error generating {kind}: {e}")
+                text = None
+
+            if text and text.strip():
+                with self._lock:
+                    self._queues[kind].append((time.time(), text.strip()))
+                self.generated += 1
+            else:
+                # Back off if the LLM is unavailable
+                self._wakeup.wait(self.interval * 5)
+                self._wakeup.clear()
+
+    def save(self, path: Path, max_age: float = DEFAULT_MAX_AGE):
+        """
+        Persist ready items so the next session can start with them
+
+        Merged into what other sessions saved: kinds this session doesn't
+        prefetch are kept, and items it loaded and used are dropped.
+        """
+        path = Path(path)
+        with self._lock:
+            ours = {kind: [tuple(item) for item in queue] for kind, queue in self._queues.items()}
+            used = self._loaded.difference(item for items in ours.values() for item in items)
+
+        now = time.time()
+        try:
+            with _save_lock(path):
+                try:
+                    data = json.loads(path.read_text()) if path.exists() else {}
+                except ValueError:
+                    data = {}
+                for kind, items in ours.items():
+                    saved = [tuple(item) for item in data.get(kind, [])]
+                    merged = {item for item in saved + items if item not in used}
+                    data[kind] = sorted(merged, reverse=True)[:self.depth]
+                data = {kind: [item for item in items if now - item[0] <= max_age]
+                        for kind, items in data.items()}
+
+                tmp = path.with_name(path.name + ".tmp")
+                tmp.write_text(json.dumps(data, indent=2))
+                os.replace(tmp, path)
+        except Exception as e:
+            print(f"[Prefetch] Error saving: {e}")
+
+    def load(self, path: Path, max_age: float = DEFAULT_MAX_AGE):
+        """Load items saved by a previous session, skipping stale ones and ones already loaded"""
+        path = Path(path)
+        if not path.exists():
+            return
+        try:
+            data = json.loads(path.read_text())
+        except Exception as e:
+            print(f"[Prefetch] Ignoring unreadable {path.name}: {e}")
+            return
+
+        now = time.time()
+        with self._lock:
+            for kind, items in data.items():
+                if kind not in self._queues:
+                    continue
+                for created_at, text in items:
+                    if (created_at, text) in self._loaded:
+                        continue
+                    if now - created_at <= max_age and len(self._queues[kind]) < self.depth:
+                        self._queues[kind].append((created_at, text))
+                        self._loaded.add((created_at, text))
+
+    def stats(self):
+        """Hit/miss counters and queue depths"""
+        with self._lock:
+            ready = {kind: len(queue) for kind, queue in self._queues.items()}
+        return {"hits": self.hits, "misses": self.misses, "generated": self.generated, "ready": ready}
@@ -0,0 +1,460 @@
+#!/usr/bin/env python3
+"""
+Lucy Profiling
+Opt-in profiles of the hot paths (face frames, brain turns, websocket turns), plus
+"profile the next N seconds" on demand
+
+Switch it on with LUCY_PROFILE=cprofile|sample (or "profiling" in the config):
+
+- cprofile: each region (see region() and profiled()) is profiled with cProfile and
+  written every flush_seconds to <app>-<region>-<time>.prof
+  (python -m pstats <file>, or snakeviz)
+- sample: every thread is sampled every interval seconds and the stacks are written
+  to <app>-sample-<time>.folded (speedscope.app or flamegraph.pl)
+
+A capture (SIGUSR1, or /debug/profile on the web apps) always samples, so it works
+without a restart whatever the mode.
+"""
+
+import atexit
+import cProfile
+import functools
+import inspect
+import os
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+
+MODES = ("off", "cprofile", "sample")
+INTERVAL = 0.01         # Seconds between samples (100 Hz keeps the Pi's overhead low)
+FLUSH_SECONDS = 60.0    # How often continuous profiles are written out
+KEEP = 10               # Files kept per app and kind; older ones are deleted
+CAPTURE_SECONDS = 30    # Default length of a triggered capture
+MAX_CAPTURE_SECONDS = 300
+TOP = 25                # Functions listed in a capture report
+
+# Leaf frames of threads that are just waiting - left out of the "busiest" report
+IDLE_LEAVES = {
+    "threading:wait", "threading:_wait_for_tstate_lock", "selectors:select",
+    "socket:accept", "queue:get", "thread:_worker", "profiling:capture",
+    "profiling:_flush_samples",
+}
+
+def _frame_name(code):
+    return f"{Path(code.co_filename).stem}:{code.co_name}"
+
+class SamplingProfiler:
+    """
+    Samples the Python stack of every thread from a background thread
+
+    Wall-clock, so a thread blocked on the network counts as much as a busy
+    one - which is what you want when asking why a turn was slow. Stacks are
+    prefixed with the thread name and the region the thread was in.
+    """
+
+    def __init__(self, regions: dict, interval: float = INTERVAL):
+        self.regions = regions
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self.started = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        self.started = time.time()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="lucy-profiler")
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def take(self):
+        """Return the stacks collected so far and start counting again"""
+        with self._lock:
+            stacks, self.stacks = self.stacks, Counter()
+            samples, self.samples = self.samples, 0
+        return stacks, samples
+
+    def _run(self):
+        me = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            if self.samples % 100 == 0:
+                names = {t.ident: t.name for t in threading.enumerate()}
+            frames = sys._current_frames()
+            with self._lock:
+                self.samples += 1
+                for tid, frame in frames.items():
+                    if tid == me:
+                        continue
+                    stack = []
+                    while frame is not None:
+                        stack.append(_frame_name(frame.f_code))
+                        frame = frame.f_back
+                    stack.append(names.get(tid, str(tid)))
+                    regions = self.regions.get(tid)
+                    if regions:
+                        stack.insert(-1, f"[{'>'.join(regions)}]")
+                    self.stacks[";".join(reversed(stack))] += 1
+
+def write_folded(stacks: Counter, path: Path):
+    """Collapsed-stack format: one "frame;frame;frame count" line per stack"""
+    with open(path, "w", encoding="utf-8") as f:
+        for stack, count in stacks.most_common():
+            f.write(f"{stack} {count}\n")
+
+def report(stacks: Counter, samples: int, seconds: float, top: int = TOP):
+    """Busiest functions (by samples where they were running) and time per region"""
+    leaves, regions = Counter(), Counter()
+    for stack, count in stacks.items():
+        frames = stack.split(";")
+        if frames[-1] not in IDLE_LEAVES:
+            leaves[frames[-1]] += count
+        if len(frames) > 1 and frames[1].startswith("["):
+            regions[frames[1]] += count
+
+    busy = sum(leaves.values()) or 1
+    lines = [f"{samples} samples over {seconds:.1f} s",
+             "", "Busiest functions (share of non-idle samples):"]
+    for name, count in leaves.most_common(top):
+        lines.append(f"  {100 * count / busy:5.1f}%  {name}")
+    if regions:
+        lines += ["", "Samples per region:"]
+        for name, count in regions.most_common():
+            lines.append(f"  {count:6d}  {name}")
+    return "\n".join(lines)
+
+class Profiler:
+    """
+    The process's profiling switch, regions and captures
+
+    Regions cost one attribute check when profiling is off and no capture
+    is running, so they can stay in the hot paths.
+    """
+
+    def __init__(self, app: str = "lucy", mode: str = "off", out_dir=None, keep: int = KEEP,
+                 interval: float = INTERVAL, flush_seconds: float = FLUSH_SECONDS):
+        self.app = app
+        self.mode = "off"
+        self.out_dir = Path(out_dir) if out_dir else Path("data") / "profiles"
+        self.keep = keep
+        self.interval = interval
+        self.flush_seconds = flush_seconds
+        self.captures = 0
+        self.files = 0
+
+        self._regions = {}          # thread ident -> names of the regions it is in
+        self._samplers = 0          # Running samplers (continuous or capture)
+        self._profiles = {}         # region -> cProfile.Profile
+        self._flushed = {}          # region -> time of the last write
+        self._cprofile = threading.Lock()   # One cProfile at a time (Python 3.12+ allows no more)
+        self._capture = threading.Lock()
+        self._sampler = None
+        self._lock = threading.Lock()
+        self.set_mode(mode)
+        atexit.register(self.flush)
+
+    # --- switch ---
+
+    def set_mode(self, mode: str):
+        """Turn continuous profiling off or to "cprofile" / "sample" (at any time)"""
+        if mode not in MODES:
+            print(f"[Profile] Unknown mode {mode!r} (use one of {', '.join(MODES)})")
+            return
+        if mode == self.mode:
+            return
+        self.flush()
+        if self._sampler is not None:
+            self._sampler.stop()
+            self._sampler = None
+            self._samplers -= 1
+        self.mode = mode
+        if mode == "sample":
+            self._sampler = SamplingProfiler(self._regions, self.interval)
+            self._samplers += 1
+            self._sampler.start()
+            threading.Thread(target=self._flush_samples, daemon=True, name="lucy-profile-flush").start()
+        if mode != "off":
+            print(f"[Profile] {mode} profiling on, writing to {self.out_dir}")
+
+    @property
+    def active(self) -> bool:
+        return self.mode != "off" or self._samplers > 0
+
+    # --- regions ---
+
+    @contextmanager
+    def region(self, name: str):
+        """
+        with region("face.frame"): ... - a hot path worth profiling
+
+        Nested regions are attributed to the outermost one (a thread can
+        only run one cProfile at a time).
+        """
+        if not self.active:
+            yield
+            return
+
+        tid = threading.get_ident()
+        stack = self._regions.setdefault(tid, [])
+        stack.append(name)
+        profile = None
+        if self.mode == "cprofile" and len(stack) == 1 and self._cprofile.acquire(blocking=False):
+            profile = self._profiles.get(name) or self._profiles.setdefault(name, cProfile.Profile())
+            try:
+                profile.enable()
+            except ValueError:
+                # Another profiler (a debugger, say) owns the hooks
+                self._cprofile.release()
+                profile = None
+        try:
+            yield
+        finally:
+            if profile is not None:
+                profile.disable()
+                self._maybe_flush(name)
+                self._cprofile.release()
+            stack.pop()
+            if not stack:
+                self._regions.pop(tid, None)
+
+    def profiled(self, name: str):
+        """
+        Decorator form of region() for functions, generators, coroutines and
+        async generators
+
+        Generators and coroutines are profiled one step at a time, so the
+        time they spend suspended (waiting for the LLM, or while other
+        websocket handlers run) isn't charged to them.
+        """
+        def decorate(func):
+            if inspect.isasyncgenfunction(func):
+                @functools.wraps(func)
+                async def agen_wrapper(*args, **kwargs):
+                    agen = func(*args, **kwargs)
+                    try:
+                        while True:
+                            try:
+                                item = await _Stepped(agen.__anext__(), self, name)
+                            except StopAsyncIteration:
+                                return
+                            yield item
+                    finally:
+                        await agen.aclose()
+                return agen_wrapper
+
+            if inspect.iscoroutinefunction(func):
+                @functools.wraps(func)
+                async def coro_wrapper(*args, **kwargs):
+                    return await _Stepped(func(*args, **kwargs), self, name)
+                return coro_wrapper
+
+            if inspect.isgeneratorfunction(func):
+                @functools.wraps(func)
+                def gen_wrapper(*args, **kwargs):
+                    gen = func(*args, **kwargs)
+                    try:
+                        while True:
+                            with self.region(name):
+                                try:
+                                    item = next(gen)
+                                except StopIteration as e:
+                                    return e.value
+                            yield item
+                    finally:
+                        gen.close()
+                return gen_wrapper
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.region(name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    # --- output ---
+
+    def _output(self, kind: str, suffix: str) -> Path:
+        """A new file for this kind of output, deleting the oldest beyond keep"""
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        prefix = f"{self.app}-{kind}-"
+        old = sorted(self.out_dir.glob(f"{prefix}*{suffix}"))
+        for stale in old[:max(0, len(old) - self.keep + 1)]:
+            try:
+                stale.unlink()
+            except OSError:
+                pass
+        now = time.time()
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(now)) + f"-{int(now * 1000) % 1000:03d}"
+        self.files += 1
+        return self.out_dir / f"{prefix}{stamp}{suffix}"
+
+    def _maybe_flush(self, name: str):
+        """Write a region's cProfile stats if it's time (cProfile lock held)"""
+        now = time.monotonic()
+        last = self._flushed.setdefault(name, now)
+        if now - last >= self.flush_seconds:
+            self._write_profile(name)
+            self._flushed[name] = now
+
+    def _write_profile(self, name: str):
+        profile = self._profiles.pop(name, None)
+        if profile is None:
+            return
+        try:
+            profile.dump_stats(str(self._output(name, ".prof")))
+        except (OSError, TypeError) as e:
+            print(f"[Profile] Could not write {name} profile: {e}")
+
+    def _flush_samples(self):
+        sampler = self._sampler
+        while sampler is self._sampler and not sampler._stop.wait(self.flush_seconds):
+            self._write_samples(sampler)
+
+    def _write_samples(self, sampler):
+        stacks, samples = sampler.take()
+        if not stacks:
+            return
+        try:
+            write_folded(stacks, self._output("sample", ".folded"))
+        except OSError as e:
+            print(f"[Profile] Could not write samples: {e}")
+
+    def flush(self):
+        """Write whatever the continuous profiles hold now (also runs at exit)"""
+        if self._sampler is not None:
+            self._write_samples(self._sampler)
+        with self._cprofile:
+            for name in list(self._profiles):
+                self._write_profile(name)
+                self._flushed[name] = time.monotonic()
+
+    # --- captures ---
+
+    def capture(self, seconds: float = CAPTURE_SECONDS):
+        """
+        Sample every thread for the next N seconds (blocking)
+
+        Returns (path of the .folded file, text report), or (None, reason)
+        if a capture is already running.
+        """
+        seconds = max(0.1, min(float(seconds), MAX_CAPTURE_SECONDS))
+        if not self._capture.acquire(blocking=False):
+            return None, "A capture is already running"
+        try:
+            sampler = SamplingProfiler(self._regions, self.interval)
+            with self._lock:
+                self._samplers += 1
+            sampler.start()
+            time.sleep(seconds)
+            sampler.stop()
+            with self._lock:
+                self._samplers -= 1
+
+            stacks, samples = sampler.take()
+            path = self._output("capture", ".folded")
+            write_folded(stacks, path)
+            text = report(stacks, samples, seconds)
+            path.with_suffix(".txt").write_text(text + "\n", encoding="utf-8")
+            self.captures += 1
+            print(f"[Profile] Captured {seconds:.1f} s to {path}")
+            return path, f"Profile of {self.app}, saved to {path}\n{text}"
+        finally:
+            self._capture.release()
+
+    def start_capture(self, seconds: float = CAPTURE_SECONDS):
+        """capture() in a background thread"""
+        threading.Thread(target=self.capture, args=(seconds,), daemon=True,
+                         name="lucy-profile-capture").start()
+
+    def install_signal_handler(self, seconds: float = CAPTURE_SECONDS):
+        """
+        kill -USR1 <pid> captures the next N seconds (no-op where SIGUSR1
+        doesn't exist, e.g. Windows)
+        """
+        if not hasattr(signal, "SIGUSR1"):
+            return False
+        try:
+            signal.signal(signal.SIGUSR1, lambda signum, frame: self.start_capture(seconds))
+        except ValueError:
+            return False  # Not the main thread
+        return True
+
+    def describe(self):
+        """One-line summary for console output"""
+        return (f"{self.mode}, {self.captures} captures, {self.files} files in {self.out_dir}")
+
+class _Stepped:
+    """Await a coroutine, profiling each step it runs (not the time it spends suspended)"""
+
+    def __init__(self, coro, profiler: Profiler, name: str):
+        self.coro = coro
+        self.profiler = profiler
+        self.name = name
+
+    def __await__(self):
+        value, error = None, None
+        while True:
+            with self.profiler.region(self.name):
+                try:
+                    if error is not None:
+                        step = self.coro.throw(error)
+                    else:
+                        step = self.coro.send(value)
+                except StopIteration as e:
+                    return e.value
+            try:
+                value, error = (yield step), None
+            except BaseException as e:
+                value, error = None, e
+
+_profiler = Profiler()
+
+def configure(app: str = None, mode: str = None, out_dir=None, keep: int = None,
+              interval: float = None, flush_seconds: float = None):
+    """Set up the process-wide profiler (unset arguments are kept)"""
+    if app is not None:
+        _profiler.app = app
+    if out_dir is not None:
+        _profiler.out_dir = Path(out_dir)
+    if keep is not None:
+        _profiler.keep = keep
+    if interval is not None:
+        _profiler.interval = interval
+    if flush_seconds is not None:
+        _profiler.flush_seconds = flush_seconds
+    if mode is not None:
+        _profiler.set_mode(mode)
+
+def from_config(cfg: dict, default_dir, app: str = None):
+    """
+    Profiling from "profiling" in the config, overridden by LUCY_PROFILE / LUCY_PROFILE_DIR
+
+    e.g. {"profiling": {"mode": "cprofile", "dir": "data/profiles", "keep": 10, "flush_seconds": 60}}
+    """
+    profiling_cfg = cfg.get("profiling", {})
+    configure(app=app,
+              out_dir=os.environ.get("LUCY_PROFILE_DIR") or profiling_cfg.get("dir", default_dir),
+              keep=profiling_cfg.get("keep", KEEP),
+              interval=profiling_cfg.get("interval", INTERVAL),
+              flush_seconds=profiling_cfg.get("flush_seconds", FLUSH_SECONDS),
+              mode=os.environ.get("LUCY_PROFILE") or profiling_cfg.get("mode", "off"))
+
+def get_profiler():
+    return _profiler
+
+def region(name: str):
+    """with region("face.frame"): ... on the process-wide profiler"""
+    return _profiler.region(name)
+
+def profiled(name: str):
+    """@profiled("brain.process_message") on the process-wide profiler"""
+    return _profiler.profiled(name)
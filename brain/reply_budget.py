@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Lucy Reply Budget
+Stops a generation once Lucy has said enough sentences
+"""
+
+from llm_client import SENTENCE_ENDINGS, tool_call_state
+
+# Sentences per reply for each way Lucy talks (0 = no limit)
+DEFAULT_BUDGETS = {
+    "voice": 3,     # Spoken aloud - the kids prompt asks for 2-3 sentences
+    "web": 4,       # Read on screen
+    "tool": 6,      # Tool loop replies (tool calls themselves are never cut)
+}
+
+# Sent as "stop" so the model can't start writing the child's side of the
+# conversation (or, in the tool loop, invent a tool result)
+STOP_SEQUENCES = {
+    "voice": ["\n\n", "\nUser:", "\nChild:", "\nLucy:"],
+    "web": ["\n\n\n", "\nUser:", "\nChild:", "\nLucy:"],
+    "tool": ["\nTOOL RESULT:", "\nUser:", "\nLucy:"],
+}
+
+# Words whose trailing period doesn't end a sentence
+ABBREVIATIONS = {"mr", "mrs", "ms", "dr", "st", "vs", "eg", "ie", "etc"}
+
+def is_sentence_end(text: str, i: int) -> bool:
+    """True if text[i] ends a sentence (it must be followed by whitespace)"""
+    if text[i] not in SENTENCE_ENDINGS or not text[i + 1].isspace():
+        return False
+    if text[i] == ".":
+        before = text[:i].split()
+        word = before[-1].lower().replace(".", "") if before else ""
+        if word.isdigit() or word in ABBREVIATIONS:
+            return False  # "1. First..." or "Dr. Bones"
+    return True
+
+class _SentenceCutter:
+    """Counts sentences in a growing reply and finds where the budget runs out"""
+
+    def __init__(self, max_sentences: int):
+        self.max_sentences = max_sentences
+        self.text = ""
+        self.scanned = 0
+        self.sentences = 0
+        self.passthrough = False
+
+    def feed(self, token: str):
+        """Return (the part of token to keep, whether the budget is used up)"""
+        start = len(self.text)
+        self.text += token
+        if self.passthrough:
+            return token, False
+        if tool_call_state(self.text):
+            self.passthrough = True  # Tool calls go to the tool loop whole
+            return token, False
+
+        for i in range(self.scanned, len(self.text) - 1):
+            if is_sentence_end(self.text, i):
+                self.sentences += 1
+                if self.sentences >= self.max_sentences:
+                    return token[:max(0, i + 1 - start)], True
+        # The last character is checked again once we know what follows it
+        self.scanned = max(0, len(self.text) - 1)
+        return token, False
+
+class ReplyBudget:
+    """
+    Sentence budget and stop sequences for one kind of reply
+
+    apply() adds the stop sequences to a request; limit()/alimit() wrap the
+    token stream and close it as soon as the last allowed sentence is
+    complete, which drops the connection so the model stops generating.
+    """
+
+    def __init__(self, mode: str, max_sentences: int = None, stop=None):
+        self.mode = mode
+        self.max_sentences = DEFAULT_BUDGETS.get(mode, 0) if max_sentences is None else max_sentences
+        self.stop = list(STOP_SEQUENCES.get(mode, [])) if stop is None else list(stop)
+        self.replies = 0
+        self.stops = 0
+
+    def apply(self, payload: dict) -> dict:
+        """Request body with this mode's stop sequences added"""
+        if not self.stop:
+            return payload
+        return dict(payload, stop=self.stop)
+
+    def limit(self, tokens):
+        """Yield tokens until the sentence budget is spent, then close the stream"""
+        self.replies += 1
+        if not self.max_sentences:
+            yield from tokens
+            return
+
+        cutter = _SentenceCutter(self.max_sentences)
+        try:
+            for token in tokens:
+                keep, done = cutter.feed(token)
+                if keep:
+                    yield keep
+                if done:
+                    self.stops += 1
+                    return
+        finally:
+            close = getattr(tokens, "close", None)
+            if close is not None:
+                close()
+
+    async def alimit(self, tokens):
+        """Async limit() for token streams on an event loop"""
+        self.replies += 1
+        if not self.max_sentences:
+            async for token in tokens:
+                yield token
+            return
+
+        cutter = _SentenceCutter(self.max_sentences)
+        try:
+            async for token in tokens:
+                keep, done = cutter.feed(token)
+                if keep:
+                    yield keep
+                if done:
+                    self.stops += 1
+                    return
+        finally:
+            aclose = getattr(tokens, "aclose", None)
+            if aclose is not None:
+                await aclose()
+
+    def trim(self, text: str) -> str:
+        """Cut an already complete reply to the budget"""
+        if not self.max_sentences or not text:
+            return text
+        keep, _ = _SentenceCutter(self.max_sentences).feed(text + " ")
+        return keep.rstrip()
+
+    def describe(self):
+        """One-line summary for console output"""
+        if not self.max_sentences:
+            return f"{self.mode}: no sentence limit"
+        return (f"{self.mode}: {self.stops}/{self.replies} replies stopped early "
+                f"at {self.max_sentences} sentences")
+
+def from_config(cfg: dict, mode: str):
+    """
+    Budget for a mode from "sentence_budget" in the config
+
+    e.g. {"sentence_budget": {"voice": 2, "web": 0}} - 0 turns the limit off.
+    "stop_sequences" overrides the stop list per mode the same way.
+    """
+    return ReplyBudget(mode, max_sentences=cfg.get("sentence_budget", {}).get(mode),
+                       stop=cfg.get("stop_sequences", {}).get(mode))
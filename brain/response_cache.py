@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Lucy Response Cache
+Answers repeated prompts from memory (and optionally disk) instead of asking the LLM again
+"""
+
+import json
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+DEFAULT_MAX_ENTRIES = 256       # In-memory LRU size
+DEFAULT_TTL = 24 * 3600         # Seconds before a cached reply is regenerated
+DEFAULT_MAX_DISK_ENTRIES = 2000
+
+def normalize_prompt(text: str) -> str:
+    """Lowercase, collapse whitespace and drop trailing punctuation"""
+    text = re.sub(r"\s+", " ", text.lower()).strip()
+    return text.rstrip(" .!?")
+
+def make_key(model: str, messages: list, **params) -> str:
+    """
+    Cache key for a chat request, or None if it shouldn't be cached
+
+    The key covers the model and request params, every system message (prompt,
+    memory, rolling summary), the previous assistant reply and the normalized
+    last user message. Older turns are left out so a question repeated in a
+    new session still hits.
+    """
+    if not messages or messages[-1]["role"] != "user":
+        return None
+
+    system = [m["content"] for m in messages if m["role"] == "system"]
+    previous = next((m["content"] for m in reversed(messages[:-1]) if m["role"] == "assistant"), "")
+    raw = json.dumps([model, params, system, previous, normalize_prompt(messages[-1]["content"])],
+                     sort_keys=True)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+class ResponseCache:
+    """
+    LRU cache of LLM replies with a TTL and an optional on-disk tier
+
+    The memory tier is an OrderedDict in LRU order. With disk_path set, every
+    reply is also written to one small JSON file per key, so answers survive
+    restarts; a memory miss checks disk and promotes what it finds.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, ttl: float = DEFAULT_TTL,
+                 disk_path: Path = None, max_disk_entries: int = DEFAULT_MAX_DISK_ENTRIES):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.disk_path = Path(disk_path) if disk_path else None
+        self.max_disk_entries = max_disk_entries
+        if self.disk_path:
+            self.disk_path.mkdir(parents=True, exist_ok=True)
+
+        self._entries = OrderedDict()  # key -> (created_at, reply)
+        self._lock = threading.Lock()
+        self._disk_writes = 0
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _expired(self, created_at: float) -> bool:
+        return self.ttl is not None and time.time() - created_at > self.ttl
+
+    def get(self, key: str):
+        """Cached reply for key, or None"""
+        if key is None:
+            return None
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and self._expired(entry[0]):
+                del self._entries[key]
+                entry = None
+            if entry:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+
+        entry = self._read_disk(key)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.disk_hits += 1
+            self._store(key, entry)
+        return entry[1]
+
+    def put(self, key: str, reply: str):
+        """Remember a reply"""
+        if key is None or not reply:
+            return
+        entry = (time.time(), reply)
+        with self._lock:
+            self._store(key, entry)
+        self._write_disk(key, entry)
+
+    def _store(self, key: str, entry):
+        """Insert into the memory tier (lock held)"""
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _disk_file(self, key: str) -> Path:
+        return self.disk_path / f"{key}.json"
+
+    def _read_disk(self, key: str):
+        if not self.disk_path:
+            return None
+        path = self._disk_file(key)
+        try:
+            data = json.loads(path.read_text())
+        except FileNotFoundError:
+            return None
+        except Exception:
+            path.unlink(missing_ok=True)
+            return None
+
+        if self._expired(data["created_at"]):
+            path.unlink(missing_ok=True)
+            return None
+        return data["created_at"], data["reply"]
+
+    def _write_disk(self, key: str, entry):
+        if not self.disk_path:
+            return
+        path = self._disk_file(key)
+        tmp = path.with_suffix(".tmp")
+        try:
+            tmp.write_text(json.dumps({"created_at": entry[0], "reply": entry[1]}))
+            os.replace(tmp, path)
+            self._disk_writes += 1
+            if self._disk_writes % 50 == 0:
+                self._prune_disk()
+        except Exception as e:
+            print(f"[Cache] Error saving reply: {e}")
+
+    def _prune_disk(self):
+        """Drop the oldest files once the disk tier is over its limit"""
+        files = list(self.disk_path.glob("*.json"))
+        if len(files) <= self.max_disk_entries:
+            return
+        files.sort(key=lambda p: p.stat().st_mtime)
+        for path in files[:len(files) - self.max_disk_entries]:
+            path.unlink(missing_ok=True)
+
+    def clear(self):
+        """Forget everything, including the disk tier"""
+        with self._lock:
+            self._entries.clear()
+        if self.disk_path:
+            for path in self.disk_path.glob("*.json"):
+                path.unlink(missing_ok=True)
+
+    def stats(self):
+        """Hit/miss counters"""
+        with self._lock:
+            entries = len(self._entries)
+        lookups = self.hits + self.misses
+        return {
+            "entries": entries,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Lucy Semantic Cache
+Answers paraphrased questions ("what food do dolphins like?") from earlier replies
+"""
+
+import math
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+DEFAULT_MAX_ENTRIES = 500
+DEFAULT_THRESHOLD = 0.82        # Cosine similarity needed to reuse an answer
+DEFAULT_TTL = 7 * 24 * 3600
+HASH_BUCKETS = 1 << 18
+TRIGRAM_WEIGHT = 0.3            # Character trigrams catch plurals and typos; words carry the meaning
+BIGRAM_WEIGHT = 1.5             # Word order: "do cats eat fish?" is not "do fish eat cats?"
+MIN_CONTENT_WORDS = 2           # "why?" or "what about sharks?" depend on the conversation
+MAX_GIST_DIFFERENCE = 1         # Content words one question may have that the other lacks
+
+STOPWORDS = {
+    "a", "an", "the", "is", "are", "was", "were", "be", "do", "does", "did", "can", "could",
+    "would", "should", "will", "what", "whats", "how", "why", "when", "where", "who", "which",
+    "of", "to", "in", "on", "at", "for", "with", "about", "and", "or", "it", "its", "they",
+    "them", "their", "there", "this", "that", "these", "those", "you", "your", "lucy", "hey",
+    "hi", "so", "really", "tell", "know", "please", "kind", "sort",
+    # Contractions, once the apostrophe is gone ("why's the sky blue?")
+    "whys", "hows", "wheres", "whens", "whos", "thats", "theres", "theyre", "youre",
+}
+
+# Other ways kids ask "why" ("how come the sky is blue?", "what makes the sky blue?")
+WHY_PHRASES = re.compile(r"\b(how come|what makes|what made|what causes)\b")
+
+# Words that make a question about the child or the conversation, not the world
+PERSONAL_WORDS = {"i", "im", "me", "my", "mine", "we", "our", "us", "remember", "again", "yesterday"}
+
+# Kid-vocabulary synonyms folded together before hashing
+SYNONYMS = {
+    "food": "eat", "eats": "eat", "eating": "eat", "ate": "eat", "foods": "eat",
+    "like": "love", "likes": "love", "loves": "love", "favorite": "love",
+    "big": "large", "huge": "large", "biggest": "large", "largest": "large",
+    "small": "little", "tiny": "little", "smallest": "little",
+    "live": "home", "lives": "home", "living": "home", "habitat": "home",
+    "fast": "speed", "faster": "speed", "fastest": "speed", "quick": "speed",
+}
+
+# "Why don't fish drown?" needs a different answer from "why do fish drown?"
+NEGATIONS = {
+    "not", "no", "never", "nothing", "none", "nobody", "nowhere", "dont", "doesnt", "didnt",
+    "isnt", "arent", "wasnt", "werent", "cant", "cannot", "couldnt", "wont", "wouldnt",
+    "shouldnt", "havent", "hasnt",
+}
+
+# Words the synonyms fold into; where they sit in a question doesn't change what is asked
+# ("what food do dolphins like?" / "what do dolphins eat?"), so they are left out of bigrams
+ATTRIBUTE_WORDS = set(SYNONYMS.values())
+
+QUESTION_STARTS = ("what", "whats", "how", "why", "when", "where", "who", "which",
+                   "do", "does", "did", "can", "could", "is", "are", "will")
+
+def _words(text: str):
+    text = text.lower().replace("'", "").replace("\u2019", "")
+    return re.findall(r"[a-z]+", WHY_PHRASES.sub("why", text))
+
+def content_words(text: str):
+    """Normalized meaningful words: stopwords dropped, synonyms and plurals folded"""
+    words = []
+    for word in _words(text):
+        if word in STOPWORDS or word in NEGATIONS:
+            continue
+        word = SYNONYMS.get(word, word)
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        words.append(SYNONYMS.get(word, word))
+    if "eat" in words:
+        # "What food do dolphins like?" asks what they eat
+        words = [word for word in words if word != "love"]
+    return words
+
+def gist(text: str):
+    """(content words, negated) of a question, for same_gist()"""
+    return frozenset(content_words(text)), bool(NEGATIONS.intersection(_words(text)))
+
+def same_gist(a, b) -> bool:
+    """
+    True if two gists are close enough for the vectors to decide
+
+    Both or neither must be negated, and at most MAX_GIST_DIFFERENCE content
+    words may differ: "what do baby dolphins eat?" gets compared with "what do
+    dolphins eat?" (and its score is too low), "what do sharks eat?" never is.
+    """
+    return a[1] == b[1] and len(a[0] ^ b[0]) <= MAX_GIST_DIFFERENCE
+
+def is_cacheable_question(text: str) -> bool:
+    """True for standalone questions about the world that any child might ask"""
+    words = _words(text)
+    if not words:
+        return False
+    if not (text.strip().endswith("?") or words[0] in QUESTION_STARTS):
+        return False
+    if PERSONAL_WORDS.intersection(words):
+        return False
+    return len(content_words(text)) >= MIN_CONTENT_WORDS
+
+def _bucket(feature: str) -> int:
+    return zlib.crc32(feature.encode("utf-8")) % HASH_BUCKETS
+
+def vectorize(text: str) -> dict:
+    """Hashed sparse vector (bucket -> weight) of words, word bigrams and character trigrams, unit length"""
+    vector = {}
+    words = content_words(text)
+    for word in words:
+        bucket = _bucket("w:" + word)
+        vector[bucket] = vector.get(bucket, 0.0) + 1.0
+
+        padded = f" {word} "
+        for i in range(len(padded) - 2):
+            bucket = _bucket("c:" + padded[i:i + 3])
+            vector[bucket] = vector.get(bucket, 0.0) + TRIGRAM_WEIGHT
+
+    ordered = [word for word in words if word not in ATTRIBUTE_WORDS]
+    for first, second in zip(ordered, ordered[1:]):
+        bucket = _bucket(f"b:{first} {second}")
+        vector[bucket] = vector.get(bucket, 0.0) + BIGRAM_WEIGHT
+
+    norm = math.sqrt(sum(w * w for w in vector.values()))
+    if norm:
+        for bucket in vector:
+            vector[bucket] /= norm
+    return vector
+
+def cosine(a: dict, b: dict) -> float:
+    """Cosine similarity of two unit-length sparse vectors"""
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(weight * b.get(bucket, 0.0) for bucket, weight in a.items())
+
+class SemanticCache:
+    """
+    Bounded index of question vectors and Lucy's answers
+
+    lookup() compares a new question against every indexed one (a few hundred
+    sparse dot products - well under a millisecond) and returns the best
+    answer above the similarity threshold among questions with nearly the
+    same content words (same_gist()), so "what do sharks eat?" or "what do
+    dolphins not eat?" never get the answer to "what do dolphins eat?". Entries are namespaced
+    (model + system prompt) and evicted least-recently-used first.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, threshold: float = DEFAULT_THRESHOLD,
+                 ttl: float = DEFAULT_TTL):
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.ttl = ttl
+
+        self._entries = OrderedDict()  # (namespace, question) -> (vector, reply, created_at, gist)
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def lookup(self, namespace: str, question: str):
+        """Return (reply, similarity) for the closest cached question, or (None, best score)"""
+        vector = vectorize(question)
+        if not vector:
+            return None, 0.0
+        question_gist = gist(question)
+
+        now = time.time()
+        best_key, best_score = None, 0.0
+        with self._lock:
+            for key, (other, _, created_at, other_gist) in list(self._entries.items()):
+                if self.ttl is not None and now - created_at > self.ttl:
+                    del self._entries[key]
+                    continue
+                if key[0] != namespace or not same_gist(other_gist, question_gist):
+                    continue
+                score = cosine(vector, other)
+                if score > best_score:
+                    best_key, best_score = key, score
+
+            if best_key is None or best_score < self.threshold:
+                self.misses += 1
+                return None, best_score
+
+            self._entries.move_to_end(best_key)
+            self.hits += 1
+            return self._entries[best_key][1], best_score
+
+    def add(self, namespace: str, question: str, reply: str):
+        """Index an answered question"""
+        vector = vectorize(question)
+        if not vector or not reply:
+            return
+        key = (namespace, " ".join(_words(question)))
+        with self._lock:
+            self._entries[key] = (vector, reply, time.time(), gist(question))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        """Hit/miss counters"""
+        with self._lock:
+            entries = len(self._entries)
+        lookups = self.hits + self.misses
+        return {
+            "entries": entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Lucy Trace Viewer
+Shows turn traces from the JSONL trace file as a waterfall
+
+    python brain/trace_view.py                      # Last 5 turns
+    python brain/trace_view.py --slowest 3          # The 3 slowest turns
+    python brain/trace_view.py --trace 3f2a9c       # One turn by (prefix of) its ID
+    python brain/trace_view.py data/traces --name voice.turn
+"""
+
+import argparse
+import json
+import sys
+from datetime import datetime
+from pathlib import Path
+
+DEFAULT_PATH = Path("data") / "traces"
+BAR_WIDTH = 40
+NAME_WIDTH = 26
+
+def trace_files(path: Path):
+    """The trace file(s) at path, oldest first (a directory means every trace file in it)"""
+    if path.is_file():
+        files = [path]
+    else:
+        files = list(path.glob("*.jsonl")) + list(path.glob("*.jsonl.1"))
+    # Rotated files hold the older spans
+    return sorted(files, key=lambda f: (not f.name.endswith(".1"), f.name))
+
+def load_traces(path: Path):
+    """{trace ID: [span records]} from one or more JSONL files"""
+    traces = {}
+    for file in trace_files(path):
+        with open(file, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # A line cut short by a crash
+                traces.setdefault(record["trace"], []).append(record)
+    return traces
+
+def _root(spans):
+    ids = {s["span"] for s in spans}
+    roots = [s for s in spans if s.get("parent") not in ids]
+    return min(roots or spans, key=lambda s: s["start"])
+
+def _extent(spans):
+    """(start, end) of a trace in epoch seconds, spans from every process included"""
+    start = min(s["start"] for s in spans)
+    end = max(s["start"] + s["ms"] / 1000 for s in spans)
+    return start, end
+
+def _duration_ms(spans):
+    start, end = _extent(spans)
+    return (end - start) * 1000
+
+def _bar(offset_ms: float, ms: float, total_ms: float, width: int):
+    scale = width / total_ms if total_ms > 0 else 0
+    begin = min(width - 1, int(offset_ms * scale))
+    length = max(1, round(ms * scale))
+    length = min(length, width - begin)
+    return " " * begin + "█" * length + " " * (width - begin - length)
+
+def _details(span):
+    parts = []
+    for key, value in (span.get("attrs") or {}).items():
+        text = str(value)
+        parts.append(f"{key}={text[:30] + '…' if len(text) > 30 else text}")
+    for name, at in (span.get("marks") or {}).items():
+        parts.append(f"{name}@{at:.0f}ms")
+    if span.get("error"):
+        parts.append(f"ERROR {span['error']}")
+    return " ".join(parts)
+
+def render(spans, width: int = BAR_WIDTH):
+    """Waterfall of one trace as a list of lines"""
+    root = _root(spans)
+    start, _ = _extent(spans)
+    total = _duration_ms(spans)
+
+    ids = {s["span"] for s in spans}
+    children = {}
+    for s in spans:
+        parent = s.get("parent") if s.get("parent") in ids else None
+        if s is not root:
+            children.setdefault(parent if parent else root["span"], []).append(s)
+
+    when = datetime.fromtimestamp(root["start"]).strftime("%Y-%m-%d %H:%M:%S")
+    lines = [f"Trace {root['trace']}  {root['name']}  {when}  {total:.0f} ms"]
+
+    def walk(span, depth):
+        label = ("  " * depth + span["name"])[:NAME_WIDTH]
+        offset = (span["start"] - start) * 1000
+        app = span.get("app", "")
+        lines.append(f"  {label:<{NAME_WIDTH}} |{_bar(offset, span['ms'], total, width)}| "
+                     f"{span['ms']:>7.0f} ms  {app:<9} {_details(span)}".rstrip())
+        for child in sorted(children.get(span["span"], []), key=lambda s: s["start"]):
+            walk(child, depth + 1)
+
+    walk(root, 0)
+    return lines
+
+def select(traces, trace_id: str = None, name: str = None, slowest: int = None, last: int = 5):
+    """Pick which traces to show, returned oldest first (or slowest first)"""
+    items = list(traces.values())
+    if trace_id:
+        items = [spans for spans in items if spans[0]["trace"].startswith(trace_id)]
+    if name:
+        items = [spans for spans in items if _root(spans)["name"] == name]
+    if slowest:
+        return sorted(items, key=_duration_ms, reverse=True)[:slowest]
+    items.sort(key=lambda spans: _root(spans)["start"])
+    return items if trace_id else items[-last:]
+
+def main():
+    parser = argparse.ArgumentParser(description="Show Lucy's turn traces as a waterfall")
+    parser.add_argument("path", nargs="?", default=str(DEFAULT_PATH),
+                        help="Trace file or directory (default: data/traces)")
+    parser.add_argument("--trace", help="Show the trace with this ID (or ID prefix)")
+    parser.add_argument("--name", help="Only traces whose root span has this name, e.g. web.turn")
+    parser.add_argument("--slowest", type=int, help="Show the N slowest traces")
+    parser.add_argument("--last", type=int, default=5, help="Show the N most recent traces (default 5)")
+    parser.add_argument("--width", type=int, default=BAR_WIDTH, help="Width of the bars")
+    args = parser.parse_args()
+
+    path = Path(args.path)
+    if not path.exists():
+        print(f"No traces at {path}")
+        sys.exit(1)
+
+    traces = load_traces(path)
+    chosen = select(traces, args.trace, args.name, args.slowest, args.last)
+    if not chosen:
+        print(f"No matching traces ({len(traces)} in {path})")
+        sys.exit(1)
+
+    for spans in chosen:
+        print("\n".join(render(spans, args.width)))
+        print()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+"""
+Lucy Tracing
+One trace per turn, with nested spans (listen, STT, LLM, tools, TTS, face) in a JSONL file
+
+Off unless LUCY_TRACE=1 or "tracing": {"enabled": true} in the config.
+View them with: python brain/trace_view.py
+"""
+
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+
+MAX_BYTES = 5 * 1024 * 1024     # The trace file is rotated to <name>.1 past this size
+
+# The span code is running in; follows threads started with copy_context() and asyncio tasks
+_current = ContextVar("lucy_span", default=None)
+
+def _env_enabled():
+    """LUCY_TRACE=1/0 switches tracing on or off for any app; None if it isn't set"""
+    value = os.environ.get("LUCY_TRACE", "").strip().lower()
+    if not value:
+        return None
+    return value not in ("0", "off", "false", "no")
+
+def _new_id(length: int) -> str:
+    return uuid.uuid4().hex[:length]
+
+class Span:
+    """
+    One timed step of a turn
+
+    Use as a context manager, or call end() yourself for spans that outlive
+    the code that started them (a token stream, say).
+    """
+
+    def __init__(self, trace, name: str, parent_id: str = None, attrs: dict = None):
+        self.trace = trace
+        self.id = _new_id(8)
+        self.parent_id = parent_id
+        self.name = name
+        self.attrs = dict(attrs or {})
+        self.marks = {}
+        self.error = None
+        self.start = time.time()
+        self.duration = None
+        self._t0 = time.perf_counter()
+
+    @property
+    def trace_id(self):
+        return self.trace.id
+
+    def set(self, **attrs):
+        """Add attributes (model, tool name, token count, ...)"""
+        self.attrs.update(attrs)
+
+    def mark(self, name: str):
+        """Note when something happened inside the span (e.g. "first_token")"""
+        self.marks.setdefault(name, round((time.perf_counter() - self._t0) * 1000, 1))
+
+    def end(self, error=None):
+        """Finish the span (only the first call counts)"""
+        if self.duration is not None:
+            return
+        self.duration = time.perf_counter() - self._t0
+        if error is not None:
+            self.error = error
+        self.trace.finished(self)
+
+    def record(self):
+        entry = {
+            "trace": self.trace.id,
+            "span": self.id,
+            "parent": self.parent_id,
+            "name": self.name,
+            "app": self.trace.tracer.app,
+            "start": round(self.start, 6),
+            "ms": round(self.duration * 1000, 2),
+        }
+        if self.attrs:
+            entry["attrs"] = self.attrs
+        if self.marks:
+            entry["marks"] = self.marks
+        if self.error:
+            entry["error"] = self.error
+        return entry
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is GeneratorExit:
+            self.set(closed=True)  # A stream that was stopped early isn't an error
+            self.end()
+        else:
+            self.end(f"{exc_type.__name__}: {exc}" if exc_type else None)
+        return False
+
+class _NullSpan:
+    """Stands in for a span when tracing is off, so callers never need to check"""
+    id = None
+    trace_id = None
+
+    def set(self, **attrs):
+        pass
+
+    def mark(self, name: str):
+        pass
+
+    def end(self, error=None):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+NULL_SPAN = _NullSpan()
+
+class Trace:
+    """
+    The spans of one turn
+
+    Spans are buffered until the root span ends and then written in one go,
+    so a turn that turns out to be nothing (the microphone heard only noise)
+    can be discarded. Spans that end later (a background task the turn
+    started) are appended on their own.
+    """
+
+    def __init__(self, tracer, trace_id: str = None):
+        self.tracer = tracer
+        self.id = trace_id or _new_id(16)
+        self.root = None
+        self.discarded = False
+        self._spans = []
+        self._flushed = False
+        self._lock = threading.Lock()
+
+    def finished(self, span: Span):
+        with self._lock:
+            if self._flushed:
+                batch = [span]
+            else:
+                self._spans.append(span)
+                if span is not self.root:
+                    return
+                batch, self._spans, self._flushed = self._spans, [], True
+        if not self.discarded:
+            self.tracer.write([s.record() for s in batch])
+
+    def discard(self):
+        """Don't write this trace"""
+        self.discarded = True
+
+class Tracer:
+    """Writes finished traces to a JSONL file (appends, so several processes can share one)"""
+
+    def __init__(self, path=None, enabled: bool = False, max_bytes: int = MAX_BYTES, app: str = "lucy"):
+        self.path = Path(path) if path else None
+        self.enabled = enabled
+        self.max_bytes = max_bytes
+        self.app = app
+        self.writes = 0
+        self._lock = threading.Lock()
+
+    @property
+    def active(self) -> bool:
+        return self.enabled and self.path is not None
+
+    def write(self, records):
+        lines = "".join(json.dumps(r, ensure_ascii=False, default=str) + "\n" for r in records)
+        with self._lock:
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                if self.path.exists() and self.path.stat().st_size > self.max_bytes:
+                    os.replace(self.path, self.path.with_name(self.path.name + ".1"))
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(lines)
+                self.writes += 1
+            except OSError as e:
+                print(f"[Trace] Could not write {self.path}: {e}")
+
+    def describe(self):
+        if not self.active:
+            return "tracing off"
+        return f"{self.writes} writes to {self.path}"
+
+_tracer = Tracer(enabled=bool(_env_enabled()))
+
+def configure(path=None, enabled: bool = None, max_bytes: int = None, app: str = None):
+    """Set where traces go and what this process is called (unset arguments are kept)"""
+    if path is not None:
+        _tracer.path = Path(path)
+    if enabled is not None:
+        _tracer.enabled = enabled
+    if max_bytes is not None:
+        _tracer.max_bytes = max_bytes
+    if app is not None:
+        _tracer.app = app
+
+def from_config(cfg: dict, default_path):
+    """
+    Trace file from "tracing" in the config (off by default; LUCY_TRACE overrides "enabled")
+
+    e.g. {"tracing": {"enabled": true, "path": "data/traces/lucy_traces.jsonl", "max_bytes": 5000000}}
+    """
+    tracing_cfg = cfg.get("tracing", {})
+    enabled = _env_enabled()
+    configure(path=tracing_cfg.get("path", default_path),
+              enabled=tracing_cfg.get("enabled", False) if enabled is None else enabled,
+              max_bytes=tracing_cfg.get("max_bytes", MAX_BYTES))
+
+def get_tracer():
+    return _tracer
+
+def current_span():
+    """The span code is running in (a no-op span if there is none)"""
+    return _current.get() or NULL_SPAN
+
+def start_span(name: str, parent=None, **attrs):
+    """
+    Start a span without making it current; the caller must end() it
+
+    It is a child of parent (default: the current span), or the root of a
+    new trace if there is neither.
+    """
+    if not _tracer.active:
+        return NULL_SPAN
+    parent = parent or _current.get()
+    if parent is None or parent is NULL_SPAN:
+        trace = Trace(_tracer)
+        span = trace.root = Span(trace, name, None, attrs)
+        return span
+    return Span(parent.trace, name, parent.id, attrs)
+
+@contextmanager
+def span(name: str, **attrs):
+    """
+    with span("tts"): ... - time a block as a child of the current span
+
+    Code inside the block (and threads or tasks it starts) sees it as the
+    current span. Outside any span this starts a new trace.
+    """
+    s = start_span(name, **attrs)
+    if s is NULL_SPAN:
+        yield s
+        return
+    token = _current.set(s)
+    try:
+        yield s
+    except GeneratorExit:
+        s.set(closed=True)
+        raise
+    except BaseException as e:
+        s.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        s.end()
+        try:
+            _current.reset(token)
+        except ValueError:
+            _current.set(None)  # Generator finalized in another context
+
+def traced(name: str, coro, **attrs):
+    """Run a coroutine inside a new span (e.g. one websocket turn as a task)"""
+    async def run():
+        with span(name, **attrs):
+            return await coro
+    return run()
+
+def annotate(**attrs):
+    """Add attributes to the current span"""
+    current_span().set(**attrs)
+
+def discard():
+    """Drop the current trace (nothing worth keeping happened)"""
+    s = _current.get()
+    if s is not None:
+        s.trace.discard()
+
+def propagate() -> dict:
+    """{"trace": ..., "span": ...} of the current span, for a message to another process"""
+    s = _current.get()
+    if s is None:
+        return {}
+    return {"trace": s.trace_id, "span": s.id}
+
+def record(trace_id: str, parent_id: str, name: str, start: float, seconds: float, **attrs):
+    """
+    Write a span that was timed elsewhere, e.g. by the face process for a
+    turn the voice process traced
+    """
+    if not _tracer.active or not trace_id:
+        return
+    s = Span(Trace(_tracer, trace_id), name, parent_id, attrs)
+    s.start = start
+    s.duration = seconds
+    _tracer.write([s.record()])
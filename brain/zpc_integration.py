@@ -3,10 +3,11 @@ ZPC Gateway Integration for Lucy
 Allows Lucy to interact with the ZPC Gateway MCP server
 """
 
-import requests
 import json
 from typing import Optional, Dict, Any
 
+from llm_client import http_get
+
 class ZPCGateway:
     """Interface to ZPC Gateway MCP server"""
 
@@ -20,7 +21,7 @@ class ZPCGateway:
     def _check_health(self) -> Dict[str, Any]:
         """Check if ZPC Gateway is available"""
         try:
-            resp = requests.get(f"{self.base_url}/healthz", timeout=3)
+            resp = http_get(f"{self.base_url}/healthz", "health")
             return {"ok": True, "status": resp.json()}
         except Exception as e:
             return {"ok": False, "error": str(e)}
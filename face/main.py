@@ -8,6 +8,30 @@ import socket
 import json
 import threading
 import subprocess
+from contextlib import nullcontext
+
+# Optional: add redraws to the voice loop's turn traces (LUCY_TRACE=1, see brain/tracing.py)
+# and profile the frame loop (LUCY_PROFILE=cprofile|sample, or kill -USR1 for 30 s)
+FACE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(FACE_DIR, '..', 'brain'))
+try:
+    import tracing
+    tracing.configure(path=os.path.join(FACE_DIR, '..', 'data', 'traces', 'lucy_traces.jsonl'), app="face")
+except ImportError:
+    tracing = None
+try:
+    import profiling
+    profiling.from_config({}, os.path.join(FACE_DIR, '..', 'data', 'profiles'), app="face")
+    profiling.get_profiler().install_signal_handler()
+    frame_region = profiling.region
+except ImportError:
+    frame_region = lambda name: nullcontext()
+try:
+    import memory_tracker
+    memory_tracker.from_config({}, os.path.join(FACE_DIR, '..', 'data', 'memory'), app="face")
+    memory_tracker.get_tracker().install_signal_handler()  # kill -USR2 <pid> writes a memory report
+except ImportError:
+    pass
 
 # CONFIG - Felicity's Custom Theme
 W, H = 800, 480
@@ -69,6 +93,9 @@ class FelicityFace:
         self.mouth_talk_phase = 0
         self.listening_pulse = 0
 
+        # (trace, parent span, wall time, perf time) of the last traced state change
+        self.pending_trace = None
+
         # Start brain listener
         self.start_brain_listener()
 
@@ -93,6 +120,9 @@ class FelicityFace:
                             state = json.loads(data)
                             self.is_talking = state.get('talking', False)
                             self.is_listening = state.get('listening', False)
+                            if state.get('trace'):
+                                self.pending_trace = (state['trace'], state.get('span'),
+                                                      time.time(), time.perf_counter())
                         conn.close()
                     except socket.timeout:
                         continue
@@ -104,6 +134,15 @@ class FelicityFace:
         thread = threading.Thread(target=listen, daemon=True)
         thread.start()
 
+    def record_redraw(self):
+        """Add 'state change received -> on screen' to the turn's trace"""
+        pending, self.pending_trace = self.pending_trace, None
+        if pending is None or tracing is None:
+            return
+        trace_id, parent_id, received, started = pending
+        tracing.record(trace_id, parent_id, "face.redraw", received, time.perf_counter() - started,
+                       talking=self.is_talking, listening=self.is_listening)
+
     def start_voice_chat(self):
         """Start the voice chat system automatically"""
         print("Starting voice chat for Felicity...")
@@ -220,68 +259,72 @@ class FelicityFace:
     def run(self):
         running = True
         while running:
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    running = False
-                elif event.type == pygame.MOUSEBUTTONDOWN:
-                    self.handle_touch(event.pos)
-
-            # Update expression changes
-            if time.time() > self.next_expression_change and not self.is_talking:
-                self.expression = random.choice(['happy', 'very_happy', 'excited', 'joyful', 'very_happy'])
-                self.next_expression_change = time.time() + random.uniform(4, 8)
-
-            # Update blinking
-            if not self.blinking and random.random() < 0.015 and not self.is_talking:
-                self.blinking = True
-
-            if self.blinking:
-                self.blink_timer += 1
-                if self.blink_timer > 3:
-                    self.blinking = False
-                    self.blink_timer = 0
-
-            # Update eye movement
-            if time.time() > self.next_saccade and not self.is_talking:
-                self.target_eye_x = random.choice([-20, -10, 0, 10, 20])
-                self.target_eye_y = random.choice([-15, -5, 0, 5, 15])
-                self.next_saccade = time.time() + random.uniform(1.5, 4.0)
-
-            self.eye_offset_x += (self.target_eye_x - self.eye_offset_x) * 0.2
-            self.eye_offset_y += (self.target_eye_y - self.eye_offset_y) * 0.2
-
-            # Animate sparkle size
-            if self.sparkle_growing:
-                self.sparkle_size += 0.2
-                if self.sparkle_size > 10:
-                    self.sparkle_growing = False
-            else:
-                self.sparkle_size -= 0.2
-                if self.sparkle_size < 6:
-                    self.sparkle_growing = True
-
-            # Gentle bounce animation
-            self.bounce_time += 0.08 if not self.is_talking else 0.15
-            self.bounce_offset = math.sin(self.bounce_time) * 8
-
-            # Listening pulse
-            if self.is_listening:
-                self.listening_pulse += 0.1
-
-            # Draw
-            self.render_surf.fill(SKY_COLOR)
-            self.draw_clouds()
-
-            face_y_offset = int(self.bounce_offset)
-
-            self.draw_eye(W//2 - 140, H//2 - 40 + face_y_offset, 'left')
-            self.draw_eye(W//2 + 140, H//2 - 40 + face_y_offset, 'right')
-            self.draw_cheeks(H//2 + 60)
-            self.draw_smile(W//2, H//2 + 100 + face_y_offset)
-
-            final = pygame.transform.rotate(self.render_surf, 90)
-            self.screen.blit(final, (0, 0))
-            pygame.display.flip()
+            # Everything but the wait for the next frame
+            with frame_region("face.frame"):
+                for event in pygame.event.get():
+                    if event.type == pygame.QUIT:
+                        running = False
+                    elif event.type == pygame.MOUSEBUTTONDOWN:
+                        self.handle_touch(event.pos)
+
+                # Update expression changes
+                if time.time() > self.next_expression_change and not self.is_talking:
+                    self.expression = random.choice(['happy', 'very_happy', 'excited', 'joyful', 'very_happy'])
+                    self.next_expression_change = time.time() + random.uniform(4, 8)
+
+                # Update blinking
+                if not self.blinking and random.random() < 0.015 and not self.is_talking:
+                    self.blinking = True
+
+                if self.blinking:
+                    self.blink_timer += 1
+                    if self.blink_timer > 3:
+                        self.blinking = False
+                        self.blink_timer = 0
+
+                # Update eye movement
+                if time.time() > self.next_saccade and not self.is_talking:
+                    self.target_eye_x = random.choice([-20, -10, 0, 10, 20])
+                    self.target_eye_y = random.choice([-15, -5, 0, 5, 15])
+                    self.next_saccade = time.time() + random.uniform(1.5, 4.0)
+
+                self.eye_offset_x += (self.target_eye_x - self.eye_offset_x) * 0.2
+                self.eye_offset_y += (self.target_eye_y - self.eye_offset_y) * 0.2
+
+                # Animate sparkle size
+                if self.sparkle_growing:
+                    self.sparkle_size += 0.2
+                    if self.sparkle_size > 10:
+                        self.sparkle_growing = False
+                else:
+                    self.sparkle_size -= 0.2
+                    if self.sparkle_size < 6:
+                        self.sparkle_growing = True
+
+                # Gentle bounce animation
+                self.bounce_time += 0.08 if not self.is_talking else 0.15
+                self.bounce_offset = math.sin(self.bounce_time) * 8
+
+                # Listening pulse
+                if self.is_listening:
+                    self.listening_pulse += 0.1
+
+                # Draw
+                self.render_surf.fill(SKY_COLOR)
+                self.draw_clouds()
+
+                face_y_offset = int(self.bounce_offset)
+
+                self.draw_eye(W//2 - 140, H//2 - 40 + face_y_offset, 'left')
+                self.draw_eye(W//2 + 140, H//2 - 40 + face_y_offset, 'right')
+                self.draw_cheeks(H//2 + 60)
+                self.draw_smile(W//2, H//2 + 100 + face_y_offset)
+
+                final = pygame.transform.rotate(self.render_surf, 90)
+                self.screen.blit(final, (0, 0))
+                pygame.display.flip()
+            if self.pending_trace is not None:
+                self.record_redraw()
             self.clock.tick(30)
 
         # Cleanup
@@ -4,14 +4,21 @@ Automated conversation tester for Lucy
 Simulates kid conversations to test memory and curiosity
 """
 
+import os
+import random
 import sys
+import shutil
+import tempfile
 import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
 from pathlib import Path
 
 # Add brain to path
 sys.path.insert(0, str(Path(__file__).parent / "brain"))
 
-from lucy_enhanced import LucyBrain
+from clock import VirtualClock
+
+# lucy_enhanced is imported when a test starts, after --mock has set LUCY_API_BASE
 
 # Sample kid conversations to test Lucy
 SAMPLE_CONVERSATIONS = [
@@ -83,7 +90,7 @@ SAMPLE_CONVERSATIONS = [
 ]
 
 def run_automated_conversation(conversation, lucy, delay=1.5):
-    """Run a simulated conversation with delays"""
+    """Run a simulated conversation with delays (instant ones if lucy has a virtual clock)"""
     print("\n" + "="*60)
     print(f"Test: {conversation['name']}")
     print("="*60 + "\n")
@@ -92,7 +99,7 @@ def run_automated_conversation(conversation, lucy, delay=1.5):
         # Handle pause commands
         if user_msg == "[pause]":
             print(f"[Simulating 5 second pause...]")
-            time.sleep(5)
+            lucy.clock.sleep(5)
 
             # Check if Lucy wants to speak during idle
             if lucy.should_speak_up():
@@ -106,9 +113,7 @@ def run_automated_conversation(conversation, lucy, delay=1.5):
         print(f"Child ({i}): {user_msg}")
 
         if user_msg.lower() in ["bye", "bye!", "goodbye", "goodbye!"]:
-            farewell = lucy.call_llm(lucy.messages + [
-                {"role": "user", "content": "Say goodbye briefly!"}
-            ])
+            farewell = lucy.get_farewell()
             print(f"Lucy: {farewell}\n")
             break
 
@@ -117,10 +122,20 @@ def run_automated_conversation(conversation, lucy, delay=1.5):
         print(f"Lucy: {reply}\n")
 
         # Natural delay between messages
-        time.sleep(delay)
+        lucy.clock.sleep(delay)
+
+def run_all_tests(fast=False):
+    """
+    Run all automated conversation tests
 
-def run_all_tests():
-    """Run all automated conversation tests"""
+    fast: skip the pauses with a virtual clock; with --mock this makes the
+    suite a quick, repeatable latency benchmark
+    """
+    from lucy_enhanced import LucyBrain
+    import metrics
+
+    started = time.perf_counter()
+    clock = VirtualClock() if fast else None
     print("\n" + "="*70)
     print("LUCY CONVERSATION TEST SUITE")
     print("="*70)
@@ -129,13 +144,11 @@ def run_all_tests():
     print("="*70)
 
     # Create fresh Lucy instance
-    lucy = LucyBrain()
+    lucy = LucyBrain(clock=clock)
 
     # Initial greeting
     print("\n[Initializing Lucy...]")
-    greeting = lucy.call_llm(lucy.messages + [
-        {"role": "user", "content": "Say hello and introduce yourself in one sentence!"}
-    ])
+    greeting = lucy.get_greeting()
     print(f"Lucy: {greeting}\n")
 
     # Run each conversation
@@ -149,31 +162,149 @@ def run_all_tests():
         # Brief pause between conversations
         if i < len(SAMPLE_CONVERSATIONS):
             print("\n[Waiting 3 seconds before next conversation...]\n")
-            time.sleep(3)
+            lucy.clock.sleep(3)
 
     # Final summary
     print("\n" + "="*70)
     print("TEST SUITE COMPLETE")
     print("="*70)
+    # Every conversation is saved already; read the counts before the session closes its memory
+    saved_logs = lucy.memory.saved_conversations()
+    learned = lucy.memory.recall_facts()
     lucy.end_conversation()
 
     print("\n[Results]")
-    print(f"  Total messages: {len(lucy.memory.conversation_history)}")
+    print(f"  Total messages: {lucy.memory.message_count}")
     print(f"  Facts learned: {lucy.memory.get_memory_summary()}")
-    print(f"  Conversation logs saved: {len(list(lucy.memory.logs_dir.glob('*.json')))}")
+    print(f"  Conversation logs saved: {saved_logs}")
 
     # Show what Lucy learned
     print("\n[Lucy's Memory Bank]")
-    for category, facts in lucy.memory.recall_facts().items():
+    for category, facts in learned.items():
         if facts:
             print(f"  {category.upper()}:")
             for key, data in facts.items():
                 print(f"    - {key}: {data.get('value', 'N/A')[:50]}")
 
+    print("\n[Latency]")
+    skipped = f" ({clock.slept:.0f}s of pauses skipped)" if clock else ""
+    print(f"  Wall time: {time.perf_counter() - started:.1f}s{skipped}")
+    print(metrics.get_metrics().describe())
+
     print("\n" + "="*70)
 
+def run_conversation_timed(conversation, memory_dir, fast=False, cache=False, delay=1.0):
+    """
+    One conversation on its own LucyBrain and memory directory, without printing it
+
+    Returns {"name", "turns": [(seconds to first token, seconds), ...], "summary",
+    "errors"}. Nothing runs in the background during the turns: there is no
+    prefetching, and evicted turns are only compacted after the last one
+    ("summary" is how long that took, or None if nothing was evicted).
+    Runs in a worker thread or process of run_parallel.
+    """
+    import lucy_enhanced
+    if not cache:
+        # Every copy of a script would be answered from the first one's cache
+        lucy_enhanced.RESPONSE_CACHE = lucy_enhanced.SEMANTIC_CACHE = None
+
+    lucy = lucy_enhanced.LucyBrain(prefetch=(), clock=VirtualClock() if fast else None,
+                                   memory_path=memory_dir, summarize_mode="off")
+    turns, errors = [], 0
+    for user_msg in conversation["exchanges"]:
+        if user_msg == "[pause]":
+            lucy.clock.sleep(5)
+            if lucy.should_speak_up():
+                lucy.get_idle_thought()
+            continue
+        if user_msg.lower() in ["bye", "bye!", "goodbye", "goodbye!"]:
+            lucy.get_farewell()
+            break
+
+        start, first_token, parts = time.perf_counter(), None, []
+        try:
+            for token in lucy.process_message_stream(user_msg):
+                if first_token is None:
+                    first_token = time.perf_counter() - start
+                parts.append(token)
+        except Exception as e:
+            print(f"[Parallel] {conversation['name']}: {e}")
+            errors += 1
+            continue
+        if "".join(parts).strip() == lucy_enhanced.FALLBACK_REPLY:
+            errors += 1  # The LLM call failed and Lucy apologised
+        turns.append((first_token, time.perf_counter() - start))
+        lucy.clock.sleep(delay)
+
+    summary = None
+    if lucy.summarizer.has_pending():
+        start = time.perf_counter()
+        lucy.summarizer.run_pending()
+        summary = time.perf_counter() - start
+
+    lucy.end_conversation()
+    return {"name": conversation["name"], "turns": turns, "summary": summary, "errors": errors}
+
+def run_parallel(workers=4, pool="thread", repeat=1, fast=False, cache=False, keep=False):
+    """
+    Run every sample conversation (repeat times over) with `workers` at once
+
+    Each conversation gets its own LucyBrain and memory directory, as if
+    several kids were talking to Lucy on different devices. Threads share
+    one process (like the web server); processes are separate devices.
+    Reports turn latency percentiles, throughput and errors; evicted turns are
+    compacted after each conversation and reported separately as "summary".
+    """
+    import metrics
+
+    jobs = [c for _ in range(repeat) for c in SAMPLE_CONVERSATIONS]
+    executor_class = ProcessPoolExecutor if pool == "process" else ThreadPoolExecutor
+    stats = metrics.StageMetrics("parallel", window=100000)
+    errors, failed, turns = 0, 0, 0
+
+    print("\n" + "="*70)
+    print(f"LUCY PARALLEL TEST: {len(jobs)} conversations, {workers} at a time ({pool} pool)")
+    print("="*70)
+
+    root = tempfile.mkdtemp(prefix="lucy-parallel-")
+    started = time.perf_counter()
+    with executor_class(max_workers=workers) as executor:
+        futures = [executor.submit(run_conversation_timed, conversation,
+                                   str(Path(root) / f"conversation-{i:03d}"), fast, cache)
+                   for i, conversation in enumerate(jobs)]
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"[Parallel] Conversation failed: {e}")
+                failed += 1
+                continue
+            for first_token, seconds in result["turns"]:
+                stats.observe("turn", seconds)
+                if first_token is not None:
+                    stats.observe("first_token", first_token)
+            if result["summary"] is not None:
+                stats.observe("summary", result["summary"])  # After the turns, not during them
+            turns += len(result["turns"])
+            errors += result["errors"]
+    elapsed = time.perf_counter() - started
+
+    print("\n" + "="*70)
+    print("PARALLEL TEST COMPLETE")
+    print("="*70)
+    print(f"  Conversations: {len(jobs) - failed} finished, {failed} failed")
+    print(f"  Turns: {turns} in {elapsed:.1f}s = {turns / elapsed if elapsed else 0:.2f} turns/sec")
+    print(f"  Errors: {errors}")
+    print(stats.describe())
+    if keep:
+        print(f"  Memory directories kept in {root}")
+    else:
+        shutil.rmtree(root, ignore_errors=True)
+    print("="*70)
+
 def interactive_mode():
     """Run interactive conversation with Lucy"""
+    from lucy_enhanced import LucyBrain
     lucy = LucyBrain()
 
     print("\n" + "="*60)
@@ -187,9 +318,7 @@ def interactive_mode():
     print("="*60 + "\n")
 
     # Greeting
-    greeting = lucy.call_llm(lucy.messages + [
-        {"role": "user", "content": "Greet the user warmly!"}
-    ])
+    greeting = lucy.get_greeting()
     print(f"Lucy: {greeting}\n")
 
     while True:
@@ -201,15 +330,13 @@ def interactive_mode():
 
             # Commands
             if user_input.lower() in ["exit", "quit", "bye"]:
-                farewell = lucy.call_llm(lucy.messages + [
-                    {"role": "user", "content": "Say goodbye warmly!"}
-                ])
+                farewell = lucy.get_farewell()
                 print(f"Lucy: {farewell}\n")
                 break
 
             elif user_input.lower() == "memory":
                 print(f"\n[Memory Status]")
-                print(f"  Messages: {len(lucy.memory.conversation_history)}")
+                print(f"  Messages: {lucy.memory.message_count}")
                 print(f"  Facts: {lucy.memory.get_memory_summary()}")
                 print()
                 continue
@@ -245,11 +372,38 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Test Lucy's conversation abilities")
     parser.add_argument("--auto", action="store_true", help="Run automated test suite")
     parser.add_argument("--interactive", action="store_true", help="Interactive conversation")
+    parser.add_argument("--fast", action="store_true",
+                        help="Skip pauses and delays with a virtual clock (for --auto)")
+    parser.add_argument("--mock", choices=("synthetic", "record", "replay"),
+                        help="Talk to brain/mock_llm.py instead of Ollama (record: save real replies for replay)")
+    parser.add_argument("--ttft", type=float, default=0.2, help="Mock seconds to the first token")
+    parser.add_argument("--tps", type=float, default=30.0, help="Mock tokens per second (0 = all at once)")
+    parser.add_argument("--cassette", help="Mock recordings file (default: data/cassettes/lucy.json)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for Lucy's idle choices (with --fast)")
+    parser.add_argument("--parallel", type=int, metavar="N",
+                        help="Run the conversations N at a time, each with its own memory")
+    parser.add_argument("--pool", choices=("thread", "process"), default="thread",
+                        help="Run parallel conversations in threads (one server) or processes (many devices)")
+    parser.add_argument("--repeat", type=int, default=1, help="Run each conversation this many times (with --parallel)")
+    parser.add_argument("--cache", action="store_true", help="Keep the response caches on (with --parallel)")
+    parser.add_argument("--keep", action="store_true", help="Keep the memory directories (with --parallel)")
 
     args = parser.parse_args()
 
-    if args.auto:
-        run_all_tests()
+    if args.mock:
+        import mock_llm
+        mock = mock_llm.MockLLM(args.mock, cassette=args.cassette, ttft=args.ttft, tps=args.tps,
+                                upstream="http://localhost:11434" if args.mock == "record" else None)
+        server, api_base = mock_llm.start(mock)
+        os.environ["LUCY_API_BASE"] = api_base
+        print(f"[Mock] {args.mock} LLM on {api_base}")
+    if args.fast:
+        random.seed(args.seed)
+
+    if args.parallel:
+        run_parallel(args.parallel, args.pool, args.repeat, fast=args.fast, cache=args.cache, keep=args.keep)
+    elif args.auto:
+        run_all_tests(fast=args.fast)
     elif args.interactive:
         interactive_mode()
     else:
@@ -267,3 +421,6 @@ if __name__ == "__main__":
             interactive_mode()
         else:
             print("Invalid choice")
+
+    if args.mock:
+        print(f"[Mock] {mock.describe()}")
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Fact journal recovery: what survives a crash mid-write or mid-compaction
+
+    python -m pytest -q test_fact_journal.py
+"""
+
+import json
+import sys
+from pathlib import Path
+
+# Add brain to path
+sys.path.insert(0, str(Path(__file__).parent / "brain"))
+from fact_journal import FactJournal
+
+DOG = {"value": "Biscuit", "mentions": 1}
+CAT = {"value": "Mittens", "mentions": 1}
+
+def journal_in(tmp_path, **kwargs):
+    return FactJournal(tmp_path / "learned_facts.json", background=False, **kwargs)
+
+def line(category, key, fact):
+    return json.dumps({"category": category, "key": key, "fact": fact}) + "\n"
+
+def test_facts_survive_a_reload(tmp_path):
+    journal = journal_in(tmp_path)
+    journal.append("pets", "dog", DOG)
+    journal.append("pets", "cat", CAT)
+    assert journal_in(tmp_path).load() == {"pets": {"dog": DOG, "cat": CAT}}
+
+def test_torn_last_line_is_skipped_and_not_glued_to_the_next(tmp_path):
+    journal = journal_in(tmp_path)
+    journal.append("pets", "dog", DOG)
+    # The process died halfway through writing the next line
+    with open(journal.journal_path, "a", encoding="utf-8") as f:
+        f.write(line("pets", "cat", CAT)[:25])
+
+    reopened = journal_in(tmp_path)
+    assert reopened.load() == {"pets": {"dog": DOG}}
+    assert reopened.skipped == 1
+
+    reopened.append("pets", "cat", CAT)
+    again = journal_in(tmp_path)
+    assert again.load() == {"pets": {"dog": DOG, "cat": CAT}}
+    assert again.skipped == 1   # Only the torn fragment, not the new line
+
+def test_interrupted_compaction_is_replayed(tmp_path):
+    snapshot = tmp_path / "learned_facts.json"
+    snapshot.write_text(json.dumps({"pets": {"dog": {"value": "Rex", "mentions": 1}}}))
+    # Compaction moved the journal aside and died before writing the new snapshot...
+    (tmp_path / "learned_facts.journal.compacting").write_text(line("pets", "dog", DOG))
+    # ...and the next session appended more before this one
+    (tmp_path / "learned_facts.journal").write_text(line("pets", "cat", CAT))
+
+    journal = journal_in(tmp_path)
+    facts = journal.load()  # Also finishes the compaction (background=False)
+    assert facts == {"pets": {"dog": DOG, "cat": CAT}}
+    assert not journal.compacting_path.exists()
+    assert not journal.journal_path.exists()
+    assert json.loads(snapshot.read_text()) == facts
+
+def test_newer_lines_win_over_the_interrupted_compaction(tmp_path):
+    (tmp_path / "learned_facts.journal.compacting").write_text(line("pets", "dog", {"value": "Rex"}))
+    (tmp_path / "learned_facts.journal").write_text(line("pets", "dog", DOG))
+
+    journal = journal_in(tmp_path)
+    assert journal.load() == {"pets": {"dog": DOG}}
+    assert journal_in(tmp_path).load() == {"pets": {"dog": DOG}}
+
+def test_compacts_after_enough_lines(tmp_path):
+    journal = journal_in(tmp_path, compact_every=3)
+    for i in range(3):
+        journal.append("numbers", str(i), {"value": i})
+    assert journal.compactions == 1
+    assert not journal.journal_path.exists()
+    assert journal_in(tmp_path).load() == {"numbers": {"0": {"value": 0}, "1": {"value": 1}, "2": {"value": 2}}}
+
+def test_unreadable_snapshot_is_moved_aside(tmp_path):
+    snapshot = tmp_path / "learned_facts.json"
+    snapshot.write_text("{not json")
+    journal = journal_in(tmp_path)
+    journal.append("pets", "dog", DOG)
+
+    assert journal_in(tmp_path).load() == {"pets": {"dog": DOG}}
+    assert list(tmp_path.glob("learned_facts.json.corrupt-*"))
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+LLM router behavior: failover, taking broken backends out, and hedging
+
+    python -m pytest -q test_llm_router.py
+
+Backends are mock_llm servers on free ports (plus one port nothing listens on).
+"""
+
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+# Add brain to path
+sys.path.insert(0, str(Path(__file__).parent / "brain"))
+import llm_router
+import mock_llm
+from llm_router import Backend, LLMRouter
+
+DEAD = "http://127.0.0.1:9/v1"    # Connection refused
+PAYLOAD = {"model": "mock", "messages": [{"role": "user", "content": "Why is the sky blue?"}]}
+
+@pytest.fixture
+def servers():
+    started = []
+
+    def start(ttft=0.0):
+        mock = mock_llm.MockLLM(ttft=ttft, tps=0)
+        server, api_base = mock_llm.start(mock)
+        started.append(server)
+        return mock, api_base
+
+    yield start
+    for server in started:
+        server.shutdown()
+
+def wait_until(condition, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+def test_fails_over_to_the_next_backend(servers):
+    mock, api_base = servers()
+    dead, alive = Backend("dead", DEAD), Backend("alive", api_base)
+    router = LLMRouter([dead, alive])
+
+    assert router.chat(PAYLOAD)
+    assert "".join(router.stream(PAYLOAD))
+    assert router.failovers >= 1
+    assert dead.failures >= 1 and alive.failures == 0
+    # The failure inflates the dead backend's score, so it is tried last now
+    assert router.ranked()[0] is alive
+
+def test_async_fails_over_to_the_next_backend(servers):
+    mock, api_base = servers()
+    router = LLMRouter([Backend("dead", DEAD), Backend("alive", api_base)])
+
+    async def main():
+        reply = await router.achat(PAYLOAD)
+        streamed = "".join([token async for token in router.astream(PAYLOAD)])
+        return reply, streamed
+
+    reply, streamed = asyncio.run(main())
+    assert reply and streamed
+
+def test_repeated_failures_take_a_backend_out_for_a_cooldown(servers):
+    mock, api_base = servers()
+    dead, alive = Backend("dead", DEAD), Backend("alive", api_base)
+    router = LLMRouter([dead, alive])
+
+    for _ in range(llm_router.FAILURES_TO_OPEN):
+        dead.record_failure(RuntimeError("down"))
+    assert not dead.available(time.monotonic())
+    assert router.ranked() == [alive]
+    assert dead.cooldown == llm_router.COOLDOWN * 2  # The next outage lasts longer
+
+    # Back in rotation once the cooldown is over; a success resets the backoff
+    dead.open_until = time.monotonic() - 1
+    assert dead in router.ranked()
+    dead.record_success(0.1)
+    assert dead.cooldown == llm_router.COOLDOWN
+
+def test_all_backends_out_tries_the_first_to_come_back():
+    first, second = Backend("first", DEAD), Backend("second", DEAD)
+    router = LLMRouter([first, second])
+    first.open_until = time.monotonic() + 60
+    second.open_until = time.monotonic() + 10
+    assert router.ranked() == [second]
+
+def test_hedge_wins_and_cancels_the_slow_backend(servers):
+    slow_mock, slow = servers(ttft=1.0)
+    fast_mock, fast = servers()
+    primary, runner_up = Backend("slow", slow), Backend("fast", fast)
+    router = LLMRouter([primary, runner_up], hedge=True, hedge_delay=0.1)
+
+    started = time.monotonic()
+    reply = "".join(router.stream(PAYLOAD))
+    assert reply
+    assert time.monotonic() - started < 0.8
+    assert router.hedges == 1 and router.hedge_wins == 1
+    wait_until(lambda: slow_mock.stats["cancelled"] == 1)  # The slow request was hung up on
+    assert primary.latency >= 0.1   # It lost the race, so it ranks lower next time
+    assert router.ranked()[0] is runner_up
+
+def test_no_hedge_when_the_primary_answers_in_time(servers):
+    mock, fast = servers()
+    other_mock, other = servers()
+    router = LLMRouter([Backend("fast", fast), Backend("other", other)], hedge=True, hedge_delay=0.5)
+
+    assert "".join(router.stream(PAYLOAD))
+    assert router.hedges == 0
+    assert other_mock.stats["requests"] == 0
+
+def test_async_hedge_wins(servers):
+    slow_mock, slow = servers(ttft=1.0)
+    fast_mock, fast = servers()
+    router = LLMRouter([Backend("slow", slow), Backend("fast", fast)], hedge=True, hedge_delay=0.1)
+
+    async def main():
+        return "".join([token async for token in router.astream(PAYLOAD)])
+
+    started = time.monotonic()
+    assert asyncio.run(main())
+    assert time.monotonic() - started < 0.8
+    assert router.hedge_wins == 1
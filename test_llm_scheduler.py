@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+LLM scheduler behavior: who gets the next slot, and giving places up
+
+    python -m pytest -q test_llm_scheduler.py
+"""
+
+import asyncio
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+# Add brain to path
+sys.path.insert(0, str(Path(__file__).parent / "brain"))
+from cancellation import CancelToken, GenerationCancelled
+from llm_scheduler import (LLMScheduler, SlotTimer, _Waiter,
+                           PRIORITY_VOICE, PRIORITY_CHAT, PRIORITY_BACKGROUND)
+
+def wait_until(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+def queue_in_order(scheduler, requests):
+    """Start a thread per (priority, session, name) once the previous one is queued; returns grant order"""
+    order, threads = [], []
+    for priority, session, name in requests:
+        queued = scheduler.stats()["queued"]
+
+        def run(priority=priority, session=session, name=name):
+            with scheduler.slot(priority, session):
+                order.append(name)
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        threads.append(thread)
+        wait_until(lambda: scheduler.stats()["queued"] == queued + 1)
+    return order, threads
+
+def test_higher_priority_goes_first():
+    scheduler = LLMScheduler(max_in_flight=1)
+    with scheduler.slot(PRIORITY_CHAT, "busy"):
+        order, threads = queue_in_order(scheduler, [
+            (PRIORITY_BACKGROUND, "a", "background"),
+            (PRIORITY_CHAT, "b", "chat"),
+            (PRIORITY_VOICE, "c", "voice"),
+        ])
+    for thread in threads:
+        thread.join()
+    assert order == ["voice", "chat", "background"]
+
+def test_sessions_take_turns_within_a_priority():
+    scheduler = LLMScheduler(max_in_flight=1)
+    with scheduler.slot(PRIORITY_CHAT, "busy"):
+        order, threads = queue_in_order(scheduler, [
+            (PRIORITY_CHAT, "tab-1", "1a"),
+            (PRIORITY_CHAT, "tab-1", "1b"),
+            (PRIORITY_CHAT, "tab-1", "1c"),
+            (PRIORITY_CHAT, "tab-2", "2a"),
+        ])
+    for thread in threads:
+        thread.join()
+    assert order == ["1a", "2a", "1b", "1c"]
+
+def test_timer_counts_from_the_grant():
+    scheduler = LLMScheduler(max_in_flight=1)
+    timer = SlotTimer()
+    done = threading.Event()
+
+    def run():
+        with scheduler.slot(timer=timer):
+            done.set()
+
+    with scheduler.slot():
+        thread = threading.Thread(target=run)
+        thread.start()
+        wait_until(lambda: scheduler.stats()["queued"] == 1)
+        time.sleep(0.1)
+    thread.join()
+    assert done.is_set()
+    assert timer.granted_at - timer.started >= 0.1
+
+def test_abandoning_a_granted_place_frees_the_slot():
+    # The cancel token fired just as the slot was handed over
+    scheduler = LLMScheduler(max_in_flight=1)
+    with scheduler._lock:
+        scheduler._in_flight = 1
+        waiter = _Waiter(PRIORITY_CHAT, "tab")
+        scheduler._enqueue(waiter)
+    scheduler.release()
+    assert waiter.granted and scheduler.stats()["in_flight"] == 1
+
+    scheduler._abandon(waiter)
+    assert scheduler.stats()["in_flight"] == 0
+    assert scheduler.idle()
+
+def test_cancelled_while_queued_gives_up_the_place():
+    scheduler = LLMScheduler(max_in_flight=1)
+    cancel = CancelToken()
+    errors = []
+
+    def run():
+        try:
+            with scheduler.slot(cancel=cancel):
+                pass
+        except GenerationCancelled as e:
+            errors.append(e)
+
+    with scheduler.slot():
+        thread = threading.Thread(target=run)
+        thread.start()
+        wait_until(lambda: scheduler.stats()["queued"] == 1)
+        cancel.cancel("interrupted")
+        thread.join(timeout=2)
+        assert errors and scheduler.stats()["queued"] == 0
+    assert scheduler.idle()
+
+def test_cancelled_aslot_task_leaves_the_queue():
+    scheduler = LLMScheduler(max_in_flight=1)
+
+    async def main():
+        async def hold(name):
+            async with scheduler.aslot(PRIORITY_CHAT, name):
+                await asyncio.sleep(0)
+
+        with scheduler.slot():
+            task = asyncio.create_task(hold("waiting"))
+            await asyncio.sleep(0.01)
+            assert scheduler.stats()["queued"] == 1
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+            assert scheduler.stats()["queued"] == 0
+        assert scheduler.idle()
+
+        # The slot freed above went nowhere; the next request gets it at once
+        await asyncio.wait_for(hold("next"), 1)
+
+    asyncio.run(main())
+    assert scheduler.idle()
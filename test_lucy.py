@@ -7,6 +7,9 @@ import sys
 import subprocess
 from pathlib import Path
 
+# Add brain to path
+sys.path.insert(0, str(Path(__file__).parent / "brain"))
+
 def main():
     print("="*60)
     print("Lucy Robot - Quick Test Script")
@@ -16,8 +19,8 @@ def main():
     # Check if Ollama is running
     print("1. Checking Ollama...")
     try:
-        import requests
-        resp = requests.get("http://localhost:11434/api/tags", timeout=3)
+        from llm_client import http_get
+        resp = http_get("http://localhost:11434/api/tags", "tags", timeout=3)
         if resp.status_code == 200:
             models = resp.json().get("models", [])
             print(f"   ✅ Ollama is running ({len(models)} models available)")
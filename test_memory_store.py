@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+SQLite memory store: migrating the JSON memory, naming the child, searching turns
+
+    python -m pytest -q test_memory_store.py
+"""
+
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add brain to path
+sys.path.insert(0, str(Path(__file__).parent / "brain"))
+from memory_store import MemoryStore, DB_NAME
+
+@pytest.fixture
+def store(tmp_path):
+    store = MemoryStore(tmp_path / DB_NAME)
+    yield store
+    store.close()
+
+def write_json_memory(memory_path: Path):
+    """A memory folder as the JSON backend leaves it"""
+    (memory_path / "conversations").mkdir(parents=True)
+    (memory_path / "learned_facts.json").write_text(json.dumps({
+        "pets": {"dog": {"value": "Biscuit", "learned_at": "2026-09-01T10:00:00", "mentions": 3}},
+    }))
+    (memory_path / "conversations" / "conversation_20260901_100000.json").write_text(json.dumps({
+        "started_at": "2026-09-01T10:00:00",
+        "ended_at": "2026-09-01T10:05:00",
+        "messages": [
+            {"role": "user", "content": "Hi! My name is felicity", "timestamp": "2026-09-01T10:00:05"},
+            {"role": "assistant", "content": "Hi Felicity! Do you like dolphins?", "timestamp": "2026-09-01T10:00:07"},
+        ],
+    }))
+
+def test_migration_runs_once(tmp_path, store):
+    write_json_memory(tmp_path)
+    assert store.migrate_json(tmp_path) == {"facts": 1, "conversations": 1, "turns": 2}
+    # Running it again (every start with the sqlite backend does) imports nothing twice
+    assert store.migrate_json(tmp_path) == {"facts": 0, "conversations": 0, "turns": 0}
+
+    stats = store.stats()
+    assert (stats["facts"], stats["conversations"], stats["turns"]) == (1, 1, 2)
+    assert store.load_facts()["pets"]["dog"]["mentions"] == 3
+    assert {turn["child"] for turn in store.search_turns()} == {"Felicity"}
+
+def test_migration_picks_up_new_conversations(tmp_path, store):
+    write_json_memory(tmp_path)
+    store.migrate_json(tmp_path)
+    (tmp_path / "conversations" / "conversation_20260902_100000.json").write_text(json.dumps({
+        "started_at": "2026-09-02T10:00:00", "ended_at": "2026-09-02T10:01:00",
+        "messages": [{"role": "user", "content": "What do sharks eat?"}],
+    }))
+    assert store.migrate_json(tmp_path) == {"facts": 0, "conversations": 1, "turns": 1}
+    assert store.conversation_count() == 2
+
+def test_set_child_backfills_earlier_turns(store):
+    conversation = store.start_conversation()
+    store.add_turn(conversation, "user", "Hello Lucy")
+    store.add_turn(conversation, "assistant", "Hi! What's your name?")
+    store.add_turn(conversation, "user", "My name is Sam")
+
+    store.set_child(conversation, "Sam")
+    store.add_turn(conversation, "assistant", "Nice to meet you, Sam!", child="Sam")
+
+    assert len(store.search_turns(child="Sam")) == 4
+    assert store.search_turns(child="Sam", role="user", text="hello")[0]["content"] == "Hello Lucy"
+
+def test_set_child_leaves_other_conversations_alone(store):
+    first = store.start_conversation()
+    store.add_turn(first, "user", "My name is Sam")
+    second = store.start_conversation()
+    store.add_turn(second, "user", "Hello")
+
+    store.set_child(first, "Sam")
+    assert [turn["conversation_id"] for turn in store.search_turns(child="Sam")] == [first]
+
+def test_remember_counts_mentions(store):
+    assert store.remember("pets", "dog", "Biscuit") == 1
+    assert store.remember("pets", "dog", "Biscuit") == 2
+    assert store.remember("pets", "dog", "Biscuit", mentions=7) == 7
+
+def test_usable_after_close(store):
+    conversation = store.start_conversation()
+    store.end_conversation(conversation)
+    store.close()
+    # end_conversation closes the store; status pages still read counts afterwards
+    assert store.conversation_count() == 1
+
+def test_search_treats_wildcards_literally(store):
+    conversation = store.start_conversation()
+    store.add_turn(conversation, "user", "100% sure")
+    store.add_turn(conversation, "user", "1000 dolphins")
+    assert [turn["content"] for turn in store.search_turns("0%")] == ["100% sure"]
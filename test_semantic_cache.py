@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Semantic cache behavior: which reworded questions may share an answer
+
+    python -m pytest -q test_semantic_cache.py
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add brain to path
+sys.path.insert(0, str(Path(__file__).parent / "brain"))
+from semantic_cache import SemanticCache, is_cacheable_question
+
+ANSWER = "Dolphins eat fish and squid!"
+
+def answer_for(cached: str, asked: str):
+    cache = SemanticCache()
+    cache.add("test", cached, ANSWER)
+    reply, _ = cache.lookup("test", asked)
+    return reply
+
+@pytest.mark.parametrize("cached, asked", [
+    ("What do dolphins eat?", "What food do dolphins like?"),
+    ("What do dolphins eat?", "what do dolphins eat"),
+    ("What do dolphins eat?", "What do dolphins like to eat?"),
+    ("How fast can a cheetah run?", "How quick is a cheetah when it runs?"),
+    ("Why do dogs bark?", "Why does a dog bark?"),
+    ("Why is the sky blue?", "How come the sky is blue?"),
+    ("Why is the sky blue?", "What makes the sky blue?"),
+    ("Why is the sky blue?", "why's the sky blue?"),
+])
+def test_reworded_question_hits(cached, asked):
+    assert answer_for(cached, asked) == ANSWER
+
+@pytest.mark.parametrize("cached, asked", [
+    ("What do dolphins eat?", "What do dolphins not eat?"),
+    ("Why do fish drown?", "Why don't fish drown?"),
+    ("Do cats eat fish?", "Do fish eat cats?"),
+    ("Is the sun bigger than the moon?", "Is the moon bigger than the sun?"),
+    ("What do dolphins eat?", "What do baby dolphins eat?"),
+    ("What do baby dolphins eat?", "What do dolphins eat?"),
+    ("What do dolphins eat?", "What do sharks eat?"),
+    ("What do dolphins eat?", "What do dolphins eat for breakfast?"),
+    ("Why is the sky blue?", "Why is the sky blue at night?"),
+    ("Why is the sky blue?", "Why is the sky green?"),
+])
+def test_different_question_misses(cached, asked):
+    assert answer_for(cached, asked) is None
+
+def test_namespaces_are_separate():
+    cache = SemanticCache()
+    cache.add("llama", "What do dolphins eat?", ANSWER)
+    assert cache.lookup("qwen", "What do dolphins eat?") == (None, 0.0)
+
+def test_personal_questions_are_not_cached():
+    assert is_cacheable_question("Why is the sky blue?")
+    assert not is_cacheable_question("Do you remember my dog's name?")
+    assert not is_cacheable_question("Why?")
@@ -5,18 +5,36 @@ FastAPI server with animated face, voice input/output via browser
 """
 
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, PlainTextResponse
 from pathlib import Path
 import sys
 import json
+import asyncio
+from contextlib import asynccontextmanager
 from datetime import datetime
 
 # Add brain to path
 sys.path.insert(0, str(Path(__file__).parent.parent / "brain"))
 
-from lucy_enhanced import LucyBrain, CHAT_MODEL, API_BASE
-
-app = FastAPI(title="Lucy Voice Web Interface")
+from lucy_enhanced import LucyBrain, CHAT_MODEL, API_BASE, RESIDENCY, RESPONSE_CACHE, SEMANTIC_CACHE, ROUTER, CASCADE
+from llm_scheduler import get_scheduler, set_request_context, PRIORITY_VOICE
+from cancellation import CancelToken
+import metrics
+import tracing
+import profiling
+import memory_tracker
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load the model at startup so the first chat doesn't wait for it
+    RESIDENCY.preload(wait=False)
+    yield
+
+app = FastAPI(title="Lucy Voice Web Interface", lifespan=lifespan)
+metrics.configure("voice_web")
+tracing.configure(app="voice_web")
+profiling.configure(app="voice_web")
+memory_tracker.configure(app="voice_web")
 
 class ConnectionManager:
     def __init__(self):
@@ -38,6 +56,26 @@ class ConnectionManager:
 
 manager = ConnectionManager()
 
+# Disconnected sessions still saving their conversation log
+closing_sessions = 0
+
+IDLE_CHECK_SECONDS = 5  # How often a session in summarize_mode "idle" checks for a quiet moment
+
+async def close_session(websocket, lucy, stop_turn):
+    """Drop the connection, stop its turn and save the conversation off the event loop"""
+    global closing_sessions
+    # Counted before the connection is dropped, so /api/status never shows a session as
+    # gone while it is still winding down
+    closing_sessions += 1
+    try:
+        manager.disconnect(websocket)
+        await stop_turn("disconnected")
+        await asyncio.to_thread(lucy.end_conversation)
+    finally:
+        closing_sessions -= 1
+
+memory_tracker.get_tracker().gauge("websockets open", lambda: len(manager.active_connections))
+
 @app.get("/")
 async def get_root():
     """Serve the voice-enabled interface"""
@@ -54,16 +92,51 @@ async def get_status():
         "model": CHAT_MODEL,
         "api_base": API_BASE,
         "voice_enabled": True,
-        "active_connections": len(manager.active_connections)
+        "active_connections": len(manager.active_connections),
+        "closing_sessions": closing_sessions,
+        "model_residency": await asyncio.to_thread(RESIDENCY.status),
+        "response_cache": RESPONSE_CACHE.stats() if RESPONSE_CACHE else None,
+        "semantic_cache": SEMANTIC_CACHE.stats() if SEMANTIC_CACHE else None,
+        "llm_scheduler": get_scheduler().stats(),
+        "llm_router": ROUTER.stats() if ROUTER else None,
+        "model_cascade": CASCADE.stats()
     }
 
+@app.get("/metrics")
+async def get_metrics():
+    """Stage latency percentiles in Prometheus text format"""
+    return PlainTextResponse(metrics.get_metrics().render_prometheus(),
+                             media_type="text/plain; version=0.0.4")
+
+@app.get("/debug/profile")
+async def get_profile(seconds: float = profiling.CAPTURE_SECONDS):
+    """Sample the whole server for the next N seconds and report the busiest functions"""
+    path, text = await asyncio.to_thread(profiling.get_profiler().capture, seconds)
+    return PlainTextResponse(text, status_code=200 if path else 409)
+
+@app.get("/debug/memory")
+async def get_memory(top: int = memory_tracker.TOP, since: str = "previous", stop: bool = False):
+    """
+    Where memory is allocated and what grew since the last call (since=start: since the
+    first call). The first call starts tracing; stop=true stops it again
+    """
+    tracker = memory_tracker.get_tracker()
+    if stop:
+        tracker.stop()
+        return PlainTextResponse(f"Tracing stopped. {tracker.describe()}")
+    return PlainTextResponse(await asyncio.to_thread(tracker.report, top, since))
+
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     """WebSocket for real-time voice-enabled chat"""
     await manager.connect(websocket)
+    RESIDENCY.acquire()
 
     # Create Lucy instance for this connection
-    lucy = LucyBrain()
+    lucy = LucyBrain(prefetch=("idle",), mode="voice")  # The page only asks for idle thoughts
+
+    # Someone is waiting to hear Lucy speak - these replies go before background work
+    set_request_context(PRIORITY_VOICE, session=lucy.session_id)
 
     # Send welcome
     await manager.send_message({
@@ -72,16 +145,86 @@ async def websocket_endpoint(websocket: WebSocket):
         "timestamp": datetime.now().isoformat()
     }, websocket)
 
+    async def compact_when_idle():
+        """summarize_mode "idle": fold old turns into the summary while the child is quiet"""
+        while True:
+            await asyncio.sleep(IDLE_CHECK_SECONDS)
+            if turn is None or turn.done():
+                await asyncio.to_thread(lucy.compact_when_idle)
+
+    @profiling.profiled("ws.turn")
+    async def handle_chat(user_message: str, cancel: CancelToken):
+        """One turn: stream Lucy's reply, then send it whole for the browser to speak"""
+        trace = tracing.current_span()  # "voice_web.turn", started with the task
+        # Send thinking state
+        await manager.send_message({
+            "type": "thinking",
+            "timestamp": datetime.now().isoformat()
+        }, websocket)
+
+        # Stream Lucy's response as it is generated
+        reply = ""
+        async for token in lucy.aprocess_message_stream(user_message, cancel):
+            if not reply:
+                trace.mark("first_delta")
+            reply += token
+            await manager.send_message({
+                "type": "assistant_delta",
+                "content": token,
+                "timestamp": datetime.now().isoformat()
+            }, websocket)
+        reply = reply.strip()
+        if cancel.cancelled:
+            trace.set(cancelled=cancel.reason)
+
+        if cancel.cancelled and not reply:
+            await manager.send_message({
+                "type": "system",
+                "content": "Stopped",
+                "timestamp": datetime.now().isoformat()
+            }, websocket)
+            return
+
+        # Send the complete response (the browser speaks this one, unless
+        # the child already started talking over it)
+        await manager.send_message({
+            "type": "assistant",
+            "content": reply,
+            "timestamp": datetime.now().isoformat(),
+            "speak": not cancel.cancelled,
+            "interrupted": cancel.cancelled
+        }, websocket)
+
+    # The turn being generated, so barge-in or a disconnect can cancel it
+    turn, cancel = None, None
+    compactor = asyncio.create_task(compact_when_idle()) if lucy.summarize_mode == "idle" else None
+
+    async def stop_turn(reason: str):
+        """Cancel the running turn (if any) and wait for it to wind down"""
+        if turn is None or turn.done():
+            return
+        cancel.cancel(reason)
+        try:
+            await turn
+        except Exception as e:
+            print(f"[Voice] Turn error: {e}")
+
     try:
         while True:
             data = await websocket.receive_json()
 
-            if data.get("type") == "chat":
+            if data.get("type") == "interrupt":
+                # The child started talking (or pressed the mic) while Lucy was answering
+                await stop_turn("interrupted")
+
+            elif data.get("type") == "chat":
                 user_message = data.get("message", "").strip()
 
                 if not user_message:
                     continue
 
+                await stop_turn("new message")
+
                 # Echo user message
                 await manager.send_message({
                     "type": "user",
@@ -89,22 +232,9 @@ async def websocket_endpoint(websocket: WebSocket):
                     "timestamp": datetime.now().isoformat()
                 }, websocket)
 
-                # Send thinking state
-                await manager.send_message({
-                    "type": "thinking",
-                    "timestamp": datetime.now().isoformat()
-                }, websocket)
-
-                # Get Lucy's response
-                reply = lucy.process_message(user_message)
-
-                # Send response
-                await manager.send_message({
-                    "type": "assistant",
-                    "content": reply,
-                    "timestamp": datetime.now().isoformat(),
-                    "speak": True  # Signal to browser to speak this
-                }, websocket)
+                cancel = CancelToken()
+                turn = asyncio.create_task(tracing.traced("voice_web.turn", handle_chat(user_message, cancel),
+                                                          session=lucy.session_id))
 
             elif data.get("type") == "get_idle_thought":
                 # Request idle thought
@@ -117,12 +247,14 @@ async def websocket_endpoint(websocket: WebSocket):
                 }, websocket)
 
     except WebSocketDisconnect:
-        manager.disconnect(websocket)
-        lucy.end_conversation()
+        await close_session(websocket, lucy, stop_turn)
     except Exception as e:
         print(f"WebSocket error: {e}")
-        manager.disconnect(websocket)
-        lucy.end_conversation()
+        await close_session(websocket, lucy, stop_turn)
+    finally:
+        if compactor is not None:
+            compactor.cancel()
+        RESIDENCY.release()
 
 def get_voice_interface_html():
     """Complete voice-enabled interface with animated face"""
@@ -493,8 +625,14 @@ def get_voice_interface_html():
         }
 
         function handleMessage(data) {
-            const msg = document.createElement('div');
-            msg.className = 'message';
+            // Streamed tokens grow one bubble; the final 'assistant' message completes it
+            let msg = document.getElementById('streaming');
+            const streamed = msg && (data.type === 'assistant_delta' || data.type === 'assistant');
+            if (!streamed) {
+                if (msg) msg.removeAttribute('id');
+                msg = document.createElement('div');
+                msg.className = 'message';
+            }
 
             switch(data.type) {
                 case 'user':
@@ -502,7 +640,17 @@ def get_voice_interface_html():
                     msg.textContent = data.content;
                     break;
 
+                case 'assistant_delta':
+                    if (!streamed) {
+                        msg.classList.add('assistant-message');
+                        msg.id = 'streaming';
+                    }
+                    msg.textContent += data.content;
+                    faceStatus.textContent = '💬 Answering...';
+                    break;
+
                 case 'assistant':
+                    msg.removeAttribute('id');
                     msg.classList.add('assistant-message');
                     msg.textContent = data.content;
                     faceState.talking = false;
@@ -584,6 +732,10 @@ def get_voice_interface_html():
                 return;
             }
 
+            // Barge-in: stop Lucy talking (and thinking) as soon as the child speaks
+            window.speechSynthesis.cancel();
+            if (ws) ws.send(JSON.stringify({ type: 'interrupt' }));
+
             micPressed = true;
             micBtn.classList.add('listening');
             faceState.listening = true;
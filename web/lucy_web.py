@@ -6,11 +6,13 @@ FastAPI + WebSocket for real-time chat and animated face
 
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse
 from pathlib import Path
 import json
 import sys
 import asyncio
+import time
+from contextlib import asynccontextmanager
 from datetime import datetime
 from typing import List
 
@@ -19,9 +21,17 @@ sys.path.insert(0, str(Path(__file__).parent.parent / "brain"))
 
 try:
     from lucy_unified_windows import (
-        call_llm, TOOLS, SYSTEM_PROMPT, TOOL_DESCRIPTIONS,
-        CFG, CHAT_MODEL, API_BASE
+        astream_llm, arun_tool, TOOLS, SYSTEM_PROMPT, TOOL_DESCRIPTIONS,
+        CFG, CHAT_MODEL, API_BASE, CONTEXT_TOKEN_BUDGET, RESIDENCY, ROUTER, CASCADE
     )
+    from llm_client import tool_call_state
+    from cancellation import CancelToken
+    import metrics
+    import tracing
+    import profiling
+    import memory_tracker
+    from llm_scheduler import get_scheduler, set_request_context, PRIORITY_CHAT
+    from context_window import ContextWindow
     # Try to import ZPC integration
     try:
         from zpc_integration import create_zpc_tools, ZPC_TOOL_DESCRIPTIONS
@@ -33,7 +43,17 @@ except ImportError:
     print("Error: Could not import Lucy brain modules")
     sys.exit(1)
 
-app = FastAPI(title="Lucy Web Interface")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load the model at startup so the first chat doesn't wait for it
+    RESIDENCY.preload(wait=False)
+    yield
+
+app = FastAPI(title="Lucy Web Interface", lifespan=lifespan)
+metrics.configure("web")
+tracing.configure(app="web")
+profiling.configure(app="web")
+memory_tracker.configure(app="web")
 
 # Active WebSocket connections
 class ConnectionManager:
@@ -59,6 +79,7 @@ class ConnectionManager:
                 pass
 
 manager = ConnectionManager()
+memory_tracker.get_tracker().gauge("websockets open", lambda: len(manager.active_connections))
 
 # Combine tools
 all_tools = TOOLS.copy()
@@ -86,18 +107,51 @@ async def get_status():
         "api_base": API_BASE,
         "tools_available": list(all_tools.keys()),
         "zpc_integration": ZPC_AVAILABLE,
-        "active_connections": len(manager.active_connections)
+        "active_connections": len(manager.active_connections),
+        "model_residency": await asyncio.to_thread(RESIDENCY.status),
+        "llm_scheduler": get_scheduler().stats(),
+        "llm_router": ROUTER.stats() if ROUTER else None,
+        "model_cascade": CASCADE.stats()
     }
 
+@app.get("/metrics")
+async def get_metrics():
+    """Stage latency percentiles in Prometheus text format"""
+    return PlainTextResponse(metrics.get_metrics().render_prometheus(),
+                             media_type="text/plain; version=0.0.4")
+
+@app.get("/debug/profile")
+async def get_profile(seconds: float = profiling.CAPTURE_SECONDS):
+    """Sample the whole server for the next N seconds and report the busiest functions"""
+    path, text = await asyncio.to_thread(profiling.get_profiler().capture, seconds)
+    return PlainTextResponse(text, status_code=200 if path else 409)
+
+@app.get("/debug/memory")
+async def get_memory(top: int = memory_tracker.TOP, since: str = "previous", stop: bool = False):
+    """
+    Where memory is allocated and what grew since the last call (since=start: since the
+    first call). The first call starts tracing; stop=true stops it again
+    """
+    tracker = memory_tracker.get_tracker()
+    if stop:
+        tracker.stop()
+        return PlainTextResponse(f"Tracing stopped. {tracker.describe()}")
+    return PlainTextResponse(await asyncio.to_thread(tracker.report, top, since))
+
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     """WebSocket for real-time chat"""
     await manager.connect(websocket)
+    RESIDENCY.acquire()
+    # Each connection is its own session, so busy tabs take turns for the LLM
+    session = f"ws-{id(websocket):x}"
+    set_request_context(PRIORITY_CHAT, session=session)
 
     # Initialize conversation
-    messages = [
+    context = ContextWindow([
         {"role": "system", "content": SYSTEM_PROMPT + "\n\n" + tool_descriptions}
-    ]
+    ], token_budget=CONTEXT_TOKEN_BUDGET)
+    messages = context.messages
 
     # Send welcome message
     welcome = {
@@ -107,17 +161,150 @@ async def websocket_endpoint(websocket: WebSocket):
     }
     await manager.send_message(welcome, websocket)
 
+    @profiling.profiled("ws.turn")
+    async def handle_chat(user_message: str, cancel: CancelToken):
+        """One turn: stream Lucy's reply and run any tools, until done or cancelled"""
+        trace = tracing.current_span()  # "web.turn", started with the task
+
+        # Add to conversation
+        messages.append({"role": "user", "content": user_message})
+
+        # One model for the whole turn, tool rounds included
+        model, tier = CASCADE.route(user_message, tools=True)
+        turn_start = time.time()
+
+        # Get Lucy's response (with tool support)
+        for _ in range(5):  # Max 5 tool uses per turn
+            # Send "thinking" indicator
+            await manager.send_message({
+                "type": "thinking",
+                "timestamp": datetime.now().isoformat()
+            }, websocket)
+
+            # Stream the reply, pushing tokens to the browser as they
+            # arrive (tool calls are held back and reported below)
+            reply = ""
+            streaming = False
+            # Tool results can be long - make room before each call
+            context.trim()
+            context.observe(messages)
+            async for token in astream_llm(messages, model, cancel):
+                reply += token
+                if not streaming and tool_call_state(reply) is False:
+                    streaming = True
+                    token = reply
+                    trace.mark("first_delta")
+                if streaming:
+                    await manager.send_message({
+                        "type": "assistant_delta",
+                        "content": token,
+                        "timestamp": datetime.now().isoformat()
+                    }, websocket)
+
+            if cancel.cancelled:
+                trace.set(cancelled=cancel.reason)
+                # Keep what the user already saw; drop a half-written tool call
+                if streaming and reply.strip():
+                    await manager.send_message({
+                        "type": "assistant",
+                        "content": reply,
+                        "timestamp": datetime.now().isoformat()
+                    }, websocket)
+                    messages.append({"role": "assistant", "content": reply})
+                return
+
+            # Check for tool use
+            if tool_call_state(reply):  # Same test as streaming: the reply starts with TOOL:
+                parts = reply.split("|")
+                tool_name = parts[0].replace("TOOL:", "").strip()
+                tool_args = parts[1].replace("ARGS:", "").strip() if len(parts) > 1 else ""
+
+                # Send tool use notification
+                await manager.send_message({
+                    "type": "tool",
+                    "tool": tool_name,
+                    "args": tool_args,
+                    "timestamp": datetime.now().isoformat()
+                }, websocket)
+
+                if tool_name in all_tools:
+                    # Execute tool off the event loop
+                    result = await arun_tool(all_tools[tool_name], tool_args)
+
+                    # Send tool result
+                    await manager.send_message({
+                        "type": "tool_result",
+                        "tool": tool_name,
+                        "result": result,
+                        "timestamp": datetime.now().isoformat()
+                    }, websocket)
+
+                    messages.append({"role": "assistant", "content": reply})
+                    messages.append({"role": "user", "content": f"TOOL RESULT: {result}"})
+                    if cancel.cancelled:
+                        return
+                else:
+                    # Unknown tool
+                    error_msg = f"❌ Unknown tool: {tool_name}"
+                    await manager.send_message({
+                        "type": "error",
+                        "content": error_msg,
+                        "timestamp": datetime.now().isoformat()
+                    }, websocket)
+                    messages.append({"role": "assistant", "content": reply})
+                    messages.append({"role": "user", "content": f"ERROR: {error_msg}"})
+                    break
+            else:
+                # Regular response
+                await manager.send_message({
+                    "type": "assistant",
+                    "content": reply,
+                    "timestamp": datetime.now().isoformat()
+                }, websocket)
+                messages.append({"role": "assistant", "content": reply})
+                break
+
+        CASCADE.record(tier, time.time() - turn_start)
+
+        # Trim conversation history (in chunks, to keep the prompt cache warm)
+        context.trim()
+
+    # The turn being generated, so a new message or a disconnect can cancel it
+    turn, cancel = None, None
+
+    async def stop_turn(reason: str):
+        """Cancel the running turn (if any) and wait for it to wind down"""
+        if turn is None or turn.done():
+            return False
+        cancel.cancel(reason)
+        try:
+            await turn
+        except Exception as e:
+            print(f"[Chat] Turn error: {e}")
+        return True
+
     try:
         while True:
             # Receive message from client
             data = await websocket.receive_json()
 
-            if data.get("type") == "chat":
+            if data.get("type") == "interrupt":
+                if await stop_turn("interrupted"):
+                    await manager.send_message({
+                        "type": "system",
+                        "content": "Stopped",
+                        "timestamp": datetime.now().isoformat()
+                    }, websocket)
+
+            elif data.get("type") == "chat":
                 user_message = data.get("message", "").strip()
 
                 if not user_message:
                     continue
 
+                # A new message replaces whatever Lucy was still saying
+                await stop_turn("new message")
+
                 # Echo user message back
                 await manager.send_message({
                     "type": "user",
@@ -125,77 +312,20 @@ async def websocket_endpoint(websocket: WebSocket):
                     "timestamp": datetime.now().isoformat()
                 }, websocket)
 
-                # Add to conversation
-                messages.append({"role": "user", "content": user_message})
-
-                # Get Lucy's response (with tool support)
-                for _ in range(5):  # Max 5 tool uses per turn
-                    # Send "thinking" indicator
-                    await manager.send_message({
-                        "type": "thinking",
-                        "timestamp": datetime.now().isoformat()
-                    }, websocket)
-
-                    reply = call_llm(messages)
-
-                    # Check for tool use
-                    if "TOOL:" in reply:
-                        parts = reply.split("|")
-                        tool_name = parts[0].replace("TOOL:", "").strip()
-                        tool_args = parts[1].replace("ARGS:", "").strip() if len(parts) > 1 else ""
-
-                        # Send tool use notification
-                        await manager.send_message({
-                            "type": "tool",
-                            "tool": tool_name,
-                            "args": tool_args,
-                            "timestamp": datetime.now().isoformat()
-                        }, websocket)
-
-                        if tool_name in all_tools:
-                            # Execute tool
-                            result = all_tools[tool_name](tool_args) if tool_args else all_tools[tool_name]()
-
-                            # Send tool result
-                            await manager.send_message({
-                                "type": "tool_result",
-                                "tool": tool_name,
-                                "result": result,
-                                "timestamp": datetime.now().isoformat()
-                            }, websocket)
-
-                            messages.append({"role": "assistant", "content": reply})
-                            messages.append({"role": "user", "content": f"TOOL RESULT: {result}"})
-                        else:
-                            # Unknown tool
-                            error_msg = f"❌ Unknown tool: {tool_name}"
-                            await manager.send_message({
-                                "type": "error",
-                                "content": error_msg,
-                                "timestamp": datetime.now().isoformat()
-                            }, websocket)
-                            messages.append({"role": "assistant", "content": reply})
-                            messages.append({"role": "user", "content": f"ERROR: {error_msg}"})
-                            break
-                    else:
-                        # Regular response
-                        await manager.send_message({
-                            "type": "assistant",
-                            "content": reply,
-                            "timestamp": datetime.now().isoformat()
-                        }, websocket)
-                        messages.append({"role": "assistant", "content": reply})
-                        break
-
-                # Trim conversation history
-                if len(messages) > 20:
-                    messages = [messages[0]] + messages[-18:]
+                cancel = CancelToken()
+                turn = asyncio.create_task(tracing.traced("web.turn", handle_chat(user_message, cancel),
+                                                          session=session))
 
     except WebSocketDisconnect:
         manager.disconnect(websocket)
+        print(f"[Context] {context.describe()}")
     except Exception as e:
         print(f"WebSocket error: {e}")
         manager.disconnect(websocket)
+    finally:
+        # Nobody is listening any more - free the backend
+        await stop_turn("disconnected")
+        RESIDENCY.release()
 
 def get_default_html():
     """Default HTML if index.html not found"""
@@ -365,6 +495,30 @@ def get_default_html():
         }
 
         function handleMessage(data) {
+            // Streamed tokens grow a single bubble until the full reply arrives
+            const streaming = document.getElementById('streaming');
+            if (data.type === 'assistant_delta' || (data.type === 'assistant' && streaming)) {
+                const thinking = document.getElementById('thinking');
+                if (thinking) thinking.remove();
+
+                let bubble = streaming;
+                if (!bubble) {
+                    bubble = document.createElement('div');
+                    bubble.className = 'message assistant-message';
+                    bubble.id = 'streaming';
+                    chat.appendChild(bubble);
+                }
+                if (data.type === 'assistant') {
+                    bubble.textContent = data.content;
+                    bubble.removeAttribute('id');
+                } else {
+                    bubble.textContent += data.content;
+                }
+                chat.scrollTop = chat.scrollHeight;
+                return;
+            }
+            if (streaming) streaming.removeAttribute('id');
+
             const msg = document.createElement('div');
             msg.className = 'message';
 
@@ -428,6 +582,11 @@ def get_default_html():
             if (e.key === 'Enter') sendMessage();
         });
 
+        // Escape stops Lucy mid-reply
+        input.addEventListener('keydown', (e) => {
+            if (e.key === 'Escape' && ws) ws.send(JSON.stringify({ type: 'interrupt' }));
+        });
+
         connect();
     </script>
 </body>
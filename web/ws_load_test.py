@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Lucy WebSocket Load Test
+Opens many /ws clients against lucy_web.py or lucy_voice_web.py and drives scripted chats
+
+    python web/ws_load_test.py --clients 50                   # Chat page on localhost:8080
+    python web/ws_load_test.py --clients 300 --ramp 30 --turns 3
+    python web/ws_load_test.py --url ws://192.168.1.20:8080/ws --idle   # Voice page, idle thoughts too
+
+Reports connect time, echo latency, time to Lucy's first words, whole replies,
+errors, and how long the server takes to clean up once everyone has left.
+Run the server against brain/mock_llm.py to load the server rather than the model.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+import urllib.request
+from collections import Counter
+from pathlib import Path
+
+import websockets
+
+# Add brain to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "brain"))
+import metrics
+
+DEFAULT_URL = "ws://localhost:8080/ws"
+TIMEOUT = 120.0         # Seconds to wait for a connection or a reply
+CLEANUP_TIMEOUT = 60.0  # Seconds to wait for the server to let go of everyone
+
+# What the simulated kids say (each client starts at a different line)
+SCRIPT = [
+    "Hi Lucy! My name is Felicity",
+    "I'm 6 years old",
+    "My favorite animal is a dolphin",
+    "Do you know what dolphins eat?",
+    "I have a dog named Buddy",
+    "Why is the sky blue?",
+    "Can you tell me a joke?",
+    "What's your favorite color?",
+    "I went to the park today",
+    "How far away is the moon?",
+]
+
+# Stages in the order they are reported
+STAGES = ("connect", "welcome", "echo", "first_message", "reply", "idle", "close")
+
+class LoadTest:
+    """Many scripted clients on one event loop, with shared latency stats"""
+
+    def __init__(self, url: str = DEFAULT_URL, clients: int = 10, turns: int = 5, ramp: float = 5.0,
+                 think: float = 2.0, timeout: float = TIMEOUT, idle: bool = False):
+        self.url = url
+        self.clients = clients
+        self.turns = turns
+        self.ramp = ramp
+        self.think = think
+        self.timeout = timeout
+        self.idle = idle
+        self.stats = metrics.StageMetrics("ws_load", window=1000000)
+        self.errors = Counter()
+        self.replies = 0
+        self.open = 0
+        self.peak = 0
+
+    @property
+    def status_url(self) -> str:
+        """/api/status on the same server"""
+        base = self.url.replace("wss://", "https://").replace("ws://", "http://")
+        return base.rsplit("/", 1)[0] + "/api/status"
+
+    def server_status(self):
+        try:
+            with urllib.request.urlopen(self.status_url, timeout=5) as resp:
+                return json.loads(resp.read())
+        except (OSError, ValueError):
+            return None
+
+    async def _receive(self, ws, deadline: float):
+        raw = await asyncio.wait_for(ws.recv(), max(0.0, deadline - time.perf_counter()))
+        return json.loads(raw)
+
+    async def client(self, number: int):
+        """One kid: connect, chat for a few turns, hang up"""
+        await asyncio.sleep(self.ramp * number / self.clients)
+        rng = random.Random(number)
+
+        start = time.perf_counter()
+        try:
+            ws = await websockets.connect(self.url, open_timeout=self.timeout, max_size=None)
+        except Exception as e:
+            self.errors[f"connect: {type(e).__name__}"] += 1
+            return
+        self.stats.observe("connect", time.perf_counter() - start)
+        self.open += 1
+        self.peak = max(self.peak, self.open)
+
+        try:
+            # Both servers greet every new connection
+            await self._receive(ws, start + self.timeout)
+            self.stats.observe("welcome", time.perf_counter() - start)
+
+            offset = rng.randrange(len(SCRIPT))
+            for turn in range(self.turns):
+                if turn:
+                    await asyncio.sleep(self.think * rng.uniform(0.5, 1.5))
+                if not await self.chat(ws, SCRIPT[(offset + turn) % len(SCRIPT)]):
+                    break
+                if self.idle:
+                    await self.idle_thought(ws)
+        except asyncio.TimeoutError:
+            self.errors["timeout"] += 1
+        except websockets.ConnectionClosed:
+            self.errors["closed by server"] += 1
+        except Exception as e:
+            self.errors[type(e).__name__] += 1
+        finally:
+            start = time.perf_counter()
+            try:
+                await asyncio.wait_for(ws.close(), self.timeout)
+                self.stats.observe("close", time.perf_counter() - start)
+            except Exception as e:
+                self.errors[f"close: {type(e).__name__}"] += 1
+            self.open -= 1
+
+    async def chat(self, ws, message: str) -> bool:
+        """One turn; False if the server answered with an error"""
+        sent = time.perf_counter()
+        deadline = sent + self.timeout
+        await ws.send(json.dumps({"type": "chat", "message": message}))
+        echoed = answered = False
+        while True:
+            data = await self._receive(ws, deadline)
+            kind = data.get("type")
+            seconds = time.perf_counter() - sent
+            if kind == "user" and not echoed:
+                echoed = True
+                self.stats.observe("echo", seconds)
+            elif kind in ("assistant_delta", "assistant") and not answered:
+                answered = True
+                self.stats.observe("first_message", seconds)
+
+            if kind == "assistant":
+                self.stats.observe("reply", seconds)
+                self.replies += 1
+                return True
+            if kind == "error":
+                self.errors["error message"] += 1
+                return False
+            if kind == "system" and data.get("content") == "Stopped":
+                self.errors["stopped"] += 1
+                return True
+
+    async def idle_thought(self, ws):
+        """Ask for an idle thought (voice page only; the chat page ignores it)"""
+        sent = time.perf_counter()
+        await ws.send(json.dumps({"type": "get_idle_thought"}))
+        while True:
+            data = await self._receive(ws, sent + self.timeout)
+            if data.get("type") == "idle":
+                self.stats.observe("idle", time.perf_counter() - sent)
+                return
+
+    async def wait_for_cleanup(self, baseline: dict):
+        """Seconds until the server has closed every session we opened (None if it never did)"""
+        if baseline is None:
+            return None
+        start = time.perf_counter()
+        while time.perf_counter() - start < CLEANUP_TIMEOUT:
+            status = await asyncio.to_thread(self.server_status)
+            if status is not None and \
+                    status.get("active_connections", 0) <= baseline.get("active_connections", 0) and \
+                    status.get("closing_sessions", 0) <= baseline.get("closing_sessions", 0):
+                return time.perf_counter() - start
+            await asyncio.sleep(0.1)
+        return None
+
+    async def run(self):
+        baseline = await asyncio.to_thread(self.server_status)
+        started = time.perf_counter()
+        await asyncio.gather(*(self.client(n) for n in range(self.clients)))
+        elapsed = time.perf_counter() - started
+        cleanup = await self.wait_for_cleanup(baseline)
+        return self.report(elapsed, cleanup, baseline is not None)
+
+    def report(self, elapsed: float, cleanup, has_status: bool) -> str:
+        snapshot = self.stats.snapshot()
+        lines = [
+            "=" * 70,
+            f"WEBSOCKET LOAD TEST: {self.url}",
+            "=" * 70,
+            f"  Clients: {self.clients} ({self.peak} connected at once), {self.turns} turns each, "
+            f"ramp {self.ramp:.0f}s",
+            f"  Replies: {self.replies} in {elapsed:.1f}s = {self.replies / elapsed if elapsed else 0:.2f} replies/sec",
+            "",
+            f"  {'stage':<14} {'n':>6} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}",
+        ]
+        for stage in STAGES:
+            s = snapshot.get(stage)
+            if s:
+                p50, p95, p99, longest = (f"{s[k] * 1000:.0f} ms" for k in ("p50", "p95", "p99", "max"))
+                lines.append(f"  {stage:<14} {s['count']:>6} {p50:>9} {p95:>9} {p99:>9} {longest:>9}")
+
+        lines.append("")
+        if self.errors:
+            lines.append(f"  Errors: {sum(self.errors.values())}")
+            for kind, count in self.errors.most_common():
+                lines.append(f"    {count:>6}  {kind}")
+        else:
+            lines.append("  Errors: 0")
+        if not has_status:
+            lines.append(f"  Cleanup: not measured ({self.status_url} not reachable)")
+        elif cleanup is None:
+            lines.append(f"  Cleanup: server still holding sessions after {CLEANUP_TIMEOUT:.0f}s")
+        else:
+            lines.append(f"  Cleanup: server let go of every session {cleanup * 1000:.0f} ms after the last client left")
+        lines.append("=" * 70)
+        return "\n".join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test Lucy's /ws endpoint")
+    parser.add_argument("--url", default=DEFAULT_URL, help=f"WebSocket URL (default: {DEFAULT_URL})")
+    parser.add_argument("--clients", type=int, default=10, help="Number of simulated kids")
+    parser.add_argument("--turns", type=int, default=5, help="Messages each kid sends")
+    parser.add_argument("--ramp", type=float, default=5.0, help="Seconds over which the clients connect")
+    parser.add_argument("--think", type=float, default=2.0, help="Average seconds between a reply and the next message")
+    parser.add_argument("--timeout", type=float, default=TIMEOUT, help="Seconds to wait for a connection or reply")
+    parser.add_argument("--idle", action="store_true", help="Ask for an idle thought after each turn (voice page)")
+    parser.add_argument("--report", help="Also write the summary to this file")
+    args = parser.parse_args()
+
+    test = LoadTest(args.url, max(1, args.clients), args.turns, args.ramp, args.think, args.timeout, args.idle)
+    print(f"[Load] {test.clients} clients -> {args.url}")
+    try:
+        report = asyncio.run(test.run())
+    except KeyboardInterrupt:
+        print("\n[Load] Stopped")
+        return
+    print(report)
+    if args.report:
+        Path(args.report).write_text(report + "\n", encoding="utf-8")
+        print(f"[Load] Report saved to {args.report}")
+
+if __name__ == "__main__":
+    main()